@@ -9,6 +9,8 @@
 
 # Playwright 版本（推荐）
 from .xhs_share import extract_xhs_url_from_share_text
+from .xhs_url import extract_note_id, canonicalize_url, canonicalize_many, strip_tracking_params
+from .xhs_harvest import harvest_share_links, harvest_files, HarvestedLink
 from .xhs_login import login_xhs_and_save_state, check_login_state_exists, STATE_PATH
 from .xhs_fetch import fetch_note_from_share_text, fetch_note_from_url, _parse_note_from_state
 
@@ -16,12 +18,26 @@ from .xhs_fetch import fetch_note_from_share_text, fetch_note_from_url, _parse_n
 from .xhs_parser import fetch_xhs_note, extract_note_id_from_url, parse_note_from_file
 from .cookie_manager import CookieManager
 
+# 批量离线解析
+from .xhs_batch import parse_states_parallel, save_state_dump, load_state_dump
+from .state_archive import StateArchive
+from .note_bundle import open_bundle, iter_notes, SqliteBundle, ZipBundle
+from .note_search import SearchIndex, SearchHit
+from .note_parquet import export_notes, flatten_note
+
 # 数据模型
 from .models import Note, InterviewQuestion
 
 # OCR（可选）
 try:
-    from .ocr import OCRProcessor, extract_ocr_from_note
+    from .ocr import (
+        OCRProcessor, OCRResult, ImageOCRResult, extract_ocr_from_note, iter_ocr_from_note, merge_ocr_results,
+        warm_up_ocr, PreprocessConfig, preprocess_image,
+    )
+    from .ocr_cache import OCRCache, get_default_ocr_cache
+    from .ocr_pool import OCRPool
+    from .image_dedup import PerceptualIndex, dhash, fingerprint, get_default_dedup_index
+    from .ocr_backends import OCRBackend, available_backends
 except ImportError:
     # OCR 模块可能未安装依赖
     pass
@@ -29,6 +45,13 @@ except ImportError:
 __all__ = [
     # Playwright 版本
     "extract_xhs_url_from_share_text",
+    "extract_note_id",
+    "canonicalize_url",
+    "canonicalize_many",
+    "strip_tracking_params",
+    "harvest_share_links",
+    "harvest_files",
+    "HarvestedLink",
     "login_xhs_and_save_state",
     "check_login_state_exists",
     "STATE_PATH",
@@ -39,6 +62,19 @@ __all__ = [
     "extract_note_id_from_url",
     "parse_note_from_file",
     "CookieManager",
+    # 批量离线解析
+    "parse_states_parallel",
+    "save_state_dump",
+    "load_state_dump",
+    "StateArchive",
+    "open_bundle",
+    "SqliteBundle",
+    "ZipBundle",
+    "iter_notes",
+    "SearchIndex",
+    "SearchHit",
+    "export_notes",
+    "flatten_note",
     # 数据模型
     "Note",
     "InterviewQuestion",
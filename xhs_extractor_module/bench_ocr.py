@@ -0,0 +1,238 @@
+# bench_ocr.py
+"""
+OCR 吞吐量基准测试
+在固定的本地图片集上比较逐张识别与批量识别的吞吐量（张/秒），或比较不同 OCR 后端、
+开启/关闭图片预处理时的吞吐量和准确率。
+
+使用方法：
+    python -m xhs_extractor_module.bench_ocr ./bench_images
+    python -m xhs_extractor_module.bench_ocr ./bench_images --batch-sizes 1 4 8 16 --repeat 3
+    python -m xhs_extractor_module.bench_ocr ./bench_images --backends paddle onnx tesseract
+    python -m xhs_extractor_module.bench_ocr ./bench_images --preprocess --backend onnx
+
+比较后端或预处理时，图片旁边同名的 .txt 文件（如 001.jpg 对应 001.txt）作为标注文本，用于计算字符准确率。
+所有测试都通过公开接口 OCRProcessor.recognize_batch 识别（逐张识别即 batch_size=1），与实际使用的路径一致。
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import contextlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .ocr import OCRProcessor, decode_image_bytes, OCR_BATCH_SIZE
+from .ocr_backends import BACKENDS
+
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_labeled_corpus(directory: str, limit: Optional[int] = None) -> Tuple[List, List[Optional[str]]]:
+    """
+    按文件名顺序读取并解码目录中的图片（解码不计入识别时间）
+
+    Returns:
+        (图片列表, 标注文本列表)，没有同名 .txt 的图片标注为 None
+    """
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if limit:
+        paths = paths[:limit]
+    images, labels = [], []
+    for path in paths:
+        image = decode_image_bytes(path.read_bytes())
+        if image is None:
+            print(f"跳过无法解码的图片: {path}", file=sys.stderr)
+            continue
+        images.append(image)
+        label_path = path.with_suffix(".txt")
+        labels.append(label_path.read_text(encoding="utf-8") if label_path.exists() else None)
+    return images, labels
+
+
+def load_corpus(directory: str, limit: Optional[int] = None) -> List:
+    """按文件名顺序读取并解码目录中的图片"""
+    return load_labeled_corpus(directory, limit)[0]
+
+
+def _edit_distance(a: str, b: str) -> int:
+    """字符级编辑距离"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(predicted: str, truth: str) -> float:
+    """字符准确率：1 - 编辑距离 / 标注长度（忽略空白，最低为 0）"""
+    predicted = "".join(predicted.split())
+    truth = "".join(truth.split())
+    if not truth:
+        return 1.0 if not predicted else 0.0
+    return max(0.0, 1 - _edit_distance(predicted, truth) / len(truth))
+
+
+def _timed(fn, repeat: int) -> float:
+    """运行 repeat 次，返回最短耗时（秒）；识别过程中的调试输出丢弃"""
+    best = float("inf")
+    for _ in range(repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(
+    images: List,
+    batch_sizes: List[int],
+    repeat: int = 3,
+    use_lang: str = "ch",
+    backend: Optional[str] = None,
+):
+    """
+    逐张识别作为基线，依次测试各个批大小
+
+    Returns:
+        [(名称, 耗时秒, 张/秒)] 列表
+    """
+    processor = OCRProcessor(use_lang=use_lang, backend=backend)
+    if processor.ocr_engine is None:
+        raise RuntimeError(f"OCR 不可用：请先安装 {BACKENDS[processor.backend].install_hint}")
+
+    # 预热：第一次推理包含模型初始化等一次性开销
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        processor.recognize_batch(images[:1], batch_size=1)
+
+    rows = []
+    elapsed = _timed(lambda: processor.recognize_batch(images, batch_size=1), repeat)
+    rows.append(("逐张识别", elapsed, len(images) / elapsed))
+    for batch_size in batch_sizes:
+        elapsed = _timed(lambda: processor.recognize_batch(images, batch_size=batch_size), repeat)
+        rows.append((f"批量 batch_size={batch_size}", elapsed, len(images) / elapsed))
+    return rows
+
+
+def compare_backends(
+    images: List,
+    labels: List[Optional[str]],
+    backends: List[str],
+    repeat: int = 3,
+    use_lang: str = "ch",
+):
+    """
+    用同一组图片逐张识别，比较各个后端的吞吐量和字符准确率（关闭预筛选，每个后端识别全部图片）
+
+    Returns:
+        [(后端, 耗时秒, 张/秒, 平均字符准确率或 None)] 列表；未安装的后端跳过
+    """
+    rows = []
+    for name in backends:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            processor = OCRProcessor(use_lang=use_lang, prefilter=False, backend=name)
+            if processor.ocr_engine is not None:
+                processor.recognize_batch(images[:1], batch_size=1)  # 预热
+        if processor.ocr_engine is None:
+            print(f"跳过不可用的后端 {name}（{BACKENDS[name].install_hint}）", file=sys.stderr)
+            continue
+        rows.append((name, *_measure(processor, images, labels, repeat)))
+    return rows
+
+
+def _measure(processor: OCRProcessor, images: List, labels: List[Optional[str]], repeat: int):
+    """
+    逐张识别全部图片
+
+    Returns:
+        (耗时秒, 张/秒, 平均字符准确率或 None)
+    """
+    results = []
+
+    def run():
+        results[:] = processor.recognize_batch(images, batch_size=1)
+
+    elapsed = _timed(run, repeat)
+    scores = [
+        char_accuracy(result.text if result else "", label)
+        for result, label in zip(results, labels)
+        if label is not None
+    ]
+    accuracy = sum(scores) / len(scores) if scores else None
+    return elapsed, len(images) / elapsed, accuracy
+
+
+def compare_preprocessing(
+    images: List,
+    labels: List[Optional[str]],
+    repeat: int = 3,
+    use_lang: str = "ch",
+    backend: Optional[str] = None,
+):
+    """
+    同一个后端分别关闭、开启图片预处理，比较吞吐量和字符准确率（关闭预筛选）
+
+    Returns:
+        [(名称, 耗时秒, 张/秒, 平均字符准确率或 None)] 列表
+    """
+    rows = []
+    for name, preprocess in (("不预处理", False), ("预处理", True)):
+        processor = OCRProcessor(use_lang=use_lang, prefilter=False, preprocess=preprocess, backend=backend)
+        if processor.ocr_engine is None:
+            raise RuntimeError(f"OCR 不可用：请先安装 {BACKENDS[processor.backend].install_hint}")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            processor.recognize_batch(images[:1], batch_size=1)  # 预热
+        rows.append((name, *_measure(processor, images, labels, repeat)))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="比较逐张识别与批量识别的 OCR 吞吐量")
+    parser.add_argument("corpus", help="本地图片目录（固定图片集，保证多次测试可比）")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, OCR_BATCH_SIZE, 16], help="要测试的批大小")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最短耗时（默认 3）")
+    parser.add_argument("--limit", type=int, default=None, help="最多使用的图片数")
+    parser.add_argument("--lang", default="ch", help="识别语言（默认 ch）")
+    parser.add_argument("--backend", choices=list(BACKENDS), help="测试批大小或预处理时使用的 OCR 后端")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), help="比较多个 OCR 后端的吞吐量和准确率")
+    parser.add_argument("--preprocess", action="store_true", help="比较关闭/开启图片预处理的吞吐量和准确率")
+    args = parser.parse_args(argv)
+
+    images, labels = load_labeled_corpus(args.corpus, args.limit)
+    if not images:
+        print(f"❌ 目录中没有可用的图片: {args.corpus}")
+        sys.exit(1)
+
+    print(f"图片数量: {len(images)}，每项重复 {args.repeat} 次")
+    if args.backends or args.preprocess:
+        labeled = sum(label is not None for label in labels)
+        print(f"有标注的图片: {labeled} 张")
+        if args.preprocess:
+            rows = compare_preprocessing(images, labels, repeat=args.repeat, use_lang=args.lang, backend=args.backend)
+        else:
+            rows = compare_backends(images, labels, args.backends, repeat=args.repeat, use_lang=args.lang)
+        if not rows:
+            print("❌ 没有可用的 OCR 后端")
+            sys.exit(1)
+        baseline = rows[0][2]
+        print(f"{'方式' if args.preprocess else '后端':<12}{'耗时(秒)':>10}{'张/秒':>10}{'加速比':>8}{'字符准确率':>12}")
+        for name, elapsed, throughput, accuracy in rows:
+            accuracy_text = f"{accuracy:.1%}" if accuracy is not None else "-"
+            print(f"{name:<12}{elapsed:>10.2f}{throughput:>10.2f}{throughput / baseline:>8.2f}x{accuracy_text:>12}")
+        return
+
+    rows = run_benchmark(images, args.batch_sizes, repeat=args.repeat, use_lang=args.lang, backend=args.backend)
+    baseline = rows[0][2]
+    print(f"{'方式':<24}{'耗时(秒)':>10}{'张/秒':>10}{'加速比':>8}")
+    for name, elapsed, throughput in rows:
+        print(f"{name:<24}{elapsed:>10.2f}{throughput:>10.2f}{throughput / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# blob_store.py
+"""
+按内容寻址的本地图片存储
+同一张图片出现在多篇笔记中时，只在磁盘上保存一份：图片按 sha256 存入 objects/，
+再以硬链接（不支持时用 reflink，仍不支持时才复制）放进各篇笔记的文件夹。
+已保存过的图片再次保存时不下载、不写入任何字节。
+
+目录结构（位于保存目录下，与笔记文件夹在同一文件系统，硬链接才能生效）：
+    .xhs_blobs/
+    ├── objects/ab/abcdef....webp   # 以内容哈希命名的图片
+    ├── tmp/                        # 下载中的临时文件（按来源命名的 .part 可以断点续传）
+    └── manifest.sqlite3            # 清单：图片ID -> 内容哈希，笔记 -> 文件 -> 内容哈希
+
+清单中的表：
+    blobs       内容哈希、大小、扩展名
+    sources     CDN 图片ID + 规格（见 image_download.source_key）对应的内容哈希，命中时不需要下载
+    note_files  每篇笔记保存了哪些文件、各自对应的内容哈希和链接
+"""
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import uuid
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+# 保存目录下的存储目录名
+BLOB_DIR_NAME = ".xhs_blobs"
+# Linux 的 FICLONE ioctl（btrfs、xfs 等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+
+# 放入笔记文件夹的方式
+LINK_HARDLINK = "hardlink"
+LINK_REFLINK = "reflink"
+LINK_COPY = "copy"
+
+
+class Blob(NamedTuple):
+    """存储中的一个对象"""
+    digest: str
+    size: int
+    ext: str
+    path: Path
+
+
+class NoteFile(NamedTuple):
+    """清单中一篇笔记的一个文件"""
+    note_id: str
+    path: str
+    digest: str
+    url: Optional[str]
+    saved_at: float
+
+
+def _reflink(src: Path, dest: Path) -> bool:
+    """写时复制地克隆文件，文件系统不支持时返回 False"""
+    if not FCNTL_AVAILABLE:
+        return False
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            os.unlink(dest)
+        except OSError:
+            pass
+        return False
+
+
+class BlobStore:
+    """按内容寻址的图片存储与清单（线程安全）"""
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Args:
+            root: 存储目录，通常是 保存目录/.xhs_blobs
+        """
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.tmp = self.root / "tmp"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.root / "manifest.sqlite3"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest     TEXT PRIMARY KEY,
+                size       INTEGER NOT NULL,
+                ext        TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                source     TEXT PRIMARY KEY,
+                digest     TEXT NOT NULL,
+                url        TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS note_files (
+                note_id  TEXT NOT NULL,
+                path     TEXT NOT NULL,
+                digest   TEXT NOT NULL,
+                url      TEXT,
+                saved_at REAL NOT NULL,
+                PRIMARY KEY (note_id, path)
+            );
+            CREATE INDEX IF NOT EXISTS idx_note_files_digest ON note_files (digest);
+        """)
+        # 统计：新写入的对象数 / 字节数，放入笔记文件夹的方式计数
+        self.objects_written = 0
+        self.bytes_written = 0
+        self.link_counts = {LINK_HARDLINK: 0, LINK_REFLINK: 0, LINK_COPY: 0}
+
+    @classmethod
+    def for_save_dir(cls, base_dir: Union[str, Path]) -> "BlobStore":
+        """保存目录下的默认存储"""
+        return cls(Path(base_dir) / BLOB_DIR_NAME)
+
+    # ---- 对象 ----
+
+    def object_path(self, digest: str, ext: str) -> Path:
+        return self.objects / digest[:2] / (digest + ext)
+
+    def get(self, digest: str) -> Optional[Blob]:
+        """查找对象（清单中有记录且文件仍然存在）"""
+        with self._lock:
+            row = self._conn.execute("SELECT size, ext FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(digest, row[1])
+        if not path.exists():
+            return None
+        return Blob(digest, row[0], row[1], path)
+
+    def _commit_temp(self, tmp_path: Path, digest: str, size: int, ext: str) -> Blob:
+        """把已写好的临时文件放入存储；已有相同内容时丢弃临时文件"""
+        with self._lock:
+            existing = self.get(digest)
+            if existing is not None:
+                tmp_path.unlink(missing_ok=True)
+                return existing
+            path = self.object_path(digest, ext)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, ext, created_at) VALUES (?, ?, ?, ?)",
+                (digest, size, ext, time.time()),
+            )
+            self.objects_written += 1
+            self.bytes_written += size
+        return Blob(digest, size, ext, path)
+
+    def _temp_path(self) -> Path:
+        return self.tmp / f"{uuid.uuid4().hex}.part"
+
+    def part_path(self, source: str) -> Path:
+        """某个来源下载中的文件：名称固定，中断后再次下载时可以从已有部分继续"""
+        return self.tmp / (hashlib.sha1(source.encode("utf-8")).hexdigest() + ".part")
+
+    def put_part(self, part_path: Union[str, Path], digest: str, size: int, ext: str) -> Blob:
+        """把下载完成、已校验的 .part 文件落盘后放入存储"""
+        part_path = Path(part_path)
+        with open(part_path, "rb+") as f:
+            os.fsync(f.fileno())
+        return self._commit_temp(part_path, digest, size, ext)
+
+    def put_bytes(self, data: bytes, ext: str) -> Blob:
+        """存入内存中的图片；已有相同内容时不写入"""
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.get(digest)
+        if existing is not None:
+            return existing
+        tmp_path = self._temp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._commit_temp(tmp_path, digest, len(data), ext)
+
+    def put_chunks(self, chunks: Iterable[bytes], ext: str, buffering: int = 256 * 1024) -> Blob:
+        """边下载边写入临时文件并计算哈希，完成后放入存储"""
+        tmp_path = self._temp_path()
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb", buffering=buffering) as f:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return self._commit_temp(tmp_path, sha.hexdigest(), size, ext)
+
+    def put_file(self, src: Union[str, Path]) -> Blob:
+        """存入已有的文件（例如之前直接保存在笔记文件夹里的图片）；已有相同内容时不写入"""
+        src = Path(src)
+        sha = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        existing = self.get(digest)
+        if existing is not None:
+            return existing
+        tmp_path = self._temp_path()
+        shutil.copyfile(src, tmp_path)
+        return self._commit_temp(tmp_path, digest, tmp_path.stat().st_size, src.suffix.lower() or ".jpg")
+
+    def link(self, blob: Blob, dest: Union[str, Path]) -> str:
+        """
+        把对象放到 dest：依次尝试硬链接、reflink、复制；dest 已存在时原子替换
+
+        Returns:
+            使用的方式 LINK_HARDLINK / LINK_REFLINK / LINK_COPY
+        """
+        dest = Path(dest)
+        try:
+            if dest.exists() and os.path.samefile(dest, blob.path):
+                mode = LINK_HARDLINK
+                with self._lock:
+                    self.link_counts[mode] += 1
+                return mode
+        except OSError:
+            pass
+        staging = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            try:
+                os.link(blob.path, staging)
+                mode = LINK_HARDLINK
+            except OSError:
+                if _reflink(blob.path, staging):
+                    mode = LINK_REFLINK
+                else:
+                    shutil.copyfile(blob.path, staging)
+                    mode = LINK_COPY
+            os.replace(staging, dest)
+        except BaseException:
+            staging.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self.link_counts[mode] += 1
+        return mode
+
+    def link_file(self, src: Union[str, Path], dest: Union[str, Path]) -> Blob:
+        """把已有文件存入存储（已有相同内容时不写入），再链接到 dest"""
+        blob = self.put_file(src)
+        self.link(blob, dest)
+        return blob
+
+    # ---- 清单 ----
+
+    def lookup_source(self, source: Optional[str]) -> Optional[Blob]:
+        """按来源标识（CDN 图片ID + 规格）查找之前保存过的对象，命中时不需要下载"""
+        if not source:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM sources WHERE source = ?", (source,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def remember_source(self, source: Optional[str], digest: str, url: Optional[str] = None):
+        if not source:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (source, digest, url, updated_at) VALUES (?, ?, ?, ?)",
+                (source, digest, url, time.time()),
+            )
+
+    def record_note_files(self, note_id: str, files: Iterable[tuple]):
+        """
+        记录一篇笔记保存的文件（替换该笔记之前的记录）
+
+        Args:
+            files: (文件路径, 内容哈希, 链接) 列表
+        """
+        now = time.time()
+        rows = [(note_id, str(path), digest, url, now) for path, digest, url in files]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM note_files WHERE note_id = ?", (note_id,))
+                self._conn.executemany(
+                    "INSERT INTO note_files (note_id, path, digest, url, saved_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def note_files(self, note_id: str) -> List[NoteFile]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT note_id, path, digest, url, saved_at FROM note_files WHERE note_id = ? ORDER BY path",
+                (note_id,),
+            ).fetchall()
+        return [NoteFile(*row) for row in rows]
+
+    def notes_using(self, digest: str) -> List[str]:
+        """引用某个对象的笔记ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT note_id FROM note_files WHERE digest = ? ORDER BY note_id", (digest,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            notes = self._conn.execute("SELECT COUNT(DISTINCT note_id) FROM note_files").fetchone()[0]
+            return {
+                "objects": count,
+                "object_bytes": size,
+                "notes": notes,
+                "objects_written": self.objects_written,
+                "bytes_written": self.bytes_written,
+                **self.link_counts,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -13,7 +13,13 @@ from typing import Optional
 from xhs_extractor_module.xhs_fetch import fetch_note_from_share_text, fetch_note_from_url
 from xhs_extractor_module.xhs_share import extract_xhs_url_from_share_text
 from xhs_extractor_module.xhs_login import check_login_state_exists, STATE_PATH
-from xhs_extractor_module.ocr import OCRProcessor, extract_ocr_from_note
+from xhs_extractor_module.ocr import (
+    OCRProcessor, iter_ocr_from_note, merge_ocr_results, warm_up_ocr, STATUS_TIMEOUT,
+)
+from xhs_extractor_module.ocr_cache import get_default_ocr_cache
+from xhs_extractor_module.image_dedup import get_default_dedup_index
+from xhs_extractor_module.ocr_backends import BACKENDS, BACKEND_ENV_VAR
+from xhs_extractor_module.state_archive import StateArchive
 
 
 def print_note_content(note, include_ocr: bool = True, include_images: bool = False):
@@ -74,7 +80,16 @@ def print_note_content(note, include_ocr: bool = True, include_images: bool = Fa
     print("=" * 80)
 
 
-def extract_note(share_text: str, use_ocr: bool = False, include_images: bool = False) -> Optional[object]:
+def extract_note(
+    share_text: str,
+    use_ocr: bool = False,
+    include_images: bool = False,
+    archive_dir: Optional[str] = None,
+    use_ocr_cache: bool = True,
+    use_dedup: bool = False,
+    ocr_time_budget: Optional[float] = None,
+    ocr_backend: Optional[str] = None,
+) -> Optional[object]:
     """
     提取笔记内容
     
@@ -82,6 +97,11 @@ def extract_note(share_text: str, use_ocr: bool = False, include_images: bool =
         share_text: 小红书分享文本或URL
         use_ocr: 是否进行OCR识别
         include_images: 是否在输出中包含图片URL
+        archive_dir: 原始数据归档目录（可选），用于之后离线重新解析
+        use_ocr_cache: 是否使用 OCR 结果缓存（识别过的图片不再重复识别）
+        use_dedup: 是否复用重复图片的识别结果（转载的笔记；近似重复的图片先校验缩略图）
+        ocr_time_budget: 单篇笔记 OCR 的时间上限（秒），超时后只保留已识别的部分
+        ocr_backend: OCR 后端，None 时按环境变量/已安装的后端选择
     
     Returns:
         Note对象，如果失败返回None
@@ -93,22 +113,41 @@ def extract_note(share_text: str, use_ocr: bool = False, include_images: bool =
         return None
     
     try:
+        archive = StateArchive(archive_dir) if archive_dir else None
+        
         # 判断输入是URL还是分享文本
         if share_text.startswith("http://") or share_text.startswith("https://"):
             # 直接是URL
             print(f"正在提取笔记: {share_text}")
-            note = fetch_note_from_url(share_text)
+            note = fetch_note_from_url(share_text, archive=archive)
         else:
             # 是分享文本
             print("正在解析分享文本...")
-            note = fetch_note_from_share_text(share_text)
+            note = fetch_note_from_share_text(share_text, archive=archive)
         
         # OCR处理
         if use_ocr and note.images:
             print(f"\n正在识别 {len(note.images)} 张图片中的文字...")
             try:
-                ocr_processor = OCRProcessor()
-                note.ocr_text = extract_ocr_from_note(note, ocr_processor)
+                ocr_processor = OCRProcessor(
+                    cache=get_default_ocr_cache() if use_ocr_cache else None,
+                    dedup=get_default_dedup_index() if use_dedup else None,
+                    backend=ocr_backend,
+                )
+                # 每张图片识别完成后立即显示，Ctrl+C 中断时保留已识别的部分
+                results = []
+                try:
+                    for result in iter_ocr_from_note(note, ocr_processor, time_budget=ocr_time_budget):
+                        results.append(result)
+                        if result.ok and result.text.strip():
+                            preview = result.text.strip().splitlines()[0][:40]
+                            print(f"   [图片 {result.index + 1}] {preview}")
+                except KeyboardInterrupt:
+                    print("\n⚠ OCR 已中断，保留已识别的部分")
+                note.ocr_text = merge_ocr_results(results, total=len(note.images))
+                timed_out = sum(result.status == STATUS_TIMEOUT for result in results)
+                if timed_out:
+                    print(f"⚠ 超出 OCR 时间上限，{timed_out} 张图片未识别")
                 if note.ocr_text:
                     print(f"✅ OCR识别完成，识别到 {len(note.ocr_text)} 字符")
                 else:
@@ -137,7 +176,7 @@ def extract_note(share_text: str, use_ocr: bool = False, include_images: bool =
         return None
 
 
-def interactive_mode():
+def interactive_mode(ocr_backend: Optional[str] = None):
     """交互式模式"""
     print("=" * 80)
     print("📱 小红书笔记提取工具")
@@ -171,10 +210,12 @@ def interactive_mode():
                 print(f"\n✅ OCR模式已{status}")
                 if use_ocr:
                     print("   注意: OCR需要安装 paddleocr，首次使用可能需要下载模型")
+                    # 在后台预先加载模型，下一次提取时不用等待
+                    warm_up_ocr(backend=ocr_backend)
                 continue
             
             # 提取笔记
-            note = extract_note(user_input, use_ocr=use_ocr)
+            note = extract_note(user_input, use_ocr=use_ocr, ocr_backend=ocr_backend)
             
             if note:
                 print_note_content(note, include_ocr=use_ocr)
@@ -208,6 +249,9 @@ def main():
   
   # 保存到文件
   python -m xhs_extractor_module.cli "分享文本..." > output.txt
+  
+  # 归档原始数据，之后可离线重新解析
+  python -m xhs_extractor_module.cli --archive ./state_archive "分享文本..."
         """
     )
     
@@ -229,6 +273,31 @@ def main():
         help='启用OCR识别图片中的文字（需要安装paddleocr）'
     )
     
+    parser.add_argument(
+        '--no-ocr-cache',
+        action='store_true',
+        help='不使用OCR结果缓存，所有图片重新识别'
+    )
+    
+    parser.add_argument(
+        '--ocr-timeout',
+        type=float,
+        metavar='SECONDS',
+        help='单篇笔记OCR的时间上限（秒），超时后只保留已识别的部分'
+    )
+    
+    parser.add_argument(
+        '--ocr-backend',
+        choices=list(BACKENDS),
+        help=f'OCR后端（默认读取环境变量 {BACKEND_ENV_VAR}，未设置时使用第一个已安装的后端）'
+    )
+    
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='复用重复图片（转载笔记中的同一张图）的识别结果；近似重复的图片先逐块比较缩略图'
+    )
+    
     parser.add_argument(
         '--images', '-i',
         action='store_true',
@@ -247,21 +316,37 @@ def main():
         help='只输出文本内容，不包含统计信息'
     )
     
+    parser.add_argument(
+        '--archive', '-a',
+        type=str,
+        help='把抓取到的原始数据归档到此目录（之后可用 state_archive reparse 离线重新解析）'
+    )
+    
     args = parser.parse_args()
     
     # 如果没有提供输入，进入交互式模式
     if not args.input:
-        interactive_mode()
+        interactive_mode(ocr_backend=args.ocr_backend)
         return
     
+    # 抓取页面的同时在后台加载 OCR 模型
+    if args.ocr:
+        warm_up_ocr(backend=args.ocr_backend)
+    
     # 提取笔记
     input_text = args.input
     if args.url:
         # 如果指定了--url，直接使用输入作为URL
-        note = extract_note(input_text, use_ocr=args.ocr, include_images=args.images)
+        note = extract_note(input_text, use_ocr=args.ocr, include_images=args.images,
+                            archive_dir=args.archive, use_ocr_cache=not args.no_ocr_cache,
+                            use_dedup=args.dedup, ocr_time_budget=args.ocr_timeout,
+                            ocr_backend=args.ocr_backend)
     else:
         # 否则作为分享文本处理
-        note = extract_note(input_text, use_ocr=args.ocr, include_images=args.images)
+        note = extract_note(input_text, use_ocr=args.ocr, include_images=args.images,
+                            archive_dir=args.archive, use_ocr_cache=not args.no_ocr_cache,
+                            use_dedup=args.dedup, ocr_time_budget=args.ocr_timeout,
+                            ocr_backend=args.ocr_backend)
     
     if not note:
         sys.exit(1)
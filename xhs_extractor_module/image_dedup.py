@@ -0,0 +1,454 @@
+# image_dedup.py
+"""
+图片感知哈希去重模块
+转载的笔记经常带着同一张图片，但 CDN 链接各不相同，按链接去重无法识别。
+这里在缩略图上计算差值哈希（dHash），写入磁盘上的紧凑索引；
+再次遇到近似重复的图片时，直接复用之前的识别文本和已保存的文件，跳过 OCR 和原图下载。
+
+dHash 只描述 16×16 的亮度走向，同一模板、文字不同的截图哈希几乎一样（汉明距离 0~6）。
+因此哈希只用来找候选：内容哈希或图片ID完全相同时直接复用，否则还要在 64×64 的缩略图上逐块比较（same_image），
+通过校验才算同一张图片。没有校验缩略图的旧记录只能按内容哈希/图片ID命中。
+
+目录结构：
+    index_root/
+    ├── hashes.bin      # 每张图片 32 字节（256 位 dHash，4 个 uint64），按写入顺序排列
+    └── meta.sqlite3    # 与 hashes.bin 按序号对应的元数据（内容哈希、图片ID、宽高比、校验缩略图、识别文本、文件路径）
+
+查询时把全部哈希读入一个 numpy 数组（每百万张约 32MB），用异或 + popcount 向量化计算汉明距离。
+
+多个进程（如 Web 界面和命令行）可以同时使用同一个索引目录：写入时在 SQLite 的写事务中分配序号，
+哈希按序号写到 hashes.bin 的对应位置；查询前先读入其他进程新增的记录。
+"""
+from __future__ import annotations
+
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# 默认索引目录（保存在模块目录下）
+DEFAULT_DEDUP_DIR = Path(__file__).parent / "phash_index"
+# dHash 网格边长：16×16 = 256 位。面试题截图版式相近，64 位哈希区分度不够
+HASH_SIZE = 16
+# 每个哈希占用的 uint64 个数
+HASH_WORDS = HASH_SIZE * HASH_SIZE // 64
+# 作为候选的最大汉明距离（256 位中不同的位数），候选还要通过缩略图校验
+DEFAULT_MAX_DISTANCE = 4
+# 宽高比相差超过此比例时不视为重复（裁剪、拼图等）
+MAX_ASPECT_DIFF = 0.05
+# 计算哈希前先等间隔采样到的缩略图最长边
+_THUMB_SIDE = 512
+# 相邻块亮度差不超过此值时记为 0：截图大面积纯色背景上的压缩噪声不会让哈希位来回翻转
+_FLAT_DIFF = 4.0
+# 校验缩略图边长（灰度，每张 4KB，压缩后写入 meta.sqlite3）
+VERIFY_SIZE = 64
+# 校验时逐块比较的块边长
+_VERIFY_TILE = 4
+# 任一块的平均亮度差超过此值时不是同一张图片：缩放、重新压缩的差异约为 2，改动一行文字的差异在 10 以上
+VERIFY_MAX_TILE_DIFF = 6.0
+
+
+def _to_gray(image):
+    """BGR/灰度数组 -> 灰度 float32 数组（过大的图片先等间隔采样到 _THUMB_SIDE 的整数倍）"""
+    h, w = image.shape[:2]
+    step = max(1, max(h, w) // _THUMB_SIDE)
+    thumb = image[::step, ::step]
+    if thumb.ndim == 3:
+        return thumb[..., :3].astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    return thumb.astype(np.float32)
+
+
+def _shrink(gray, rows: int, cols: int):
+    """按面积均值缩小到 rows×cols：块边界按比例划分，不同尺寸的同一张图片对应相同的区域"""
+    h, w = gray.shape
+    if h < rows or w < cols:
+        ys = np.linspace(0, h - 1, rows).round().astype(int)
+        xs = np.linspace(0, w - 1, cols).round().astype(int)
+        return gray[np.ix_(ys, xs)]
+    y_edges = np.linspace(0, h, rows + 1).astype(int)
+    x_edges = np.linspace(0, w, cols + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(gray, y_edges[:-1], axis=0), x_edges[:-1], axis=1)
+    return sums / np.outer(np.diff(y_edges), np.diff(x_edges))
+
+
+def dhash(image):
+    """
+    计算图片的 256 位差值哈希
+
+    Args:
+        image: BGR 格式（或灰度）的 numpy 数组
+
+    Returns:
+        形状为 (HASH_WORDS,) 的 uint64 数组
+
+    Raises:
+        ImportError: 未安装 numpy
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("需要安装 numpy: pip install numpy")
+    small = _shrink(_to_gray(image), HASH_SIZE, HASH_SIZE + 1)
+    bits = small[:, 1:] > small[:, :-1] + _FLAT_DIFF
+    return np.packbits(bits.ravel()).view(">u8").astype(np.uint64)
+
+
+def aspect_ratio(image) -> float:
+    h, w = image.shape[:2]
+    return w / h if h else 0.0
+
+
+def thumbnail(image) -> bytes:
+    """VERIFY_SIZE×VERIFY_SIZE 的灰度缩略图（uint8 字节），用于 same_image 校验"""
+    if not NUMPY_AVAILABLE:
+        raise ImportError("需要安装 numpy: pip install numpy")
+    small = _shrink(_to_gray(image), VERIFY_SIZE, VERIFY_SIZE)
+    return np.clip(small, 0, 255).round().astype(np.uint8).tobytes()
+
+
+def _box_blur(a):
+    """3×3 均值模糊：抵消缩放带来的半个像素错位"""
+    p = np.pad(a, 1, mode="edge")
+    h, w = a.shape
+    return sum(p[i:i + h, j:j + w] for i in range(3) for j in range(3)) / 9
+
+
+def same_image(thumb_a: bytes, thumb_b: bytes, max_tile_diff: float = VERIFY_MAX_TILE_DIFF) -> bool:
+    """
+    比较两张校验缩略图是否为同一张图片（允许缩放和重新压缩）
+
+    按 _VERIFY_TILE 分块求平均亮度差，只要有一块超过 max_tile_diff 就不是同一张：
+    文字不同的截图整体差异很小，但差异集中在改动的那几行上。
+    """
+    if len(thumb_a) != len(thumb_b):
+        return False
+    shape = (VERIFY_SIZE, VERIFY_SIZE)
+    a = np.frombuffer(thumb_a, dtype=np.uint8).reshape(shape).astype(np.float32)
+    b = np.frombuffer(thumb_b, dtype=np.uint8).reshape(shape).astype(np.float32)
+    diff = np.abs(_box_blur(a) - _box_blur(b))
+    n = VERIFY_SIZE // _VERIFY_TILE
+    tiles = diff.reshape(n, _VERIFY_TILE, n, _VERIFY_TILE).mean(axis=(1, 3))
+    return float(tiles.max()) <= max_tile_diff
+
+
+class Fingerprint(NamedTuple):
+    """查找和写入索引用的图片特征"""
+    hash: "np.ndarray"     # dhash() 的结果
+    aspect: float          # 宽高比
+    thumb: bytes           # thumbnail() 的结果
+
+
+def fingerprint(image) -> Fingerprint:
+    """
+    计算图片的感知哈希、宽高比和校验缩略图
+
+    Raises:
+        ImportError: 未安装 numpy
+    """
+    return Fingerprint(dhash(image), aspect_ratio(image), thumbnail(image))
+
+
+if NUMPY_AVAILABLE:
+    # numpy < 2.0 没有 bitwise_count 时使用字节查表
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def hamming_distances(hashes, query):
+    """
+    计算 query 与每个哈希的汉明距离
+
+    Args:
+        hashes: 形状为 (n, HASH_WORDS) 的 uint64 数组
+        query: 形状为 (HASH_WORDS,) 的 uint64 数组
+    """
+    x = np.bitwise_xor(hashes, query)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).sum(axis=1, dtype=np.uint16)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(len(x), -1).sum(axis=1, dtype=np.uint16)
+
+
+class DedupMatch(NamedTuple):
+    """一条近似重复的记录"""
+    index: int
+    distance: int
+    content_hash: Optional[str]
+    image_id: Optional[str]
+    text: Optional[str]
+    file: Optional[str]
+
+
+class PerceptualIndex:
+    """磁盘上的感知哈希索引（线程安全，多个进程可以共用同一个目录）"""
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_DEDUP_DIR, max_distance: int = DEFAULT_MAX_DISTANCE):
+        """
+        Args:
+            root: 索引目录
+            max_distance: 判定为近似重复的最大汉明距离
+
+        Raises:
+            ImportError: 未安装 numpy
+        """
+        if not NUMPY_AVAILABLE:
+            raise ImportError("需要安装 numpy: pip install numpy")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max_distance
+        self.hashes_path = self.root / "hashes.bin"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.root / "meta.sqlite3"), timeout=30, check_same_thread=False, isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                idx          INTEGER PRIMARY KEY,
+                content_hash TEXT,
+                image_id     TEXT,
+                aspect       REAL NOT NULL,
+                text         TEXT,
+                file         TEXT,
+                created_at   REAL NOT NULL,
+                thumb        BLOB
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "thumb" not in columns:
+            # 旧版本的索引没有校验缩略图
+            self._conn.execute("ALTER TABLE entries ADD COLUMN thumb BLOB")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_content ON entries (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_image_id ON entries (image_id)")
+        self._load()
+
+    def _load(self):
+        """读取哈希文件，并修复上次异常退出造成的不一致（两边都截到较短的一方）"""
+        record = HASH_WORDS * 8
+        # 在写事务中修复，不会截掉其他进程正在写入的记录
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            size = self.hashes_path.stat().st_size if self.hashes_path.exists() else 0
+            n_bin = size // record
+            n_meta = self._committed_count()
+            n = min(n_bin, n_meta)
+            if size != n * record:
+                with open(self.hashes_path, "r+b" if size else "wb") as f:
+                    f.truncate(n * record)
+            if n_meta > n:
+                self._conn.execute("DELETE FROM entries WHERE idx >= ?", (n,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._hashes = np.empty((1024, HASH_WORDS), dtype=np.uint64)
+        self._count = 0
+        self._refresh()
+
+    def _committed_count(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM entries").fetchone()[0]
+
+    def _refresh(self):
+        """读入其他进程（或本进程）已提交、内存中还没有的记录（调用方持有 self._lock）"""
+        n = self._committed_count()
+        if n <= self._count:
+            return
+        # 提交前哈希已经写入文件，已提交的序号在 hashes.bin 中都有对应的记录
+        data = np.fromfile(
+            self.hashes_path, dtype="<u8", count=(n - self._count) * HASH_WORDS, offset=self._count * HASH_WORDS * 8,
+        )
+        if len(self._hashes) < n:
+            grown = np.empty((max(len(self._hashes) * 2, n), HASH_WORDS), dtype=np.uint64)
+            grown[: self._count] = self._hashes[: self._count]
+            self._hashes = grown
+        self._hashes[self._count:n] = data.reshape(-1, HASH_WORDS)
+        self._count = n
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._count
+
+    @staticmethod
+    def _has_required(require: Optional[str], text: Optional[str], file: Optional[str]) -> bool:
+        if require == "text":
+            return text is not None
+        if require == "file":
+            return bool(file and os.path.exists(file))
+        return True
+
+    def find_exact(
+        self,
+        content_hash: Optional[str] = None,
+        image_id: Optional[str] = None,
+        require: Optional[str] = None,
+    ) -> Optional[DedupMatch]:
+        """
+        按内容哈希或图片ID查找完全相同的图片（不需要解码图片）
+
+        Args:
+            require: "text" 或 "file"，只返回已有识别文本 / 已保存文件的记录
+
+        Returns:
+            最近写入的 DedupMatch（distance 为 0），没有时返回 None
+        """
+        if not (content_hash or image_id):
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, content_hash, image_id, text, file FROM entries "
+                "WHERE content_hash = ? OR image_id = ? ORDER BY idx DESC",
+                (content_hash, image_id),
+            ).fetchall()
+        for idx, entry_hash, entry_image_id, text, file in rows:
+            if self._has_required(require, text, file):
+                return DedupMatch(idx, 0, entry_hash, entry_image_id, text, file)
+        return None
+
+    def find(
+        self,
+        h,
+        aspect: Optional[float] = None,
+        require: Optional[str] = None,
+        max_distance: Optional[int] = None,
+        thumb: Optional[bytes] = None,
+    ) -> Optional[DedupMatch]:
+        """
+        查找最接近的近似重复图片
+
+        Args:
+            h: dhash() 的结果
+            aspect: 图片宽高比，提供时宽高比相差过大的记录不算重复
+            require: "text" 或 "file"，只返回已有识别文本 / 已保存文件的记录
+            max_distance: 覆盖默认的最大汉明距离
+            thumb: thumbnail() 的结果，提供时候选还要通过 same_image 校验（没有校验缩略图的记录不返回）。
+                   只按哈希查找的结果可能是同一模板的另一张截图，复用识别文本或文件前必须校验
+
+        Returns:
+            距离最近的 DedupMatch，没有时返回 None
+        """
+        limit = self.max_distance if max_distance is None else max_distance
+        with self._lock:
+            self._refresh()
+            if not self._count:
+                return None
+            distances = hamming_distances(self._hashes[: self._count], h)
+            candidates = np.flatnonzero(distances <= limit)
+            if not len(candidates):
+                return None
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+            for idx in candidates[:64].tolist():
+                row = self._conn.execute(
+                    "SELECT content_hash, image_id, aspect, text, file, thumb FROM entries WHERE idx = ?", (idx,)
+                ).fetchone()
+                if row is None:
+                    continue
+                content_hash, image_id, entry_aspect, text, file, entry_thumb = row
+                if aspect is not None and entry_aspect and abs(aspect - entry_aspect) > MAX_ASPECT_DIFF * entry_aspect:
+                    continue
+                if not self._has_required(require, text, file):
+                    continue
+                if thumb is not None and not (entry_thumb and same_image(zlib.decompress(entry_thumb), thumb)):
+                    continue
+                return DedupMatch(idx, int(distances[idx]), content_hash, image_id, text, file)
+        return None
+
+    def add(
+        self,
+        h,
+        aspect: float,
+        content_hash: Optional[str] = None,
+        image_id: Optional[str] = None,
+        text: Optional[str] = None,
+        file: Optional[str] = None,
+        thumb: Optional[bytes] = None,
+    ) -> int:
+        """
+        写入一张图片，返回序号
+
+        Args:
+            thumb: thumbnail() 的结果；没有时这条记录只能按内容哈希/图片ID命中
+        """
+        with self._lock:
+            # 写事务在进程之间互斥：序号取自已提交的记录，哈希写到文件中序号对应的位置后再提交
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                idx = self._committed_count()
+                self._conn.execute(
+                    "INSERT INTO entries (idx, content_hash, image_id, aspect, text, file, created_at, thumb) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (idx, content_hash, image_id, aspect, text, file, time.time(),
+                     zlib.compress(thumb) if thumb else None),
+                )
+                with open(self.hashes_path, "r+b" if self.hashes_path.exists() else "wb") as f:
+                    f.seek(idx * HASH_WORDS * 8)
+                    f.write(np.asarray(h, dtype="<u8").tobytes())
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+            return idx
+
+    def update(
+        self, idx: int, text: Optional[str] = None, file: Optional[str] = None, thumb: Optional[bytes] = None,
+    ):
+        """为已有记录补充识别文本、文件路径或（没有时）校验缩略图"""
+        with self._lock:
+            if text is not None:
+                self._conn.execute("UPDATE entries SET text = ? WHERE idx = ?", (text, idx))
+            if file is not None:
+                self._conn.execute("UPDATE entries SET file = ? WHERE idx = ?", (file, idx))
+            if thumb is not None:
+                self._conn.execute(
+                    "UPDATE entries SET thumb = COALESCE(thumb, ?) WHERE idx = ?", (zlib.compress(thumb), idx)
+                )
+
+    def remember(
+        self,
+        h,
+        aspect: float,
+        content_hash: Optional[str] = None,
+        image_id: Optional[str] = None,
+        text: Optional[str] = None,
+        file: Optional[str] = None,
+        thumb: Optional[bytes] = None,
+    ) -> int:
+        """
+        记录一张图片：已有内容哈希/图片ID相同，或哈希相同且通过缩略图校验的记录时补充文本/文件，否则新增
+
+        Returns:
+            记录序号
+        """
+        match = self.find_exact(content_hash=content_hash, image_id=image_id)
+        if match is None and thumb is not None:
+            match = self.find(h, aspect=aspect, max_distance=0, thumb=thumb)
+        if match is not None:
+            self.update(match.index, text=text, file=file, thumb=thumb)
+            return match.index
+        return self.add(h, aspect, content_hash=content_hash, image_id=image_id, text=text, file=file, thumb=thumb)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_DEFAULT_INDEX: Optional[PerceptualIndex] = None
+_DEFAULT_INDEX_LOCK = threading.Lock()
+
+
+def get_default_dedup_index() -> Optional[PerceptualIndex]:
+    """进程内共享的默认索引（模块目录下的 phash_index/）；未安装 numpy 时返回 None"""
+    global _DEFAULT_INDEX
+    if not NUMPY_AVAILABLE:
+        return None
+    with _DEFAULT_INDEX_LOCK:
+        if _DEFAULT_INDEX is None:
+            _DEFAULT_INDEX = PerceptualIndex()
+        return _DEFAULT_INDEX
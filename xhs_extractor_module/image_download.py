@@ -0,0 +1,544 @@
+# image_download.py
+"""
+并发保存图片
+把笔记的多张图片并发下载到本地目录：线程数有上限、复用 HTTP 连接池、以较大的块写入磁盘，
+文件扩展名取自响应的 Content-Type（无法判断时检查文件头）。保存整篇笔记的耗时约等于最慢的一张图片。
+
+下载先写入 .part 文件，长度与 Content-Length / Content-Range 一致后才原子地改名为最终文件，
+目录中不会出现被截断的图片。连接中断时用 Range 请求从断点继续（进程重启后也会从已有的 .part 继续），
+.part 旁边的 .part.json 记录 ETag 和总长度，资源变化时（If-Range 不匹配）重新下载。
+
+    downloader = ImageDownloader(max_workers=8)
+    results = downloader.download_all(urls, save_dir, on_progress=lambda done, total, nbytes: ...)
+    for result in results:
+        print(result.path or result.error)
+"""
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ocr import IMAGE_HEADERS
+from .xhs_url import image_id_from_url
+
+
+# 并发下载的线程数
+IMAGE_DOWNLOAD_WORKERS = 8
+# (连接超时, 读取超时) 秒；读取超时是两次收到数据之间的最长间隔
+IMAGE_DOWNLOAD_TIMEOUT = (5, 30)
+# 每次从响应读取、写入磁盘的块大小
+CHUNK_SIZE = 256 * 1024
+# Content-Type 无法判断格式时使用的扩展名
+DEFAULT_EXTENSION = ".jpg"
+# 一次下载中连接中断、读取超时或长度不足时，从断点续传的最多尝试次数
+RESUME_ATTEMPTS = 3
+# 下载中的文件后缀
+PART_SUFFIX = ".part"
+
+_CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/pjpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/heic": ".heic",
+    "image/heif": ".heif",
+    "image/bmp": ".bmp",
+}
+# 保存的图片可能使用的扩展名
+IMAGE_EXTENSIONS = frozenset(_CONTENT_TYPE_EXTENSIONS.values()) | {DEFAULT_EXTENSION}
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """根据文件头判断图片格式，无法判断时返回 None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return ".avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return ".heic"
+    if head.startswith(b"BM"):
+        return ".bmp"
+    return None
+
+
+def image_extension(content_type: str, head: bytes = b"") -> str:
+    """
+    图片文件扩展名：优先使用 Content-Type，无法识别（如 application/octet-stream）时检查文件头
+
+    Args:
+        content_type: 响应的 Content-Type（可以带 ; charset 等参数）
+        head: 文件开头的若干字节
+    """
+    mime = (content_type or "").split(";")[0].strip().lower()
+    return _CONTENT_TYPE_EXTENSIONS.get(mime) or sniff_extension(head) or DEFAULT_EXTENSION
+
+
+def remove_stale_variants(path: Union[str, Path]) -> List[Path]:
+    """
+    删除与 path 同名、扩展名不同的旧图片：重新保存时图片格式可能变化（例如 image_001.webp -> image_001.jpg），
+    旧文件不删除会和新文件同时留在笔记文件夹中。只删除 IMAGE_EXTENSIONS 中的扩展名
+
+    Returns:
+        删除的文件
+    """
+    path = Path(path)
+    removed = []
+    for ext in sorted(IMAGE_EXTENSIONS):
+        other = path.with_suffix(ext)
+        if other != path and (other.exists() or other.is_symlink()):
+            other.unlink(missing_ok=True)
+            removed.append(other)
+    return removed
+
+
+class IncompleteDownload(requests.RequestException):
+    """收到的字节数与服务器声明的长度不一致（.part 文件保留，之后从断点继续）"""
+
+
+@contextlib.contextmanager
+def _staged(path: Path) -> Iterator[Path]:
+    """在同一目录的临时文件中写入，成功后 fsync 并原子替换 path；失败时删除临时文件"""
+    staging = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    try:
+        yield staging
+        _fsync(staging)
+        os.replace(staging, path)
+    except BaseException:
+        staging.unlink(missing_ok=True)
+        raise
+
+
+def _fsync(path: Path):
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes):
+    """原子写入文件：崩溃时 path 要么是旧内容，要么是完整的新内容"""
+    with _staged(Path(path)) as staging:
+        staging.write_bytes(data)
+
+
+def atomic_copy(src: Union[str, Path], dest: Union[str, Path]):
+    """原子地复制文件（保留修改时间等元数据）"""
+    with _staged(Path(dest)) as staging:
+        shutil.copy2(src, staging)
+
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def _parse_content_range(value: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Content-Range: bytes 起始-结束/总长 -> (起始, 总长)；无法解析时为 (None, None)"""
+    match = _CONTENT_RANGE.match(value or "")
+    if match is None:
+        return None, None
+    total = match.group(3)
+    return int(match.group(1)), (int(total) if total != "*" else None)
+
+
+def _declared_length(response) -> Optional[int]:
+    """200 响应声明的内容长度；经过压缩传输时解码后的长度不同，不做校验"""
+    if response.headers.get("Content-Encoding", "identity").lower() not in ("", "identity"):
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _part_meta_path(part: Path) -> Path:
+    return part.with_name(part.name + ".json")
+
+
+def _discard_part(part: Path):
+    part.unlink(missing_ok=True)
+    _part_meta_path(part).unlink(missing_ok=True)
+
+
+def _load_part_meta(part: Path, key: str) -> dict:
+    """读取可以续传的 .part 的记录；不存在、来源不同或记录损坏时删除 .part，返回空字典"""
+    try:
+        meta = json.loads(_part_meta_path(part).read_text(encoding="utf-8"))
+        if isinstance(meta, dict) and meta.get("key") == key and part.exists():
+            return meta
+    except (OSError, ValueError):
+        pass
+    _discard_part(part)
+    return {}
+
+
+def _read_head(path: Path, n: int = 16) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(n)
+
+
+def _hash_prefix(path: Path, size: int):
+    """文件前 size 字节的 sha256（续传时接着计算）"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE * 4, remaining))
+            if not chunk:
+                break
+            sha.update(chunk)
+            remaining -= len(chunk)
+    return sha
+
+
+def source_key(url: str) -> Optional[str]:
+    """
+    同一张图片同一规格的稳定标识：图片ID加上 "!" 后的规格后缀
+    （同一图片ID的不同规格内容不同，不能共用一个对象）
+    """
+    image_id = image_id_from_url(url)
+    spec = urlsplit(url).path.rsplit("/", 1)[-1].partition("!")[2]
+    return f"{image_id}!{spec}" if image_id and spec else image_id
+
+
+@dataclass
+class SavedImage:
+    """一张图片的保存结果"""
+    index: int                   # 在输入列表中的序号（从 0 开始）
+    url: str
+    path: Optional[Path] = None  # 保存的文件，失败时为 None
+    nbytes: int = 0
+    seconds: float = 0.0
+    reused: bool = False         # 没有下载（复制了近似重复的文件等）
+    error: Optional[str] = None
+    digest: Optional[str] = None  # 使用 BlobStore 时文件内容的 sha256
+    etag: Optional[str] = None    # 响应的 ETag，下次保存时用于条件请求
+    unchanged: bool = False       # 本地文件已是最新（未下载、未写入）
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+
+class Validator(NamedTuple):
+    """之前保存的文件，用于条件请求"""
+    path: Path
+    etag: Optional[str]
+
+
+class _Part(NamedTuple):
+    """下载完成、长度已校验的 .part 文件"""
+    path: Path
+    size: int
+    content_type: str
+    etag: Optional[str]
+    digest: Optional[str]
+
+
+class _Fetched(NamedTuple):
+    path: Path
+    digest: Optional[str] = None
+    etag: Optional[str] = None
+    not_modified: bool = False
+
+
+def make_session(pool_size: int = IMAGE_DOWNLOAD_WORKERS) -> requests.Session:
+    """带连接池的 Session：同一 CDN 主机的多次下载复用 TCP/TLS 连接"""
+    session = requests.Session()
+    session.headers.update(IMAGE_HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ImageDownloader:
+    """并发下载图片到本地目录"""
+
+    def __init__(
+        self,
+        max_workers: int = IMAGE_DOWNLOAD_WORKERS,
+        timeout=IMAGE_DOWNLOAD_TIMEOUT,
+        image_store=None,
+        session: Optional[requests.Session] = None,
+        blob_store=None,
+    ):
+        """
+        Args:
+            max_workers: 并发下载的线程数
+            timeout: requests 的超时参数（秒，或 (连接超时, 读取超时)）
+            image_store: 共享的图片下载层（image_store.ImageStore），其中已有的图片直接写出，不再下载
+            session: 自定义的 requests.Session，默认 make_session(max_workers)
+            blob_store: 按内容寻址的存储（blob_store.BlobStore），指定时图片存入其中，
+                        再硬链接到 dest_dir；之前保存过的图片不再下载
+        """
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.image_store = image_store
+        self.session = session or make_session(self.max_workers)
+        self.blob_store = blob_store
+        self._part_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def download(self, url: str, dest_dir: Path, stem: str) -> Path:
+        """
+        下载一张图片到 dest_dir/stem + 扩展名
+
+        Returns:
+            保存的文件路径
+
+        Raises:
+            requests.RequestException / OSError: 下载或写入失败（不留下不完整的图片文件，
+                已收到的部分保存在 .part 中，再次下载时从断点继续）
+        """
+        return self._download(url, Path(dest_dir), stem).path
+
+    def _fetch_part(self, url: str, part: Path, validator: Optional[Validator], digest: bool = False) -> Optional[_Part]:
+        """
+        把图片下载到 part：已有可续传的 .part 时发送 Range（带 If-Range），连接中断或长度不足时从断点重试
+
+        Args:
+            validator: 没有可续传的 .part 时，用之前保存的 ETag 发送 If-None-Match
+            digest: 是否计算 sha256（续传时先读取已有部分）
+
+        Returns:
+            完整的 .part；服务器返回 304 时返回 None
+
+        Raises:
+            IncompleteDownload: 多次续传后仍不完整（.part 保留，之后的下载从断点继续）
+            requests.RequestException / OSError: 其他下载或写入失败
+        """
+        key = source_key(url) or url
+        meta = _load_part_meta(part, key)
+        sha = hashlib.sha256() if digest else None
+        hashed = 0
+        last_error: Optional[Exception] = None
+        for _ in range(RESUME_ATTEMPTS):
+            offset = part.stat().st_size if meta else 0
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if meta.get("etag"):
+                    headers["If-Range"] = meta["etag"]
+            elif validator is not None and validator.etag:
+                headers["If-None-Match"] = validator.etag
+            try:
+                with self.session.get(url, timeout=self.timeout, stream=True, headers=headers or None) as response:
+                    if response.status_code == 304 and not offset:
+                        return None
+                    if response.status_code == 416 and offset:
+                        # 请求的范围超出了文件：.part 已经完整，或服务器上的文件变短了
+                        if meta.get("length") == offset:
+                            break
+                        _discard_part(part)
+                        meta, hashed = {}, 0
+                        continue
+                    response.raise_for_status()
+                    start, total = _parse_content_range(response.headers.get("Content-Range"))
+                    if response.status_code == 206 and start != offset:
+                        # 返回的范围不是从断点开始：这部分内容既不能续接也不是完整内容，丢弃 .part 后不带 Range 重新下载
+                        _discard_part(part)
+                        meta, hashed = {}, 0
+                        last_error = IncompleteDownload(f"Content-Range 起点 {start} 与断点 {offset} 不一致")
+                        continue
+                    if response.status_code == 206 and offset:
+                        mode = "ab"
+                        if meta.get("length") is None:
+                            meta["length"] = total
+                    else:
+                        # 服务器不支持 Range 或 If-Range 不匹配（资源已变化），返回了完整内容：从头写入。
+                        # 没有请求范围却返回了从 0 开始的 206 时，总长取 Content-Range 中的值，不足的部分之后续传
+                        mode, offset, hashed = "wb", 0, 0
+                        meta = {
+                            "key": key,
+                            "url": url,
+                            "etag": response.headers.get("ETag"),
+                            "content_type": response.headers.get("Content-Type", ""),
+                            "length": total if response.status_code == 206 else _declared_length(response),
+                        }
+                        _part_meta_path(part).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+                    if sha is not None:
+                        if mode == "wb":
+                            sha = hashlib.sha256()
+                        elif hashed != offset:
+                            sha, hashed = _hash_prefix(part, offset), offset
+                    with open(part, mode, buffering=CHUNK_SIZE) as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+                            if sha is not None:
+                                sha.update(chunk)
+                                hashed += len(chunk)
+                size = part.stat().st_size
+                expected = meta.get("length")
+                if expected is not None and size != expected:
+                    if size > expected:
+                        _discard_part(part)
+                        meta, hashed = {}, 0
+                    raise IncompleteDownload(f"收到 {size} 字节，应为 {expected} 字节")
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    IncompleteDownload) as e:
+                last_error = e
+        else:
+            raise last_error or IncompleteDownload("下载未完成")
+
+        size = part.stat().st_size
+        if sha is not None and hashed != size:
+            sha = _hash_prefix(part, size)
+        return _Part(
+            part, size, meta.get("content_type", ""), meta.get("etag"),
+            sha.hexdigest() if sha is not None else None,
+        )
+
+    def _part_lock(self, part: Path) -> threading.Lock:
+        """同一个 .part 同时只由一个线程写入（同一篇笔记中重复出现的图片）"""
+        with self._locks_guard:
+            return self._part_locks.setdefault(str(part), threading.Lock())
+
+    def _download(self, url: str, dest_dir: Path, stem: str, validator: Optional[Validator] = None) -> _Fetched:
+        """下载一张图片（validator 指定之前保存的文件和 ETag 时发送条件请求，304 时沿用原文件），并删除同名的其他格式"""
+        fetched = self._fetch(url, dest_dir, stem, validator)
+        if not fetched.not_modified:
+            remove_stale_variants(fetched.path)
+        return fetched
+
+    def _fetch(self, url: str, dest_dir: Path, stem: str, validator: Optional[Validator]) -> _Fetched:
+        if self.blob_store is not None:
+            return self._download_to_blob(url, dest_dir, stem, validator)
+        downloaded = self.image_store.get(url) if self.image_store is not None else None
+        if downloaded is not None:
+            data, content_type = downloaded
+            path = dest_dir / (stem + image_extension(content_type, data[:16]))
+            atomic_write_bytes(path, data)
+            return _Fetched(path)
+
+        part_path = dest_dir / f".{stem}{PART_SUFFIX}"
+        with self._part_lock(part_path):
+            part = self._fetch_part(url, part_path, validator)
+            if part is None:
+                return _Fetched(validator.path, etag=validator.etag, not_modified=True)
+            path = dest_dir / (stem + image_extension(part.content_type, _read_head(part.path)))
+            _fsync(part.path)
+            os.replace(part.path, path)
+            _part_meta_path(part.path).unlink(missing_ok=True)
+        return _Fetched(path, etag=part.etag)
+
+    def _download_to_blob(self, url: str, dest_dir: Path, stem: str, validator: Optional[Validator]) -> _Fetched:
+        """存入 BlobStore 再链接到笔记文件夹；同一图片ID已保存过时不下载"""
+        key = source_key(url)
+        etag = None
+        part_path = self.blob_store.part_path(key or url)
+        with self._part_lock(part_path):
+            blob = self.blob_store.lookup_source(key)
+            if blob is None:
+                downloaded = self.image_store.get(url) if self.image_store is not None else None
+                if downloaded is not None:
+                    data, content_type = downloaded
+                    blob = self.blob_store.put_bytes(data, image_extension(content_type, data[:16]))
+                else:
+                    part = self._fetch_part(url, part_path, validator, digest=True)
+                    if part is None:
+                        return _Fetched(validator.path, etag=validator.etag, not_modified=True)
+                    etag = part.etag
+                    ext = image_extension(part.content_type, _read_head(part.path))
+                    blob = self.blob_store.put_part(part.path, part.digest, part.size, ext)
+                    _part_meta_path(part.path).unlink(missing_ok=True)
+                self.blob_store.remember_source(key, blob.digest, url)
+        path = dest_dir / (stem + blob.ext)
+        self.blob_store.link(blob, path)
+        return _Fetched(path, digest=blob.digest, etag=etag)
+
+    def _save(self, index: int, url: str, dest_dir: Path, stem: str, prepare, validator) -> SavedImage:
+        start = time.perf_counter()
+        try:
+            if prepare is not None:
+                prepared = prepare(index, url, dest_dir, stem)
+                if prepared is not None:
+                    if prepared.ok and not prepared.unchanged:
+                        remove_stale_variants(prepared.path)
+                    prepared.seconds = time.perf_counter() - start
+                    return prepared
+            fetched = self._download(url, dest_dir, stem, validator)
+            return SavedImage(
+                index, url, path=fetched.path, nbytes=fetched.path.stat().st_size,
+                seconds=time.perf_counter() - start, digest=fetched.digest, etag=fetched.etag,
+                unchanged=fetched.not_modified,
+            )
+        except Exception as e:
+            return SavedImage(index, url, seconds=time.perf_counter() - start, error=str(e))
+
+    def download_all(
+        self,
+        urls: List[str],
+        dest_dir: Path,
+        stems: Optional[List[str]] = None,
+        on_progress: Optional[Callable[[int, int, int], None]] = None,
+        prepare: Optional[Callable[[int, str, Path, str], Optional[SavedImage]]] = None,
+        validators: Optional[Dict[int, Validator]] = None,
+    ) -> List[SavedImage]:
+        """
+        并发下载多张图片
+
+        Args:
+            urls: 图片链接
+            dest_dir: 保存目录
+            stems: 每张图片的文件名（不含扩展名），默认 image_001、image_002 ...
+            on_progress: 进度回调 (已完成张数, 总张数, 已保存字节数)，在调用线程中执行（可以直接更新界面）
+            prepare: 可选的预处理 (序号, 链接, 目录, 文件名) -> SavedImage 或 None；
+                     返回 SavedImage 时跳过下载（例如复制近似重复的文件），在下载线程中执行
+            validators: 序号 -> 之前保存的文件和 ETag，下载时发送 If-None-Match，
+                        返回 304 时沿用原文件（SavedImage.unchanged 为 True）
+
+        Returns:
+            按输入顺序排列的 SavedImage 列表（失败的图片 path 为 None、error 为原因）
+        """
+        dest_dir = Path(dest_dir)
+        stems = stems or [f"image_{i + 1:03d}" for i in range(len(urls))]
+        results: List[Optional[SavedImage]] = [None] * len(urls)
+        if not urls:
+            return []
+        validators = validators or {}
+        done = nbytes = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)), thread_name_prefix="image-save") as executor:
+            futures = [
+                executor.submit(self._save, i, url, dest_dir, stems[i], prepare, validators.get(i))
+                for i, url in enumerate(urls)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result.index] = result
+                done += 1
+                nbytes += result.nbytes
+                if on_progress is not None:
+                    on_progress(done, len(urls), nbytes)
+        return results
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
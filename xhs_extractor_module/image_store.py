@@ -0,0 +1,170 @@
+# image_store.py
+"""
+共享的图片下载层
+Web 界面一次提取中，同一张图片会被 OCR、预览和保存分别用到。ImageStore 把每个链接只下载一次，
+字节保存在内存中（总量有上限，超出时淘汰最久未使用的图片），三处都从这一份副本读取。
+
+    store = ImageStore()
+    processor = OCRProcessor(image_store=store)    # OCR 从 store 取图
+    st.image(store.fetch(url)[0])                  # 预览复用已下载的字节
+    save_note_to_local(note, ..., image_store=store)  # 保存时直接写出字节
+
+多个线程同时请求同一个链接时只有一个线程下载，其余线程等待结果。
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+
+# 内存中保留的图片总字节数上限
+DEFAULT_STORE_BYTES = 256 * 1024 * 1024
+
+# (图片字节, Content-Type)
+Downloaded = Tuple[bytes, str]
+
+
+class _Flight:
+    """一个链接正在进行的下载"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Downloaded] = None
+
+
+class ImageStore:
+    """按链接缓存图片字节，每个链接只下载一次（线程安全）"""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_STORE_BYTES,
+        fetcher: Optional[Callable[[str], Optional[Downloaded]]] = None,
+    ):
+        """
+        Args:
+            max_bytes: 内存中保留的图片总字节数上限，超出时淘汰最久未使用的图片（之后再用到会重新下载）
+            fetcher: 下载函数 url -> (字节, Content-Type) 或 None，默认 ocr._download_image_for_ocr
+        """
+        self.max_bytes = max(0, max_bytes)
+        self._fetcher = fetcher
+        self._items: "OrderedDict[str, Downloaded]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        # 统计：实际下载次数 / 下载的字节数 / 直接使用已下载副本的次数 / 下载失败次数
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.hits = 0
+        self.failures = 0
+
+    def _download(self, url: str) -> Optional[Downloaded]:
+        if self._fetcher is not None:
+            return self._fetcher(url)
+        from .ocr import _download_image_for_ocr
+        return _download_image_for_ocr(url)
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def nbytes(self) -> int:
+        """当前保留的字节数"""
+        return self._bytes
+
+    def get(self, url: str) -> Optional[Downloaded]:
+        """已下载时返回 (字节, Content-Type)，否则返回 None（不下载）"""
+        with self._lock:
+            item = self._items.get(url)
+            if item is not None:
+                self._items.move_to_end(url)
+                self.hits += 1
+            return item
+
+    def put(self, url: str, data: bytes, content_type: str = ""):
+        """放入已经拿到的图片字节"""
+        with self._lock:
+            self._put_locked(url, (data, content_type))
+
+    def _put_locked(self, url: str, item: Downloaded):
+        old = self._items.pop(url, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        if len(item[0]) > self.max_bytes:
+            return
+        self._items[url] = item
+        self._bytes += len(item[0])
+        while self._bytes > self.max_bytes:
+            _, (data, _) = self._items.popitem(last=False)
+            self._bytes -= len(data)
+
+    def fetch(self, url: str) -> Optional[Downloaded]:
+        """
+        取得图片：已下载时直接返回，否则下载一次（同一链接的并发请求共用这次下载）
+
+        Returns:
+            (图片字节, Content-Type)，下载失败时返回 None（失败不缓存，下次会重试）
+        """
+        with self._lock:
+            item = self._items.get(url)
+            if item is not None:
+                self._items.move_to_end(url)
+                self.hits += 1
+                return item
+            flight = self._inflight.get(url)
+            owner = flight is None
+            if owner:
+                flight = self._inflight[url] = _Flight()
+        if not owner:
+            # 其他线程正在下载同一链接，等待并共用它的结果
+            flight.done.wait()
+            with self._lock:
+                if flight.result is not None:
+                    self.hits += 1
+            return flight.result
+
+        try:
+            flight.result = self._download(url)
+        finally:
+            with self._lock:
+                if flight.result is not None:
+                    self.downloads += 1
+                    self.downloaded_bytes += len(flight.result[0])
+                    self._put_locked(url, flight.result)
+                else:
+                    self.failures += 1
+                del self._inflight[url]
+            flight.done.set()
+        return flight.result
+
+    def save(self, url: str, path: Union[str, Path]) -> bool:
+        """取得图片并写入文件，失败时返回 False"""
+        item = self.fetch(url)
+        if item is None:
+            return False
+        from .image_download import atomic_write_bytes
+        atomic_write_bytes(path, item[0])
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """下载统计"""
+        with self._lock:
+            return {
+                "downloads": self.downloads,
+                "downloaded_bytes": self.downloaded_bytes,
+                "hits": self.hits,
+                "failures": self.failures,
+                "cached": len(self._items),
+                "cached_bytes": self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
@@ -4,21 +4,211 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import json
 import uuid
+import zlib
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+# 图片 CDN 规格从小到大的顺序：WB_PRV 预览图 < WB_DFT 默认展示图 < ORIGIN 原图
+IMAGE_SCENE_RANK = {"WB_PRV": 0, "WB_DFT": 1, "ORIGIN": 2}
+# OCR 可接受的最小图片宽度（像素），已知宽度小于此值的规格认为不够清晰
+OCR_MIN_IMAGE_WIDTH = 720
+
+
+def _variant_rank(variant: Dict[str, Any]) -> int:
+    """规格大小排序；未知规格按默认展示图处理"""
+    return IMAGE_SCENE_RANK.get(variant.get("scene"), IMAGE_SCENE_RANK["WB_DFT"])
+
+
+def select_image_variant(entry: Dict[str, Any], purpose: str = "ocr", min_width: int = OCR_MIN_IMAGE_WIDTH) -> Optional[str]:
+    """
+    从一张图片的所有 CDN 规格中选择链接
+
+    Args:
+        entry: Note.image_variants 中的一项：{"url", "width", "height", "variants": [{"scene", "url", "width"}]}
+        purpose: "ocr" 选择仍然清晰的最小规格（下载和解码最快），"archive" 选择原图（没有原图时选最大规格）
+        min_width: OCR 可接受的最小宽度；规格没有宽度信息时认为足够清晰
+
+    Returns:
+        图片链接，没有任何规格时返回 entry["url"]
+    """
+    variants = sorted(entry.get("variants") or [], key=_variant_rank)
+    if not variants:
+        return entry.get("url")
+    if purpose == "archive":
+        return variants[-1]["url"]
+    if purpose != "ocr":
+        raise ValueError(f"不支持的用途: {purpose}，可选: ocr, archive")
+    for variant in variants:
+        width = variant.get("width")
+        if width is None or width >= min_width:
+            return variant["url"]
+    # 所有规格都偏小时用最大的
+    return variants[-1]["url"]
 
 
-@dataclass
 class Note:
     """
     表示一篇小红书面经笔记（已经经过解析+OCR）
+
+    批量模式下会同时驻留成千上万个 Note，所以这里用 __slots__ 代替普通 dataclass，
+    并且 raw 只以压缩后的 JSON 字节保存，访问 note.raw 时才解码。
+    注意：note.raw 每次返回新解码的字典，修改后需要重新赋值才会生效。
     """
-    id: str                     # 你自己生成的 note_id，比如用小红书 noteId 或者 uuid
-    url: str                    # 笔记链接
-    title: str                  # 笔记标题
-    text: str                   # 纯文本内容（正文 + 你认为有用的补充）
-    ocr_text: str = ""          # 所有图片 OCR 文本合并
-    images: List[str] = field(default_factory=list)  # 图片 URL 列表
-    raw: Dict[str, Any] = field(default_factory=dict)  # 原始 JSON/HTML 解析结果，调试用
+    __slots__ = ("id", "url", "title", "text", "ocr_text", "images", "image_variants", "_raw_blob")
+
+    # 新建 Note 时是否保留 raw；批量处理不需要原始数据时可以设为 False
+    KEEP_RAW = True
+    # raw 的 zlib 压缩级别（1 最快，9 最小）
+    RAW_COMPRESS_LEVEL = 3
+
+    def __init__(
+        self,
+        id: str,                    # 你自己生成的 note_id，比如用小红书 noteId 或者 uuid
+        url: str,                   # 笔记链接
+        title: str,                 # 笔记标题
+        text: str,                  # 纯文本内容（正文 + 你认为有用的补充）
+        ocr_text: str = "",         # 所有图片 OCR 文本合并
+        images: Optional[List[str]] = None,     # 图片 URL 列表
+        raw: Optional[Dict[str, Any]] = None,   # 原始 JSON/HTML 解析结果，调试用
+        keep_raw: Optional[bool] = None,        # 是否保留 raw，默认取 Note.KEEP_RAW
+        image_variants: Optional[List[Dict[str, Any]]] = None,  # 每张图片的全部 CDN 规格，与 images 一一对应
+    ):
+        self.id = id
+        self.url = url
+        self.title = title
+        self.text = text
+        self.ocr_text = ocr_text
+        self.images = list(images) if images else []
+        self.image_variants = list(image_variants) if image_variants else []
+        self._raw_blob: Optional[bytes] = None
+        if keep_raw if keep_raw is not None else self.KEEP_RAW:
+            self.raw = raw
+
+    # ---- raw 的延迟解码 ----
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """原始解析结果（按需从压缩字节解码）"""
+        if self._raw_blob is None:
+            return {}
+        return json.loads(zlib.decompress(self._raw_blob))
+
+    @raw.setter
+    def raw(self, value: Optional[Dict[str, Any]]):
+        if not value:
+            self._raw_blob = None
+            return
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        self._raw_blob = zlib.compress(data.encode("utf-8"), self.RAW_COMPRESS_LEVEL)
+
+    @property
+    def raw_nbytes(self) -> int:
+        """raw 压缩后占用的字节数"""
+        return len(self._raw_blob) if self._raw_blob is not None else 0
+
+    def drop_raw(self) -> None:
+        """丢弃原始数据，释放内存"""
+        self._raw_blob = None
+
+    # ---- 图片规格选择 ----
+
+    def ocr_image_urls(self, min_width: int = OCR_MIN_IMAGE_WIDTH) -> List[str]:
+        """OCR 用的图片链接：每张图片仍然清晰的最小规格（没有规格信息时同 images）"""
+        if not self.image_variants:
+            return list(self.images)
+        return [select_image_variant(entry, "ocr", min_width) for entry in self.image_variants]
+
+    def archive_image_urls(self) -> List[str]:
+        """保存到本地用的图片链接：每张图片的原图或最大规格（没有规格信息时同 images）"""
+        if not self.image_variants:
+            return list(self.images)
+        return [select_image_variant(entry, "archive") for entry in self.image_variants]
+
+    # ---- 序列化 ----
+
+    def to_dict(self, include_raw: bool = True) -> Dict[str, Any]:
+        """转换为普通字典（raw 会被解码）"""
+        data = {
+            "id": self.id,
+            "url": self.url,
+            "title": self.title,
+            "text": self.text,
+            "ocr_text": self.ocr_text,
+            "images": list(self.images),
+            "image_variants": list(self.image_variants),
+        }
+        if include_raw:
+            data["raw"] = self.raw
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], keep_raw: Optional[bool] = None) -> "Note":
+        """从 to_dict() 的结果还原"""
+        return cls(
+            id=data["id"],
+            url=data.get("url", ""),
+            title=data.get("title", ""),
+            text=data.get("text", ""),
+            ocr_text=data.get("ocr_text", ""),
+            images=data.get("images") or [],
+            raw=data.get("raw"),
+            keep_raw=keep_raw,
+            image_variants=data.get("image_variants") or [],
+        )
+
+    def to_msgpack(self, include_raw: bool = True) -> bytes:
+        """
+        序列化为 msgpack 字节；raw 直接写入压缩字节，不需要解码
+
+        Raises:
+            ImportError: 未安装 msgpack
+        """
+        if not MSGPACK_AVAILABLE:
+            raise ImportError("需要安装 msgpack: pip install msgpack")
+        data = self.to_dict(include_raw=False)
+        if include_raw and self._raw_blob is not None:
+            data["raw_z"] = self._raw_blob
+        return msgpack.packb(data, use_bin_type=True)
+
+    @classmethod
+    def from_msgpack(cls, payload: bytes, keep_raw: Optional[bool] = None) -> "Note":
+        """
+        从 to_msgpack() 的结果还原
+
+        Raises:
+            ImportError: 未安装 msgpack
+        """
+        if not MSGPACK_AVAILABLE:
+            raise ImportError("需要安装 msgpack: pip install msgpack")
+        data = msgpack.unpackb(payload, raw=False)
+        note = cls.from_dict(data, keep_raw=False)
+        if keep_raw if keep_raw is not None else cls.KEEP_RAW:
+            note._raw_blob = data.get("raw_z")
+        return note
+
+    # ---- 与 dataclass 保持一致的行为 ----
+
+    def __eq__(self, other):
+        if not isinstance(other, Note):
+            return NotImplemented
+        return (
+            self.to_dict(include_raw=False) == other.to_dict(include_raw=False)
+            and self.raw == other.raw
+        )
+
+    def __repr__(self):
+        return (
+            f"Note(id={self.id!r}, url={self.url!r}, title={self.title!r}, "
+            f"text={self.text[:50]!r}, ocr_text={self.ocr_text[:50]!r}, "
+            f"images=<{len(self.images)} 张>, raw=<{self.raw_nbytes} 字节压缩>)"
+        )
 
 
 @dataclass
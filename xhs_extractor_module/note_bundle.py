@@ -0,0 +1,530 @@
+# note_bundle.py
+"""
+单文件笔记归档
+数量很大时，每篇笔记一个文件夹、每个文件夹若干个小文件（web_app.save_note_to_local）在创建、同步和备份时
+都受限于文件元数据操作。这里把笔记、OCR 文本和图片写入一个文件，按笔记ID随机读取：
+
+- SQLite（.sqlite / .db，默认）：WAL 模式，按批提交事务；图片按内容（sha256）只存一份；
+  同一篇笔记再次写入时替换旧记录
+- ZIP（.zip）：笔记 JSON 压缩存储，图片不再压缩（本身已是压缩格式）；
+  中央目录提供按名称的随机读取，追加写入不需要重写已有内容
+
+    with open_bundle("notes.sqlite") as bundle:
+        bundle.add_note(note, images=[jpg_bytes, Path("image_002.webp"), None])
+    with open_bundle("notes.sqlite", readonly=True) as bundle:
+        note = bundle.get(note_id)
+        data = bundle.read_image(note_id, 0)
+
+命令行：
+    python -m xhs_extractor_module.note_bundle export notes.sqlite notes.jsonl --images ./xhs_notes
+    python -m xhs_extractor_module.note_bundle ls notes.sqlite
+    python -m xhs_extractor_module.note_bundle extract notes.sqlite <笔记ID> ./out
+"""
+from __future__ import annotations
+
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import zipfile
+import warnings
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+from .models import Note
+from .image_download import DEFAULT_EXTENSION, sniff_extension
+
+
+PathLike = Union[str, Path]
+# 一张图片：字节、文件路径，或 None（没有这张图片）
+ImageSource = Optional[Union[bytes, PathLike]]
+
+BUNDLE_FORMATS = ("sqlite", "zip")
+# SQLite 归档每个事务写入的笔记数
+DEFAULT_BATCH_SIZE = 500
+
+
+class BundledImage(NamedTuple):
+    """归档中一篇笔记的一张图片"""
+    index: int
+    name: str           # 文件名，如 image_001.webp
+    url: Optional[str]
+    digest: str         # 内容的 sha256
+    size: int
+
+
+def bundle_format(path: PathLike) -> str:
+    """按后缀判断归档格式：.zip 为 ZIP，其余为 SQLite"""
+    return "zip" if Path(path).suffix.lower() == ".zip" else "sqlite"
+
+
+def _read_image(source: ImageSource) -> Optional[bytes]:
+    if source is None:
+        return None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    return Path(source).read_bytes()
+
+
+def _image_ext(source: ImageSource, data: bytes) -> str:
+    ext = sniff_extension(data[:16])
+    if ext is None and isinstance(source, (str, Path)):
+        ext = Path(source).suffix.lower() or None
+    return ext or DEFAULT_EXTENSION
+
+
+def _prepare_images(note: Note, images: Optional[Sequence[ImageSource]]) -> List[tuple]:
+    """
+    读取图片，返回 [(BundledImage, 字节)]
+
+    图片与 note.archive_image_urls() 一一对应（用于记录每张图片的链接），没有的图片传 None
+    """
+    if not images:
+        return []
+    urls = note.archive_image_urls()
+    prepared = []
+    for index, source in enumerate(images):
+        data = _read_image(source)
+        if data is None:
+            continue
+        name = f"image_{index + 1:03d}{_image_ext(source, data)}"
+        url = urls[index] if index < len(urls) else None
+        prepared.append((BundledImage(index, name, url, hashlib.sha256(data).hexdigest(), len(data)), data))
+    return prepared
+
+
+class SqliteBundle:
+    """SQLite 单文件归档（写入不是线程安全的，读取可以与另一个进程的写入同时进行）"""
+
+    def __init__(self, path: PathLike, readonly: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            path: 归档文件
+            readonly: 只读打开（文件必须存在）
+            batch_size: 每个事务写入的笔记数，未满的批次在 flush() / close() 时提交
+        """
+        self.path = Path(path)
+        self.readonly = readonly
+        self.batch_size = max(1, batch_size)
+        self._pending = 0
+        if readonly:
+            if not self.path.exists():
+                raise FileNotFoundError(self.path)
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时同步，崩溃时最多丢失最近提交的事务，不会损坏数据库
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id       TEXT PRIMARY KEY,
+                url      TEXT,
+                title    TEXT,
+                text     TEXT,
+                ocr_text TEXT,
+                data     TEXT NOT NULL,
+                raw_z    BLOB,
+                saved_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size   INTEGER NOT NULL,
+                data   BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS note_images (
+                note_id TEXT NOT NULL,
+                idx     INTEGER NOT NULL,
+                name    TEXT NOT NULL,
+                url     TEXT,
+                digest  TEXT NOT NULL,
+                PRIMARY KEY (note_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS idx_note_images_digest ON note_images (digest);
+        """)
+
+    # ---- 写入 ----
+
+    def add_note(self, note: Note, images: Optional[Sequence[ImageSource]] = None, include_raw: bool = True):
+        """
+        写入一篇笔记（已有同ID的笔记时替换）
+
+        Args:
+            images: 与 note.archive_image_urls() 一一对应的图片（字节或文件路径，没有的传 None）
+            include_raw: 是否保存原始数据（以压缩字节保存，不需要解码）
+        """
+        if self.readonly:
+            raise PermissionError("归档以只读方式打开")
+        prepared = _prepare_images(note, images)
+        data = json.dumps(note.to_dict(include_raw=False), ensure_ascii=False, separators=(",", ":"))
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        # 每篇笔记一个保存点：写入失败时只撤销这一篇，同一批次中之前的笔记不受影响
+        self._conn.execute("SAVEPOINT note")
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO notes (id, url, title, text, ocr_text, data, raw_z, saved_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (note.id, note.url, note.title, note.text, note.ocr_text, data,
+                 note._raw_blob if include_raw else None, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blobs (digest, size, data) VALUES (?, ?, ?)",
+                [(image.digest, image.size, content) for image, content in prepared],
+            )
+            self._conn.execute("DELETE FROM note_images WHERE note_id = ?", (note.id,))
+            self._conn.executemany(
+                "INSERT INTO note_images (note_id, idx, name, url, digest) VALUES (?, ?, ?, ?, ?)",
+                [(note.id, image.index, image.name, image.url, image.digest) for image, _ in prepared],
+            )
+        except BaseException:
+            self._conn.execute("ROLLBACK TO note")
+            self._conn.execute("RELEASE note")
+            raise
+        self._conn.execute("RELEASE note")
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """提交未完成的批次"""
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending = 0
+
+    # ---- 读取 ----
+
+    def __contains__(self, note_id: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def note_ids(self) -> Iterator[str]:
+        """按笔记ID顺序遍历"""
+        for (note_id,) in self._conn.execute("SELECT id FROM notes ORDER BY id").fetchall():
+            yield note_id
+
+    def get(self, note_id: str, keep_raw: Optional[bool] = None) -> Optional[Note]:
+        """按笔记ID读取，不存在时返回 None"""
+        row = self._conn.execute("SELECT data, raw_z FROM notes WHERE id = ?", (note_id,)).fetchone()
+        if row is None:
+            return None
+        note = Note.from_dict(json.loads(row[0]), keep_raw=False)
+        if row[1] is not None and (keep_raw if keep_raw is not None else Note.KEEP_RAW):
+            note._raw_blob = row[1]
+        return note
+
+    def images(self, note_id: str) -> List[BundledImage]:
+        rows = self._conn.execute(
+            "SELECT i.idx, i.name, i.url, i.digest, b.size FROM note_images i JOIN blobs b ON b.digest = i.digest"
+            " WHERE i.note_id = ? ORDER BY i.idx",
+            (note_id,),
+        ).fetchall()
+        return [BundledImage(*row) for row in rows]
+
+    def read_image(self, note_id: str, index: int) -> bytes:
+        """
+        读取一张图片
+
+        Raises:
+            KeyError: 归档中没有这张图片
+        """
+        row = self._conn.execute(
+            "SELECT b.data FROM note_images i JOIN blobs b ON b.digest = i.digest WHERE i.note_id = ? AND i.idx = ?",
+            (note_id, index),
+        ).fetchone()
+        if row is None:
+            raise KeyError((note_id, index))
+        return bytes(row[0])
+
+    def stats(self) -> dict:
+        notes = len(self)
+        images, blobs, blob_bytes = self._conn.execute(
+            "SELECT (SELECT COUNT(*) FROM note_images), COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()
+        return {"notes": notes, "images": images, "blobs": blobs, "blob_bytes": blob_bytes}
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+            # 把 WAL 合并回主文件，之后复制单个 .sqlite 文件即可得到完整归档
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ZipBundle:
+    """ZIP 单文件归档：notes/<笔记ID>.json 与 images/<笔记ID>/image_001.webp ..."""
+
+    def __init__(self, path: PathLike, readonly: bool = False, compresslevel: int = 6):
+        """
+        Args:
+            path: 归档文件
+            readonly: 只读打开（文件必须存在）
+            compresslevel: 笔记 JSON 的 deflate 压缩级别（图片不压缩）
+        """
+        self.path = Path(path)
+        self.readonly = readonly
+        self.compresslevel = compresslevel
+        if not readonly:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._zip = zipfile.ZipFile(self.path, "r" if readonly else "a")
+
+    @staticmethod
+    def _note_name(note_id: str) -> str:
+        return f"notes/{note_id}.json"
+
+    def _write(self, name: str, data: bytes, compress: bool):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with warnings.catch_warnings():
+            # 再次写入同一篇笔记时追加新条目（读取时以最后一个为准），不重写已有内容
+            warnings.simplefilter("ignore", UserWarning)
+            self._zip.writestr(info, data, compresslevel=self.compresslevel if compress else None)
+
+    def add_note(self, note: Note, images: Optional[Sequence[ImageSource]] = None, include_raw: bool = True):
+        """
+        写入一篇笔记（已有同ID的笔记时追加新版本，读取时以最新的为准）
+
+        Args:
+            images: 与 note.archive_image_urls() 一一对应的图片（字节或文件路径，没有的传 None）
+            include_raw: 是否保存原始数据
+        """
+        if self.readonly:
+            raise PermissionError("归档以只读方式打开")
+        prepared = _prepare_images(note, images)
+        for image, content in prepared:
+            self._write(f"images/{note.id}/{image.name}", content, compress=False)
+        record = note.to_dict(include_raw=include_raw)
+        record["bundle_images"] = [image._asdict() for image, _ in prepared]
+        self._write(self._note_name(note.id), json.dumps(record, ensure_ascii=False).encode("utf-8"), compress=True)
+
+    def flush(self):
+        """ZIP 的中央目录在 close() 时写入"""
+
+    def _record(self, note_id: str) -> Optional[dict]:
+        try:
+            return json.loads(self._zip.read(self._note_name(note_id)))
+        except KeyError:
+            return None
+
+    def __contains__(self, note_id: str) -> bool:
+        try:
+            self._zip.getinfo(self._note_name(note_id))
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.note_ids())
+
+    def note_ids(self) -> Iterator[str]:
+        """按笔记ID顺序遍历"""
+        names = {name for name in self._zip.namelist() if name.startswith("notes/") and name.endswith(".json")}
+        for name in sorted(names):
+            yield name[len("notes/"):-len(".json")]
+
+    def get(self, note_id: str, keep_raw: Optional[bool] = None) -> Optional[Note]:
+        """按笔记ID读取，不存在时返回 None"""
+        record = self._record(note_id)
+        return Note.from_dict(record, keep_raw=keep_raw) if record is not None else None
+
+    def images(self, note_id: str) -> List[BundledImage]:
+        record = self._record(note_id) or {}
+        return [BundledImage(**image) for image in record.get("bundle_images", [])]
+
+    def read_image(self, note_id: str, index: int) -> bytes:
+        """
+        读取一张图片
+
+        Raises:
+            KeyError: 归档中没有这张图片
+        """
+        for image in self.images(note_id):
+            if image.index == index:
+                return self._zip.read(f"images/{note_id}/{image.name}")
+        raise KeyError((note_id, index))
+
+    def stats(self) -> dict:
+        images = {info.filename: info for info in self._zip.infolist() if info.filename.startswith("images/")}
+        images = list(images.values())
+        return {
+            "notes": len(self),
+            "images": len(images),
+            "blobs": len(images),
+            "blob_bytes": sum(info.file_size for info in images),
+        }
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_bundle(path: PathLike, readonly: bool = False, **kwargs) -> Union[SqliteBundle, ZipBundle]:
+    """按后缀打开归档（.zip 为 ZIP，其余为 SQLite），其余参数透传给对应的类"""
+    if bundle_format(path) == "zip":
+        return ZipBundle(path, readonly=readonly, **kwargs)
+    return SqliteBundle(path, readonly=readonly, **kwargs)
+
+
+def iter_notes(inputs: Iterable[PathLike], keep_raw: bool = False) -> Iterator[Note]:
+    """
+    依次读取多个来源的笔记：
+    - .jsonl / .json / .ndjson：JSON Lines（xhs_batch / state_archive reparse 的输出）
+    - 目录：StateArchive 归档（含 index.jsonl）或 state dump 目录，离线重新解析
+    - 其他文件：note_bundle 归档（.sqlite / .db / .zip）
+
+    Args:
+        keep_raw: 是否保留 Note.raw（统计点赞数等字段时需要）
+    """
+    for path in inputs:
+        path = Path(path)
+        if path.is_dir():
+            if (path / "index.jsonl").exists():
+                from .state_archive import StateArchive
+                yield from StateArchive(path).reparse(keep_raw=keep_raw)
+            else:
+                from .xhs_batch import iter_state_files, parse_states_parallel
+                yield from parse_states_parallel(iter_state_files([path]), keep_raw=keep_raw)
+        elif path.suffix.lower() in (".jsonl", ".json", ".ndjson"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield Note.from_dict(json.loads(line), keep_raw=keep_raw)
+        else:
+            with open_bundle(path, readonly=True) as bundle:
+                for note_id in bundle.note_ids():
+                    yield bundle.get(note_id, keep_raw=keep_raw)
+
+
+def _saved_images(blob_store, note: Note) -> List[ImageSource]:
+    """web_app 保存过的图片（按 BlobStore 清单中记录的链接对应到每张图片）"""
+    by_url = {}
+    for item in blob_store.note_files(note.id):
+        blob = blob_store.get(item.digest)
+        if blob is not None and item.url:
+            by_url[item.url] = blob.path
+    return [by_url.get(url) for url in note.archive_image_urls()]
+
+
+def _download_missing(session, note: Note, images: List[ImageSource], workers: int) -> List[ImageSource]:
+    """下载本地没有的图片"""
+    from concurrent.futures import ThreadPoolExecutor
+    from .image_download import IMAGE_DOWNLOAD_TIMEOUT
+
+    urls = note.archive_image_urls()
+    images = list(images) + [None] * (len(urls) - len(images))
+
+    def fetch(index: int) -> ImageSource:
+        if images[index] is not None:
+            return images[index]
+        url = urls[index]
+        try:
+            response = session.get(url, timeout=IMAGE_DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            print(f"警告：下载图片 {url} 失败: {e}", file=sys.stderr)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(fetch, range(len(urls))))
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="小红书笔记单文件归档（SQLite / ZIP）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="把笔记写入归档")
+    p_export.add_argument("bundle", help="归档文件（.sqlite / .db 或 .zip）")
+    p_export.add_argument("inputs", nargs="+", help="笔记 JSON Lines 文件、StateArchive 归档或 state dump 目录")
+    p_export.add_argument("--images", metavar="SAVE_DIR", help="从 Web 界面的保存目录（.xhs_blobs）读取已保存的图片")
+    p_export.add_argument("--download", action="store_true", help="下载本地没有的图片")
+    p_export.add_argument("--workers", "-w", type=int, default=8, help="下载图片的线程数（默认 8）")
+    p_export.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="SQLite 每个事务写入的笔记数")
+
+    p_ls = sub.add_parser("ls", help="列出归档中的笔记")
+    p_ls.add_argument("bundle", help="归档文件")
+
+    p_extract = sub.add_parser("extract", help="把一篇笔记及其图片取出到目录")
+    p_extract.add_argument("bundle", help="归档文件")
+    p_extract.add_argument("note_id", help="笔记ID")
+    p_extract.add_argument("output", help="输出目录")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        kwargs = {"batch_size": args.batch_size} if bundle_format(args.bundle) == "sqlite" else {}
+        blob_store = session = None
+        if args.images:
+            from .blob_store import BlobStore
+            blob_store = BlobStore.for_save_dir(args.images)
+        if args.download:
+            from .image_download import make_session
+            session = make_session(args.workers)
+        count = 0
+        start = time.perf_counter()
+        try:
+            with open_bundle(args.bundle, **kwargs) as bundle:
+                for note in iter_notes(args.inputs, keep_raw=True):
+                    images = _saved_images(blob_store, note) if blob_store is not None else []
+                    if session is not None:
+                        images = _download_missing(session, note, images, args.workers)
+                    bundle.add_note(note, images=images)
+                    count += 1
+                stats = bundle.stats()
+        finally:
+            if blob_store is not None:
+                blob_store.close()
+            if session is not None:
+                session.close()
+        print(
+            f"写入 {count} 篇笔记，用时 {time.perf_counter() - start:.1f}s；归档中共 {stats['notes']} 篇笔记、"
+            f"{stats['images']} 张图片（{stats['blob_bytes'] / 1e6:.1f} MB）",
+            file=sys.stderr,
+        )
+        return
+
+    with open_bundle(args.bundle, readonly=True) as bundle:
+        if args.command == "ls":
+            count = 0
+            for note_id in bundle.note_ids():
+                note = bundle.get(note_id, keep_raw=False)
+                count += 1
+                print(f"{note_id:<26} {len(bundle.images(note_id)):>3} 张图片  {note.title}")
+            print(f"共 {count} 篇笔记", file=sys.stderr)
+            return
+
+        note = bundle.get(args.note_id)
+        if note is None:
+            print(f"归档中没有笔记: {args.note_id}", file=sys.stderr)
+            sys.exit(1)
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        (output / "note.json").write_text(
+            json.dumps(note.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        for image in bundle.images(args.note_id):
+            (output / image.name).write_bytes(bundle.read_image(args.note_id, image.index))
+        print(f"已取出到 {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# note_parquet.py
+"""
+笔记的列式导出（Parquet / Arrow）
+统计标题长度、图片数、点赞数等指标时，逐个解析 Markdown 文件很慢。这里把 Note 流式转换为 Arrow RecordBatch，
+每批写成 Parquet 的一个 row group（或 Arrow IPC 文件的一个 batch），内存占用只与批大小有关，与笔记总数无关。
+
+除了标题、正文等字段，还从 raw（笔记原始数据）中展开常用字段：
+    note_type, user_id, nickname, liked_count, collected_count, comment_count, share_count,
+    tags（标签名列表）, published_at / updated_at（UTC 时间戳）, ip_location
+点赞数等计数在原始数据中可能是 "1.2万"、"10万+" 这样的文本，会换算为整数。
+
+    rows = export_notes(iter_notes(["archive/"], keep_raw=True), "notes.parquet")
+    # pandas.read_parquet("notes.parquet", columns=["title_len", "liked_count"])
+
+命令行：
+    python -m xhs_extractor_module.note_parquet notes.parquet ./state_archive notes.sqlite
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from .models import Note
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+PathLike = Union[str, Path]
+
+# 每个 RecordBatch / row group 的行数
+DEFAULT_BATCH_ROWS = 50_000
+# Arrow IPC 文件的后缀，其余按 Parquet 写入
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+_COUNT_UNITS = {"万": 10_000, "w": 10_000, "亿": 100_000_000, "k": 1_000}
+_COUNT_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*(万|亿|w|k)?$", re.IGNORECASE)
+
+
+def parse_count(value: Any) -> Optional[int]:
+    """计数文本转换为整数："1234" -> 1234，"1.2万" -> 12000，"10万+" -> 100000；无法识别时返回 None"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().replace(",", "").rstrip("+")
+    match = _COUNT_RE.match(text)
+    if match is None:
+        return None
+    unit = _COUNT_UNITS.get((match.group(2) or "").lower(), 1)
+    return int(round(float(match.group(1)) * unit))
+
+
+def _timestamp_ms(value: Any) -> Optional[int]:
+    """秒或毫秒时间戳统一为毫秒"""
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return int(value if value >= 1e12 else value * 1000)
+
+
+def flatten_note(note: Note, include_text: bool = True) -> Dict[str, Any]:
+    """
+    把一篇笔记展开为一行（不依赖 pyarrow）
+
+    Args:
+        include_text: 是否包含正文和 OCR 文本（只做统计时可以不要，文件小很多）
+    """
+    raw = note.raw
+    interact = raw.get("interactInfo") or {}
+    user = raw.get("user") or {}
+    tags = [tag.get("name") for tag in raw.get("tagList") or [] if isinstance(tag, dict) and tag.get("name")]
+    row: Dict[str, Any] = {"id": note.id, "url": note.url, "title": note.title}
+    if include_text:
+        row["text"] = note.text
+        row["ocr_text"] = note.ocr_text
+    row.update({
+        "title_len": len(note.title or ""),
+        "text_len": len(note.text or ""),
+        "ocr_text_len": len(note.ocr_text or ""),
+        "image_count": len(note.images),
+        "note_type": raw.get("type"),
+        "user_id": user.get("userId"),
+        "nickname": user.get("nickname") or user.get("nickName"),
+        "liked_count": parse_count(interact.get("likedCount")),
+        "collected_count": parse_count(interact.get("collectedCount")),
+        "comment_count": parse_count(interact.get("commentCount")),
+        "share_count": parse_count(interact.get("shareCount")),
+        "tags": tags,
+        "published_at": _timestamp_ms(raw.get("time")),
+        "updated_at": _timestamp_ms(raw.get("lastUpdateTime")),
+        "ip_location": raw.get("ipLocation"),
+    })
+    return row
+
+
+def _require_pyarrow():
+    if not PYARROW_AVAILABLE:
+        raise ImportError("需要安装 pyarrow: pip install pyarrow")
+
+
+def note_schema(include_text: bool = True) -> "pa.Schema":
+    """导出的列（与 flatten_note 的字段一致）"""
+    _require_pyarrow()
+    timestamp = pa.timestamp("ms", tz="UTC")
+    fields = [("id", pa.string()), ("url", pa.string()), ("title", pa.string())]
+    if include_text:
+        fields += [("text", pa.string()), ("ocr_text", pa.string())]
+    fields += [
+        ("title_len", pa.int32()),
+        ("text_len", pa.int32()),
+        ("ocr_text_len", pa.int32()),
+        ("image_count", pa.int16()),
+        ("note_type", pa.string()),
+        ("user_id", pa.string()),
+        ("nickname", pa.string()),
+        ("liked_count", pa.int64()),
+        ("collected_count", pa.int64()),
+        ("comment_count", pa.int64()),
+        ("share_count", pa.int64()),
+        ("tags", pa.list_(pa.string())),
+        ("published_at", timestamp),
+        ("updated_at", timestamp),
+        ("ip_location", pa.string()),
+    ]
+    return pa.schema(fields)
+
+
+def iter_record_batches(
+    notes: Iterable[Note],
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    include_text: bool = True,
+) -> Iterator["pa.RecordBatch"]:
+    """
+    把笔记流转换为 RecordBatch 流，每批最多 batch_rows 行
+
+    Raises:
+        ImportError: 未安装 pyarrow
+    """
+    schema = note_schema(include_text)
+    batch_rows = max(1, batch_rows)
+    columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+    rows = 0
+    for note in notes:
+        row = flatten_note(note, include_text)
+        for name, values in columns.items():
+            values.append(row[name])
+        rows += 1
+        if rows >= batch_rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {name: [] for name in schema.names}
+            rows = 0
+    if rows:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def export_notes(
+    notes: Iterable[Note],
+    path: PathLike,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    include_text: bool = True,
+    compression: str = "zstd",
+) -> int:
+    """
+    导出笔记：.arrow / .feather / .ipc 写 Arrow IPC 文件，其余写 Parquet（每批一个 row group）
+
+    先写入同目录的临时文件，完成后才替换 path，中途失败不会留下不完整的文件。
+
+    Args:
+        batch_rows: 每批（row group）的行数，决定内存占用
+        include_text: 是否包含正文和 OCR 文本
+        compression: 压缩算法（zstd / snappy / gzip / none）
+
+    Returns:
+        导出的行数
+
+    Raises:
+        ImportError: 未安装 pyarrow
+    """
+    _require_pyarrow()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = note_schema(include_text)
+    codec = None if compression in (None, "none") else compression
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    rows = 0
+    try:
+        if path.suffix.lower() in ARROW_SUFFIXES:
+            options = pa.ipc.IpcWriteOptions(compression=codec if codec in ("zstd", "lz4") else None)
+            with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+                for batch in iter_record_batches(notes, batch_rows, include_text):
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        else:
+            with pq.ParquetWriter(str(tmp_path), schema, compression=codec or "none") as writer:
+                for batch in iter_record_batches(notes, batch_rows, include_text):
+                    writer.write_batch(batch, row_group_size=batch_rows)
+                    rows += batch.num_rows
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+    import contextlib
+    from .note_bundle import iter_notes
+
+    parser = argparse.ArgumentParser(description="把笔记导出为 Parquet / Arrow，用于统计分析")
+    parser.add_argument("output", help="输出文件（.parquet，或 .arrow / .feather）")
+    parser.add_argument("inputs", nargs="+", help="笔记 JSON Lines 文件、note_bundle 归档、StateArchive 归档或 state dump 目录")
+    parser.add_argument("--no-text", action="store_true", help="不导出正文和 OCR 文本（只保留统计字段）")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="每个 row group 的行数")
+    parser.add_argument("--compression", default="zstd", help="压缩算法：zstd / snappy / gzip / none（默认 zstd）")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    # 解析过程中的提示信息写到 stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        rows = export_notes(
+            iter_notes(args.inputs, keep_raw=True),
+            args.output,
+            batch_rows=args.batch_rows,
+            include_text=not args.no_text,
+            compression=args.compression,
+        )
+    elapsed = time.perf_counter() - start
+    size = Path(args.output).stat().st_size
+    print(f"导出 {rows} 篇笔记到 {args.output}（{size / 1e6:.1f} MB），用时 {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
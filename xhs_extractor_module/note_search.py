@@ -0,0 +1,365 @@
+# note_search.py
+"""
+笔记全文检索
+把笔记的标题、正文和 OCR 文本写入 SQLite FTS5 索引，按相关度（bm25，标题权重更高）返回结果。
+
+FTS5 自带的分词器把连续的中文当作一个词，这里先在 Python 中分词再写入：
+- bigram（默认）：中文按相邻两个字切分，末尾的字单独保留（“面试题” -> “面试 试题 题”），
+  查询时按相邻的二元组匹配，相当于子串匹配，不会因为分词边界漏掉结果；单个汉字按前缀匹配
+- jieba（安装 jieba 时可选）：按词切分（cut_for_search），索引更小，但查询词需要与分词结果一致
+英文和数字按单词切分，不区分大小写。索引使用的分词方式记录在索引中，之后打开时沿用。
+
+    index = SearchIndex.for_save_dir("./xhs_notes")
+    index.index_note(note)               # 内容没有变化时不重新写入
+    for hit in index.search("分布式 锁"):  # 空格分隔的多个词需要同时出现
+        print(hit.note_id, hit.title, hit.snippet)
+
+命令行：
+    python -m xhs_extractor_module.note_search index ./xhs_notes/.xhs_search.sqlite3 notes.jsonl notes.sqlite
+    python -m xhs_extractor_module.note_search query ./xhs_notes/.xhs_search.sqlite3 "redis 集群"
+"""
+from __future__ import annotations
+
+import re
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+from .models import Note
+from .note_bundle import iter_notes
+
+try:
+    import jieba
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+
+PathLike = Union[str, Path]
+
+# 保存目录下的默认索引文件
+SEARCH_INDEX_NAME = ".xhs_search.sqlite3"
+TOKENIZERS = ("bigram", "jieba")
+# 批量写入时每个事务的笔记数
+DEFAULT_BATCH_SIZE = 1000
+# bm25 的列权重：标题、正文、OCR 文本
+COLUMN_WEIGHTS = (5.0, 1.0, 1.0)
+# 摘要中关键词前后保留的字数
+SNIPPET_CONTEXT = 30
+
+# 中日韩文字（按字切分），其余按字母数字组成的单词切分
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"([{_CJK}]+)|([0-9A-Za-z\u00c0-\u024f]+)")
+
+
+class SearchHit(NamedTuple):
+    """一条检索结果"""
+    note_id: str
+    title: str
+    url: str
+    score: float      # bm25 相关度，越小越相关
+    snippet: str      # 第一个关键词所在的上下文，关键词用【】标出
+
+
+def _cjk_tokens(run: str, tokenizer: str) -> List[str]:
+    if tokenizer == "jieba":
+        return [word for word in jieba.cut_for_search(run) if word.strip()]
+    # 末尾的字单独作为一个词：查询单个汉字时按前缀匹配，每个字都是某个词的开头
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def tokenize(text: str, tokenizer: str = "bigram") -> List[str]:
+    """把文本切分为索引用的词"""
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text or ""):
+        cjk, word = match.groups()
+        if cjk:
+            tokens.extend(_cjk_tokens(cjk, tokenizer))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+def build_match_query(query: str, tokenizer: str = "bigram") -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 MATCH 表达式：空格分隔的词需要同时出现；
+    bigram 分词时一段中文的二元组必须相邻（短语），单个汉字按前缀匹配
+
+    Returns:
+        MATCH 表达式，查询中没有可检索的词时返回 None
+    """
+    clauses: List[str] = []
+    for match in _TOKEN_RE.finditer(query or ""):
+        cjk, word = match.groups()
+        if word:
+            clauses.append(_quote(word.lower()))
+        elif tokenizer == "jieba":
+            clauses.extend(_quote(token) for token in jieba.cut(cjk) if token.strip())
+        elif len(cjk) == 1:
+            clauses.append(_quote(cjk) + " *")
+        else:
+            clauses.append(_quote(" ".join(cjk[i:i + 2] for i in range(len(cjk) - 1))))
+    return " AND ".join(clauses) if clauses else None
+
+
+def _note_digest(note: Note) -> str:
+    content = "\0".join((note.url or "", note.title or "", note.text or "", note.ocr_text or ""))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _snippet(fields: Iterable[str], terms: List[str], context: int = SNIPPET_CONTEXT) -> str:
+    """第一个关键词所在的上下文；找不到关键词时返回正文开头"""
+    fields = [field or "" for field in fields]
+    for field in fields:
+        lowered = field.lower()
+        for term in terms:
+            pos = lowered.find(term)
+            if pos < 0:
+                continue
+            start, end = max(0, pos - context), min(len(field), pos + len(term) + context)
+            text = (
+                field[start:pos] + "【" + field[pos:pos + len(term)] + "】" + field[pos + len(term):end]
+            ).replace("\n", " ")
+            return ("…" if start > 0 else "") + text + ("…" if end < len(field) else "")
+    body = next((field for field in fields[1:] if field), "")
+    return body[:context * 2].replace("\n", " ")
+
+
+class SearchIndex:
+    """笔记全文索引（线程安全）"""
+
+    def __init__(self, path: PathLike, tokenizer: Optional[str] = None):
+        """
+        Args:
+            path: 索引文件
+            tokenizer: "bigram" 或 "jieba"；默认沿用索引已有的分词方式，新索引使用 bigram
+
+        Raises:
+            ValueError: 分词方式不支持，或与已有索引不一致（需要删除索引文件重建）
+            ImportError: 使用 jieba 但未安装
+        """
+        if tokenizer is not None and tokenizer not in TOKENIZERS:
+            raise ValueError(f"不支持的分词方式: {tokenizer}，可选: {TOKENIZERS}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                rowid      INTEGER PRIMARY KEY,
+                note_id    TEXT NOT NULL UNIQUE,
+                url        TEXT,
+                title      TEXT,
+                text       TEXT,
+                ocr_text   TEXT,
+                digest     TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, text, ocr_text, tokenize = 'unicode61');
+        """)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'tokenizer'").fetchone()
+        if row is None:
+            self.tokenizer = tokenizer or "bigram"
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('tokenizer', ?)", (self.tokenizer,))
+        else:
+            self.tokenizer = row[0]
+            if tokenizer is not None and tokenizer != self.tokenizer:
+                raise ValueError(f"索引使用 {self.tokenizer} 分词，与指定的 {tokenizer} 不一致，请删除 {self.path} 后重建")
+        if self.tokenizer == "jieba" and not JIEBA_AVAILABLE:
+            raise ImportError("索引使用 jieba 分词，需要安装 jieba: pip install jieba")
+
+    @classmethod
+    def for_save_dir(cls, base_dir: PathLike, tokenizer: Optional[str] = None) -> "SearchIndex":
+        """保存目录下的默认索引"""
+        return cls(Path(base_dir) / SEARCH_INDEX_NAME, tokenizer=tokenizer)
+
+    # ---- 写入 ----
+
+    def _index_locked(self, note: Note) -> bool:
+        digest = _note_digest(note)
+        row = self._conn.execute("SELECT rowid, digest FROM docs WHERE note_id = ?", (note.id,)).fetchone()
+        if row is not None and row[1] == digest:
+            return False
+        if row is not None:
+            self._conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (row[0],))
+            self._conn.execute("DELETE FROM docs WHERE rowid = ?", (row[0],))
+        cursor = self._conn.execute(
+            "INSERT INTO docs (note_id, url, title, text, ocr_text, digest, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (note.id, note.url, note.title, note.text, note.ocr_text, digest, time.time()),
+        )
+        self._conn.execute(
+            "INSERT INTO docs_fts (rowid, title, text, ocr_text) VALUES (?, ?, ?, ?)",
+            (cursor.lastrowid, *(" ".join(tokenize(value, self.tokenizer))
+                                 for value in (note.title, note.text, note.ocr_text))),
+        )
+        return True
+
+    def index_notes(self, notes: Iterable[Note], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        写入多篇笔记（每 batch_size 篇一个事务）；内容与索引中一致的笔记跳过
+
+        Returns:
+            实际写入（新增或更新）的笔记数
+        """
+        changed = 0
+        batch: List[Note] = []
+
+        def commit():
+            nonlocal changed
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    for item in batch:
+                        changed += self._index_locked(item)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            batch.clear()
+
+        for note in notes:
+            batch.append(note)
+            if len(batch) >= batch_size:
+                commit()
+        if batch:
+            commit()
+        return changed
+
+    def index_note(self, note: Note) -> bool:
+        """写入或更新一篇笔记，返回是否有变化"""
+        return self.index_notes([note]) > 0
+
+    def remove(self, note_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT rowid FROM docs WHERE note_id = ?", (note_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (row[0],))
+            self._conn.execute("DELETE FROM docs WHERE rowid = ?", (row[0],))
+            self._conn.execute("COMMIT")
+        return True
+
+    def optimize(self):
+        """合并索引段（大批量写入后执行，查询更快）"""
+        with self._lock:
+            self._conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+
+    # ---- 查询 ----
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def __contains__(self, note_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM docs WHERE note_id = ?", (note_id,)).fetchone() is not None
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+        """
+        检索笔记，按相关度排序
+
+        Args:
+            query: 关键词，空格分隔的多个词需要同时出现
+            limit / offset: 分页
+        """
+        match = build_match_query(query, self.tokenizer)
+        if match is None:
+            return []
+        weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT d.note_id, d.title, d.url, d.text, d.ocr_text, bm25(docs_fts, {weights}) AS score"
+                " FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid"
+                " WHERE docs_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+                (match, limit, offset),
+            ).fetchall()
+        terms = [term.lower() for term in query.split()]
+        return [
+            SearchHit(note_id, title or "", url or "", score, _snippet((title, text, ocr_text), terms))
+            for note_id, title, url, text, ocr_text, score in rows
+        ]
+
+    def count(self, query: str) -> int:
+        """匹配的笔记总数"""
+        match = build_match_query(query, self.tokenizer)
+        if match is None:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs_fts WHERE docs_fts MATCH ?", (match,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="小红书笔记全文检索（SQLite FTS5）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_index = sub.add_parser("index", help="把笔记写入索引（内容没有变化的笔记跳过）")
+    p_index.add_argument("index", help="索引文件")
+    p_index.add_argument("inputs", nargs="+", help="笔记 JSON Lines 文件、note_bundle 归档（.sqlite / .zip）或 StateArchive 归档")
+    p_index.add_argument("--tokenizer", choices=TOKENIZERS, default=None, help="中文分词方式（默认 bigram）")
+    p_index.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每个事务写入的笔记数")
+
+    p_query = sub.add_parser("query", help="检索笔记")
+    p_query.add_argument("index", help="索引文件")
+    p_query.add_argument("query", help="关键词，空格分隔的多个词需要同时出现")
+    p_query.add_argument("--limit", "-n", type=int, default=20, help="返回的结果数（默认 20）")
+    p_query.add_argument("--json", action="store_true", help="输出 JSON Lines")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        start = time.perf_counter()
+        with SearchIndex(args.index, tokenizer=args.tokenizer) as index:
+            changed = index.index_notes(iter_notes(args.inputs), batch_size=args.batch_size)
+            if changed:
+                index.optimize()
+            total = len(index)
+        print(f"更新 {changed} 篇笔记，索引中共 {total} 篇，用时 {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        return
+
+    if not Path(args.index).exists():
+        print(f"索引不存在: {args.index}", file=sys.stderr)
+        sys.exit(1)
+    with SearchIndex(args.index) as index:
+        start = time.perf_counter()
+        hits = index.search(args.query, limit=args.limit)
+        total = index.count(args.query)
+        elapsed = time.perf_counter() - start
+    for hit in hits:
+        if args.json:
+            print(json.dumps(hit._asdict(), ensure_ascii=False))
+        else:
+            print(f"{hit.note_id:<26} {hit.title}\n    {hit.snippet}\n    {hit.url}")
+    print(f"共 {total} 条结果，用时 {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
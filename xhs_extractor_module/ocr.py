@@ -1,50 +1,767 @@
 # ocr.py
 """
 OCR 功能模块
-支持多种 OCR 方案：PaddleOCR（本地）、API 调用等
+支持多种本地 OCR 后端：PaddleOCR、ONNX Runtime、Tesseract（见 ocr_backends）
 """
 from __future__ import annotations
 
-import os
-from typing import List, Optional
+import math
+import time
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import requests
 
+from .ocr_cache import OCRCache, content_hash
+from .image_dedup import Fingerprint, PerceptualIndex, fingerprint
+from .xhs_url import image_id_from_url
+from .ocr_backends import BACKENDS, OCRBackend, create_backend, resolve_backend_name
+
 try:
-    from paddleocr import PaddleOCR
-    PADDLEOCR_AVAILABLE = True
+    import numpy as np
+    NUMPY_AVAILABLE = True
 except ImportError:
-    PADDLEOCR_AVAILABLE = False
+    NUMPY_AVAILABLE = False
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# 图片下载请求头（模拟浏览器）
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.xiaohongshu.com/',
+}
+
+# ocr_images 并发下载的线程数
+DOWNLOAD_WORKERS = 4
+# 已下载、待识别图片占用内存的上限
+MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+# 没有 Content-Length 时按此大小预估一张图片
+_DEFAULT_IMAGE_BYTES = 2 * 1024 * 1024
+# 批量识别时每批的图片数
+OCR_BATCH_SIZE = 8
+# 批量识别按尺寸分组的粒度（像素），尺寸相近的图片放在同一批，减少填充
+_SIZE_BUCKET = 128
+
+# 文字预筛选：在缩略图上统计边缘密度，判断图片中是否可能有文字
+PREFILTER_THUMB_SIDE = 512       # 缩略图最长边
+PREFILTER_MIN_SIDE = 64          # 短边小于此值的图片不做判断，直接识别
+PREFILTER_EDGE_THRESHOLD = 32    # 相邻像素灰度差超过此值视为边缘
+PREFILTER_TILE = 8               # 统计边缘密度的分块大小（缩略图像素）
+PREFILTER_TILE_DENSITY = 0.1     # 边缘像素占比达到此值的分块视为“密集边缘块”
+PREFILTER_MIN_DENSE_TILES = 2    # 密集边缘块达到此数量时判定可能有文字（一行小字也能满足）
+
+
+def _download_image_for_ocr(image_url: str, timeout: int = 20) -> Optional[Tuple[bytes, str]]:
+    """
+    下载图片到内存
+    
+    Returns:
+        (图片字节, Content-Type)，下载失败时打印警告并返回 None
+    """
+    if not image_url or not image_url.startswith('http'):
+        print(f"警告：无效的图片 URL: {image_url}")
+        return None
+    
+    try:
+        response = requests.get(image_url, headers=IMAGE_HEADERS, timeout=timeout)
+        response.raise_for_status()
+        return response.content, response.headers.get('Content-Type', '').lower()
+    except requests.exceptions.Timeout:
+        print(f"警告：OCR 图片 {image_url} 超时")
+    except requests.exceptions.RequestException as e:
+        print(f"警告：下载图片 {image_url} 失败: {e}")
+    except Exception as e:
+        print(f"警告：OCR 图片 {image_url} 失败: {e}")
+    return None
+
+
+def decode_image_bytes(data: bytes):
+    """
+    在内存中把图片字节解码为 BGR 格式的 numpy 数组（PaddleOCR 可直接使用）
+    
+    优先使用 OpenCV（PaddleOCR 的依赖），没有时使用 Pillow。
+    
+    Returns:
+        numpy 数组，无法解码时返回 None
+    """
+    if not data or not NUMPY_AVAILABLE:
+        return None
+    if CV2_AVAILABLE:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            return image
+    if PIL_AVAILABLE:
+        import io
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                rgb = np.asarray(img.convert("RGB"))
+        except Exception:
+            return None
+        # RGB -> BGR
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+    return None
+
+
+def likely_has_text(image) -> bool:
+    """
+    快速判断图片中是否可能有文字（在缩略图上统计边缘密度，耗时远小于一次 OCR）
+    
+    文字笔画会在局部产生密集的强边缘；纯色背景、虚化的人像和风景照片则很少。
+    判断偏保守：无法判断（未安装 numpy、图片太小、不是数组）时一律返回 True。
+    
+    Args:
+        image: BGR 格式（或灰度）的 numpy 数组
+    """
+    if not NUMPY_AVAILABLE or getattr(image, "ndim", 0) not in (2, 3):
+        return True
+    h, w = image.shape[:2]
+    if min(h, w) < PREFILTER_MIN_SIDE:
+        return True
+    
+    # 等间隔采样得到缩略图，转为灰度
+    step = max(1, math.ceil(max(h, w) / PREFILTER_THUMB_SIDE))
+    thumb = image[::step, ::step]
+    if thumb.ndim == 3:
+        gray = thumb[..., :3].astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    else:
+        gray = thumb.astype(np.float32)
+    
+    dx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    dy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    edges = np.maximum(dx, dy) > PREFILTER_EDGE_THRESHOLD
+    
+    t = PREFILTER_TILE
+    th, tw = edges.shape[0] // t * t, edges.shape[1] // t * t
+    if th == 0 or tw == 0:
+        return True
+    tile_density = edges[:th, :tw].reshape(th // t, t, tw // t, t).mean(axis=(1, 3))
+    return int((tile_density >= PREFILTER_TILE_DENSITY).sum()) >= PREFILTER_MIN_DENSE_TILES
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    """
+    识别前的图片预处理参数
+    
+    长文字截图往往很高、四周留白很多，引擎把大量时间花在空白画布上；
+    预处理先裁掉纯色边框，缩小到识别的工作分辨率，再把过高的图片在空白行处切成多块。
+    """
+    trim_borders: bool = True     # 裁掉四周的纯色边框
+    border_tolerance: int = 12    # 一行/一列像素的最大值与最小值相差不超过此值视为纯色
+    border_margin: int = 16       # 裁剪后保留的边距（像素）
+    max_width: int = 960          # 宽度超过此值时等比缩小（与检测模型的工作分辨率一致），不放大
+    tile_aspect: float = 2.0      # 高度超过 宽度 × tile_aspect 时切块，每块不超过此高宽比
+    tile_search: float = 0.25     # 在每块末尾此比例的范围内寻找最空白的行作为切分位置
+    grayscale: bool = False       # 转为灰度（仍为三通道，兼容只接受彩色图的引擎）
+
+
+@dataclass
+class ImageTile:
+    """预处理后的一块图片；块内坐标 / scale + (x0, y0) 即原图坐标"""
+    image: object
+    x0: float = 0.0
+    y0: float = 0.0
+    scale: float = 1.0
+    
+    def to_original(self, box: Optional[List[List[float]]]) -> Optional[List[List[float]]]:
+        """把块内的文本框坐标换算回原图坐标"""
+        if box is None:
+            return None
+        return [[x / self.scale + self.x0, y / self.scale + self.y0] for x, y in box]
+
+
+def _uniform_lines(image, axis: int):
+    """每一行（axis=1）或每一列（axis=0）是否为纯色：各通道最大值与最小值之差"""
+    spread = image.max(axis=axis).astype(np.int16) - image.min(axis=axis)
+    return spread.max(axis=-1) if spread.ndim == 2 else spread
+
+
+def _trim_borders(image, tolerance: int, margin: int):
+    """
+    裁掉四周的纯色行和纯色列（先裁行再裁列，顶部色条不影响左右留白的判断）
+    
+    Returns:
+        (裁剪后的图片, 左边界, 上边界)
+    """
+    rows = np.flatnonzero(_uniform_lines(image, axis=1) > tolerance)
+    if not len(rows):
+        return image, 0, 0
+    y0, y1 = max(0, rows[0] - margin), min(image.shape[0], rows[-1] + 1 + margin)
+    image = image[y0:y1]
+    cols = np.flatnonzero(_uniform_lines(image, axis=0) > tolerance)
+    if not len(cols):
+        return image, 0, int(y0)
+    x0, x1 = max(0, cols[0] - margin), min(image.shape[1], cols[-1] + 1 + margin)
+    return image[:, x0:x1], int(x0), int(y0)
+
+
+def _area_resize(image, height: int, width: int):
+    """按面积均值缩小图片（块边界按比例划分）"""
+    h, w = image.shape[:2]
+    y_edges = np.linspace(0, h, height + 1).astype(int)
+    x_edges = np.linspace(0, w, width + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(image.astype(np.float32), y_edges[:-1], axis=0), x_edges[:-1], axis=1)
+    areas = np.outer(np.diff(y_edges), np.diff(x_edges))
+    if image.ndim == 3:
+        areas = areas[:, :, None]
+    return (sums / areas + 0.5).astype(image.dtype)
+
+
+def _tile_rows(image, tile_aspect: float, tile_search: float) -> List[Tuple[int, int]]:
+    """
+    把过高的图片按行切块，切分位置选在每块末尾范围内最空白的行，避免把一行字切成两半
+    
+    Returns:
+        [(起始行, 结束行)] 列表
+    """
+    h, w = image.shape[:2]
+    tile_h = max(1, int(w * tile_aspect))
+    if h <= tile_h:
+        return [(0, h)]
+    spread = _uniform_lines(image, axis=1)
+    spans = []
+    start = 0
+    while h - start > tile_h:
+        lo = start + max(1, int(tile_h * (1 - tile_search)))
+        hi = start + tile_h
+        cut = lo + int(np.argmin(spread[lo:hi]))
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, h))
+    return spans
+
+
+def preprocess_image(image, config: Optional[PreprocessConfig] = None) -> List[ImageTile]:
+    """
+    识别前预处理：裁掉纯色边框、缩小到工作分辨率、切分过高的图片、可选转为灰度
+    
+    Args:
+        image: BGR 格式（或灰度）的 numpy 数组；其他输入（如图片路径）原样返回
+        config: 预处理参数，默认 PreprocessConfig()
+    
+    Returns:
+        ImageTile 列表（从上到下）
+    """
+    if not NUMPY_AVAILABLE or not isinstance(image, np.ndarray) or image.ndim not in (2, 3) or not image.size:
+        return [ImageTile(image)]
+    config = config or PreprocessConfig()
+    x0 = y0 = 0
+    if config.trim_borders:
+        image, x0, y0 = _trim_borders(image, config.border_tolerance, config.border_margin)
+    
+    scale = 1.0
+    h, w = image.shape[:2]
+    if config.max_width and w > config.max_width:
+        scale = config.max_width / w
+        image = _area_resize(image, max(1, round(h * scale)), config.max_width)
+    
+    if config.grayscale and image.ndim == 3:
+        gray = (image[..., :3].astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32) + 0.5)
+        image = np.repeat(gray.astype(np.uint8)[..., None], 3, axis=2)
+    
+    tiles = []
+    for top, bottom in _tile_rows(image, config.tile_aspect, config.tile_search):
+        tiles.append(ImageTile(np.ascontiguousarray(image[top:bottom]), x0=x0, y0=y0 + top / scale, scale=scale))
+    return tiles
+
+
+def _merge_tile_results(tiles: List[ImageTile], results: List[OCRResult]) -> OCRResult:
+    """按从上到下的顺序合并各块的识别结果，文本框换算回原图坐标"""
+    if len(tiles) == 1 and tiles[0].scale == 1.0 and not tiles[0].x0 and not tiles[0].y0:
+        return results[0]
+    lines, confidences, boxes = [], [], []
+    for tile, result in zip(tiles, results):
+        lines.extend(result.lines)
+        confidences.extend(result.confidences)
+        boxes.extend(tile.to_original(box) for box in (result.boxes or [None] * len(result.lines)))
+    return OCRResult(text="\n".join(lines), lines=lines, confidences=confidences, boxes=boxes)
+
+
+class _ByteBudget:
+    """
+    限制已下载、待识别图片的总字节数
+    
+    按 ticket（图片序号）顺序分配额度：识别线程按序消费，
+    因此排在前面的图片总能拿到额度，不会出现互相等待的死锁。
+    """
+    
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self.next_ticket = 0
+        self.closed = False
+        self._cond = threading.Condition()
+    
+    def acquire(self, ticket: int, nbytes: int) -> bool:
+        """按顺序申请额度；预算已关闭时返回 False"""
+        with self._cond:
+            while not self.closed and (
+                ticket != self.next_ticket
+                # 单张超过上限时，只要没有其他图片占用额度也放行
+                or (self.in_use > 0 and self.in_use + nbytes > self.limit)
+            ):
+                self._cond.wait()
+            if self.closed:
+                return False
+            self.in_use += nbytes
+            self.next_ticket += 1
+            self._cond.notify_all()
+            return True
+    
+    def adjust(self, delta: int):
+        """下载完成后按实际大小修正占用"""
+        with self._cond:
+            self.in_use += delta
+            self._cond.notify_all()
+    
+    def release(self, nbytes: int):
+        with self._cond:
+            self.in_use -= nbytes
+            self._cond.notify_all()
+    
+    def close(self):
+        """唤醒所有等待的下载线程并让它们放弃"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def _prefetch_image(
+    image_url: str, budget: _ByteBudget, ticket: int, fetch: Optional[Callable] = None
+) -> Tuple[Optional[Tuple[bytes, str]], int, float]:
+    """
+    下载线程：申请额度后下载图片（fetch 为 None 时直接下载，否则如 ImageStore.fetch 从共享副本取图）
+    
+    Returns:
+        (下载结果, 占用的额度, 下载耗时秒)，额度由识别线程在识别完成后释放
+    """
+    if not budget.acquire(ticket, _DEFAULT_IMAGE_BYTES):
+        return None, 0, 0.0
+    reserved = _DEFAULT_IMAGE_BYTES
+    start = time.perf_counter()
+    downloaded = (fetch or _download_image_for_ocr)(image_url)
+    elapsed = time.perf_counter() - start
+    if downloaded is not None:
+        actual = len(downloaded[0])
+        budget.adjust(actual - reserved)
+        reserved = actual
+    else:
+        budget.release(reserved)
+        reserved = 0
+    return downloaded, reserved, elapsed
+
+
+class _SharedEngine:
+    """
+    进程内共享的 OCR 引擎（每个 (backend, lang) 只加载一次模型）
+
+    推理过程加锁串行执行，可以在多个工作线程中安全使用。
+    """
+
+    def __init__(self, backend: str, lang: str):
+        self.backend = backend
+        self.lang = lang
+        self.engine: Optional[OCRBackend] = None
+        self.error: Optional[Exception] = None
+        self.ready = threading.Event()
+        self._infer_lock = threading.Lock()
+
+    def load(self):
+        """加载模型（只应由创建者调用一次）"""
+        try:
+            self.engine = create_backend(self.backend, self.lang, cpu_threads=_ENGINE_CPU_THREADS)
+            print(f"✓ OCR 后端 {self.backend} 初始化成功（lang={self.lang}）")
+        except Exception as e:
+            self.error = e
+            print(f"警告：OCR 后端 {self.backend} 初始化失败: {e}")
+        finally:
+            self.ready.set()
+
+    @property
+    def signature(self) -> str:
+        """引擎标识：后端:语言:版本"""
+        version = self.engine.version if self.engine is not None else "unknown"
+        return f"{self.backend}:{self.lang}:{version}"
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待模型加载完成，返回引擎对象（加载失败返回 None）"""
+        self.ready.wait(timeout)
+        return self.engine
+
+    def ocr(self, image):
+        """执行一次推理"""
+        engine = self.wait()
+        if engine is None:
+            raise RuntimeError(f"OCR 引擎不可用: {self.error}")
+        with self._infer_lock:
+            return engine.ocr(image)
+
+    def ocr_batch(self, images: List) -> List:
+        """一次推理多张图片，返回与输入一一对应的结果（整批只加一次锁）"""
+        engine = self.wait()
+        if engine is None:
+            raise RuntimeError(f"OCR 引擎不可用: {self.error}")
+        with self._infer_lock:
+            return engine.ocr_batch(list(images))
+
+
+_ENGINES: Dict[Tuple[str, str], _SharedEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+# 每个引擎的推理线程数（None 表示由引擎自行决定；OCRPool 的工作进程会设置）
+_ENGINE_CPU_THREADS: Optional[int] = None
+
+
+def _get_shared_engine(lang: str, backend: str = "paddle", block: bool = True) -> _SharedEngine:
+    """
+    获取共享引擎，第一次获取时加载模型
+
+    Args:
+        block: 为 False 时在后台线程中加载，立即返回
+    """
+    with _ENGINES_LOCK:
+        shared = _ENGINES.get((backend, lang))
+        if shared is not None and shared.ready.is_set() and shared.engine is None:
+            # 上次加载失败，允许重试
+            shared = None
+        is_new = shared is None
+        if is_new:
+            shared = _ENGINES[(backend, lang)] = _SharedEngine(backend, lang)
+
+    if is_new:
+        if block:
+            shared.load()
+        else:
+            threading.Thread(target=shared.load, name=f"ocr-warmup-{backend}-{lang}", daemon=True).start()
+    elif block:
+        # 其他线程（如后台预热）正在加载时等待其完成
+        shared.wait()
+    return shared
+
+
+def warm_up_ocr(use_lang: str = "ch", background: bool = True, backend: Optional[str] = None) -> bool:
+    """
+    预先加载 OCR 模型，避免第一次识别时等待模型加载
+
+    Args:
+        use_lang: 识别语言
+        background: 是否在后台线程中加载（立即返回）
+        backend: OCR 后端（见 ocr_backends），None 时按环境变量/已安装的后端选择
+
+    Returns:
+        OCR 是否可用（后端未安装时返回 False）
+    """
+    backend = resolve_backend_name(backend)
+    if not BACKENDS[backend].is_available():
+        return False
+    _get_shared_engine(use_lang, backend=backend, block=not background)
+    return True
+
+
+@dataclass
+class OCRResult:
+    """一张图片的识别结果"""
+    text: str
+    lines: List[str] = field(default_factory=list)
+    confidences: List[Optional[float]] = field(default_factory=list)
+    skipped: bool = False  # 预筛选判定没有文字，未调用识别
+    boxes: List[Optional[List[List[float]]]] = field(default_factory=list)  # 每行的文本框 [[x, y], ...]
+    source: str = "engine"  # engine 引擎识别 / cache 结果缓存 / duplicate 近似重复图片
+
+
+# 流式识别中每张图片的状态
+STATUS_OK = "ok"                # 引擎识别完成（可能没有文字）
+STATUS_CACHED = "cached"        # 使用缓存结果
+STATUS_DUPLICATE = "duplicate"  # 复用近似重复图片的识别结果
+STATUS_SKIPPED = "skipped"      # 预筛选判定没有文字
+STATUS_FAILED = "failed"        # 下载、解码或识别失败
+STATUS_TIMEOUT = "timeout"      # 超出整篇笔记的时间预算，未识别
+STATUS_CANCELLED = "cancelled"  # 已取消，未识别
+_STOPPED_STATUSES = (STATUS_TIMEOUT, STATUS_CANCELLED)
+
+
+@dataclass
+class ImageOCRResult:
+    """流式识别返回的一张图片的结果"""
+    index: int  # 图片在输入列表中的序号（从 0 开始）
+    url: str
+    status: str
+    text: str = ""
+    lines: List[str] = field(default_factory=list)
+    boxes: List[Optional[List[List[float]]]] = field(default_factory=list)
+    confidences: List[Optional[float]] = field(default_factory=list)
+    download_seconds: float = 0.0
+    ocr_seconds: float = 0.0  # 批量识别时为整批耗时平均到每张
+
+    @property
+    def ok(self) -> bool:
+        """是否得到了识别结果（包括缓存、近似重复和预筛选跳过）"""
+        return self.status not in (STATUS_FAILED, STATUS_TIMEOUT, STATUS_CANCELLED)
+
+    @classmethod
+    def from_result(cls, index: int, url: str, result: OCRResult, **timing) -> "ImageOCRResult":
+        if result.skipped:
+            status = STATUS_SKIPPED
+        else:
+            status = {"cache": STATUS_CACHED, "duplicate": STATUS_DUPLICATE}.get(result.source, STATUS_OK)
+        return cls(
+            index=index, url=url, status=status, text=result.text, lines=list(result.lines),
+            boxes=list(result.boxes), confidences=list(result.confidences), **timing,
+        )
+
+
+def _is_noise_text(text) -> bool:
+    """判断是否是噪音文本（文件路径、系统关键字等）"""
+    if not text or len(text.strip()) < 1:
+        return True
+    text_lower = text.lower()
+    # 过滤文件路径
+    if text.startswith('/') or text.startswith('\\') or ':/' in text or ':\\' in text:
+        return True
+    # 过滤系统关键字
+    noise_keywords = ['min', 'max', 'general', 'default', 'none', 'null', 'true', 'false']
+    if text_lower.strip() in noise_keywords:
+        return True
+    # 过滤纯数字（可能是坐标）
+    if text.strip().replace('.', '').replace('-', '').isdigit() and len(text.strip()) < 5:
+        return True
+    return False
+
+
+def _as_confidence(value) -> Optional[float]:
+    """把置信度转换为 float（numpy 标量等），无法转换时返回 None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_box(value) -> Optional[List[List[float]]]:
+    """把文本框坐标转换为 [[x, y], ...]（numpy 数组等），无法转换时返回 None"""
+    if value is None:
+        return None
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    try:
+        points = [[float(point[0]), float(point[1])] for point in value]
+    except (TypeError, ValueError, IndexError):
+        return None
+    return points or None
+
+
+def _parse_ocr_output(result) -> Tuple[List[str], List[Optional[float]], List[Optional[List[List[float]]]]]:
+    """
+    从 OCR 引擎的返回结果中提取文本行及对应置信度、文本框
+    
+    PaddleOCR 3.x 的返回格式可能是：
+    格式1: [[[x1,y1], [x2,y2], [x3,y3], [x4,y4]], ('text', confidence), ...]
+    格式2: [{'result': [{'text': '...', 'confidence': ...}, ...]}, ...]
+    格式3: [{'rec_texts': [...], 'rec_scores': [...], ...}]
+    格式4: 其他嵌套格式
+    """
+    texts: List[str] = []
+    confidences: List[Optional[float]] = []
+    boxes: List[Optional[List[List[float]]]] = []
+    
+    def add(text, confidence=None, box=None):
+        # 过滤掉文件路径、系统关键字等
+        if text and not _is_noise_text(text):
+            texts.append(text)
+            confidences.append(_as_confidence(confidence))
+            boxes.append(_as_box(box))
+    
+    def extract_texts(data, depth=0):
+        """递归提取文字"""
+        if depth > 10:  # 防止无限递归
+            return
+        
+        if isinstance(data, dict):
+            if isinstance(data.get('rec_texts'), (list, tuple)):
+                # 格式3：文本与分数分列保存
+                scores = data.get('rec_scores')
+                scores = list(scores) if scores is not None else []
+                polys = data.get('rec_polys')
+                polys = list(polys) if polys is not None else []
+                for j, text in enumerate(data['rec_texts']):
+                    if isinstance(text, str):
+                        add(text, scores[j] if j < len(scores) else None, polys[j] if j < len(polys) else None)
+                return
+            if isinstance(data.get('text'), str):
+                add(data['text'], data.get('confidence', data.get('score')), data.get('box'))
+                return
+            # 如果是字典，查找可能的文本字段
+            for key in ['text', 'result', 'content']:
+                if key in data:
+                    extract_texts(data[key], depth + 1)
+            # 递归处理其余的值
+            for key, value in data.items():
+                if key not in ('text', 'result', 'content'):
+                    extract_texts(value, depth + 1)
+        elif isinstance(data, (list, tuple)):
+            for item in data:
+                if isinstance(item, tuple) and len(item) >= 1:
+                    # 可能是 (text, confidence) 格式，格式1中前一个元素是文本框
+                    if isinstance(item[0], str):
+                        box = data[0] if len(data) == 2 and item is data[1] else None
+                        add(item[0], item[1] if len(item) >= 2 else None, box)
+                    else:
+                        extract_texts(item, depth + 1)
+                elif isinstance(item, str):
+                    add(item)
+                elif isinstance(item, (list, tuple, dict)):
+                    extract_texts(item, depth + 1)
+        elif isinstance(data, str) and data:
+            add(data)
+    
+    extract_texts(result)
+    return texts, confidences, boxes
 
 
 class OCRProcessor:
     """OCR 处理器"""
     
-    def __init__(self, use_paddleocr: bool = True, use_lang: str = 'ch'):
+    def __init__(
+        self,
+        use_paddleocr: bool = True,
+        use_lang: str = 'ch',
+        cache: Optional[OCRCache] = None,
+        prefilter: bool = True,
+        dedup: Optional[PerceptualIndex] = None,
+        backend: Optional[str] = None,
+        preprocess: Union[bool, PreprocessConfig] = True,
+        image_store=None,
+    ):
         """
         Args:
-            use_paddleocr: 是否使用 PaddleOCR（本地）
-            use_lang: PaddleOCR 语言，'ch' 中文，'en' 英文，'ch' + 'en' 中英混合
+            use_paddleocr: 是否启用本地 OCR（参数名沿用早期只支持 PaddleOCR 时的命名）
+            use_lang: 识别语言，'ch' 中文，'en' 英文，'ch' + 'en' 中英混合
+            cache: OCR 结果缓存，为 None 时不使用缓存（见 ocr_cache.get_default_ocr_cache）
+            prefilter: 是否先用 likely_has_text 预筛选，跳过明显没有文字的图片
+            dedup: 感知哈希索引，重复的图片（内容相同，或近似且通过缩略图校验）直接复用之前的识别文本，
+                   默认不启用（见 image_dedup.get_default_dedup_index）
+            backend: OCR 后端 'paddle' / 'onnx' / 'tesseract'，None 时读取环境变量 XHS_OCR_BACKEND，
+                     仍未指定则使用第一个已安装的后端（见 ocr_backends）
+            preprocess: 识别前的预处理（裁边、缩小、长图切块），True 使用默认参数，False 关闭，
+                        也可以传入 PreprocessConfig
+            image_store: 共享的图片下载层（image_store.ImageStore），指定时从中取图，
+                         同一张图片之后的预览和保存不再重复下载
+        
+        同一进程内使用相同后端和语言的 OCRProcessor 共享同一份模型，重复创建不会重新加载。
+        
+        Raises:
+            ValueError: 未知的后端名称
         """
-        self.use_paddleocr = use_paddleocr and PADDLEOCR_AVAILABLE
-        self.ocr_engine = None
+        self.backend = resolve_backend_name(backend)
+        self.use_paddleocr = use_paddleocr and BACKENDS[self.backend].is_available()
+        if use_paddleocr and not self.use_paddleocr:
+            print(f"警告：OCR 后端 {self.backend} 不可用，请先安装: {BACKENDS[self.backend].install_hint}")
+        self._shared: Optional[_SharedEngine] = None
+        self.cache = None
+        self.prefilter = prefilter
+        if preprocess is True:
+            preprocess = PreprocessConfig()
+        self.preprocess: Optional[PreprocessConfig] = preprocess or None
+        # 预筛选统计：检查的图片数 / 跳过识别的图片数
+        self.prefilter_checked = 0
+        self.prefilter_skipped = 0
+        self.dedup = dedup
+        self.image_store = image_store
+        # 近似重复命中次数
+        self.dedup_hits = 0
         
         if self.use_paddleocr:
-            try:
-                # 新版本的 PaddleOCR 可能不支持 show_log 参数，使用 enable_mkldnn=False 来避免警告
-                try:
-                    # 尝试新版本的参数
-                    self.ocr_engine = PaddleOCR(use_angle_cls=True, lang=use_lang)
-                except TypeError:
-                    # 如果失败，尝试旧版本的参数
-                    try:
-                        self.ocr_engine = PaddleOCR(use_angle_cls=True, lang=use_lang, show_log=False)
-                    except TypeError:
-                        # 再尝试最简单的参数
-                        self.ocr_engine = PaddleOCR(lang=use_lang)
-                print("✓ PaddleOCR 初始化成功")
-            except Exception as e:
-                print(f"警告：PaddleOCR 初始化失败: {e}")
+            self._shared = _get_shared_engine(use_lang, backend=self.backend)
+            if self._shared.engine is None:
                 self.use_paddleocr = False
+        
+        if cache is not None and self.use_paddleocr:
+            self.cache = cache
+            self.cache.ensure_engine(self.engine_signature)
+    
+    @property
+    def ocr_engine(self):
+        """底层 OCR 引擎对象（未启用时为 None）"""
+        return self._shared.engine if self._shared is not None else None
+    
+    @property
+    def capabilities(self) -> frozenset:
+        """当前后端支持的能力（见 ocr_backends.CAP_*），未启用时为空"""
+        engine = self.ocr_engine
+        return engine.capabilities if engine is not None else frozenset()
+    
+    @property
+    def engine_signature(self) -> str:
+        """引擎/语言/版本标识，写入缓存，变化时旧的缓存结果失效"""
+        if self._shared is None:
+            return "none"
+        return self._shared.signature
+    
+    def _skip_by_prefilter(self, image) -> bool:
+        """预筛选：判定没有文字时返回 True（只对已解码的数组生效）"""
+        if not self.prefilter or not hasattr(image, "shape"):
+            return False
+        self.prefilter_checked += 1
+        if likely_has_text(image):
+            return False
+        self.prefilter_skipped += 1
+        print(f"[DEBUG OCR] 预筛选：未检测到文字，跳过识别（累计跳过 {self.prefilter_skipped}/{self.prefilter_checked}）")
+        return True
+    
+    def _find_duplicate(
+        self, image, digest: Optional[str] = None, image_id: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[Fingerprint]]:
+        """
+        在感知哈希索引中查找重复的图片：先按内容哈希/图片ID精确查找，
+        再按感知哈希找候选，候选必须通过缩略图校验（同一模板的不同截图哈希几乎一样）
+        
+        Returns:
+            (之前的识别文本或 None, 用于之后写入索引的 Fingerprint)
+        """
+        if self.dedup is None or not hasattr(image, "shape"):
+            return None, None
+        key = fingerprint(image)
+        match = self.dedup.find_exact(content_hash=digest, image_id=image_id, require="text")
+        if match is None:
+            match = self.dedup.find(key.hash, aspect=key.aspect, require="text", thumb=key.thumb)
+        if match is None:
+            return None, key
+        self.dedup_hits += 1
+        print(f"[DEBUG OCR] 重复图片（汉明距离 {match.distance}），复用之前的识别结果")
+        return match.text, key
+    
+    def _remember(self, key: Optional[Fingerprint], digest: Optional[str], image_id: Optional[str], text: str):
+        """把识别结果写入感知哈希索引（只是记录，失败时不影响已经得到的识别结果）"""
+        if self.dedup is not None and key is not None:
+            try:
+                self.dedup.remember(
+                    key.hash, key.aspect, content_hash=digest, image_id=image_id, text=text, thumb=key.thumb,
+                )
+            except (sqlite3.Error, OSError) as e:
+                print(f"警告：写入去重索引失败: {e}")
+    
+    def _cached_by_url(self, image_url: str) -> Optional[str]:
+        """按图片ID查缓存，命中时不需要下载"""
+        if self.cache is None:
+            return None
+        hit = self.cache.get_by_image_id(image_id_from_url(image_url), self.engine_signature)
+        return hit.text if hit is not None else None
     
     def ocr_image_from_url(self, image_url: str) -> str:
         """
@@ -53,57 +770,29 @@ class OCRProcessor:
         Returns:
             识别出的文字文本
         """
-        if not image_url or not image_url.startswith('http'):
-            print(f"警告：无效的图片 URL: {image_url}")
+        cached = self._cached_by_url(image_url)
+        if cached is not None:
+            return cached
+        downloaded = self._fetch(image_url)
+        if downloaded is None:
             return ""
-        
+        data, content_type = downloaded
+        return self._ocr_downloaded(image_url, data, content_type)
+    
+    def _fetch(self, image_url: str) -> Optional[Tuple[bytes, str]]:
+        """下载图片（有共享下载层时从中取图）"""
+        if self.image_store is not None:
+            return self.image_store.fetch(image_url)
+        return _download_image_for_ocr(image_url)
+    
+    def _ocr_downloaded(self, image_url: str, data: bytes, content_type: str) -> str:
+        """识别已下载到内存中的图片（先按内容哈希查缓存，再按感知哈希查近似重复）"""
         try:
-            # 下载图片（添加更完整的请求头，模拟浏览器）
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://www.xiaohongshu.com/',
-            }
-            response = requests.get(image_url, headers=headers, timeout=20, stream=True)
-            response.raise_for_status()
-            
-            # 保存临时文件
-            import tempfile
-            # 根据 Content-Type 确定文件后缀
-            content_type = response.headers.get('Content-Type', '').lower()
-            if 'png' in content_type:
-                suffix = '.png'
-            elif 'gif' in content_type:
-                suffix = '.gif'
-            else:
-                suffix = '.jpg'
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    tmp_file.write(chunk)
-                tmp_path = tmp_file.name
-            
-            try:
-                text = self.ocr_image_from_file(tmp_path)
-            finally:
-                # 确保删除临时文件
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
-            
-            return text
-            
-        except requests.exceptions.Timeout:
-            print(f"警告：OCR 图片 {image_url} 超时")
-            return ""
-        except requests.exceptions.RequestException as e:
-            print(f"警告：下载图片 {image_url} 失败: {e}")
-            return ""
+            result = self._ocr_downloaded_results([(image_url, data, content_type)])[0]
         except Exception as e:
             print(f"警告：OCR 图片 {image_url} 失败: {e}")
             return ""
+        return result.text if result is not None else ""
     
     def ocr_image_from_file(self, image_path: str) -> str:
         """
@@ -112,137 +801,503 @@ class OCRProcessor:
         Returns:
             识别出的文字文本，如果没有 OCR 引擎或识别失败则返回空字符串
         """
-        if self.use_paddleocr and self.ocr_engine:
+        image = image_path
+        if self.prefilter and NUMPY_AVAILABLE:
+            # 解码到内存，以便先做预筛选；读取或解码失败时仍交给引擎按路径处理
             try:
-                # 新版本的 PaddleOCR (3.x) 不再支持 cls 参数
-                # 直接调用 ocr 方法，不带 cls 参数
-                result = self.ocr_engine.ocr(image_path)
-                
-                print(f"[DEBUG OCR] OCR 返回结果类型: {type(result)}")
-                print(f"[DEBUG OCR] OCR 返回结果长度: {len(result) if isinstance(result, (list, tuple)) else 'N/A'}")
-                if result and len(str(result)) < 500:
-                    print(f"[DEBUG OCR] OCR 返回结果预览: {result}")
-                
-                if not result:
-                    print(f"[DEBUG OCR] OCR 返回结果为空")
-                    return ""
-                
-                texts = []
-                
-                # 定义噪音文本过滤函数
-                def _is_noise_text(text):
-                    """判断是否是噪音文本（文件路径、系统关键字等）"""
-                    if not text or len(text.strip()) < 1:
-                        return True
-                    text_lower = text.lower()
-                    # 过滤文件路径
-                    if text.startswith('/') or text.startswith('\\') or ':/' in text or ':\\' in text:
-                        return True
-                    # 过滤系统关键字
-                    noise_keywords = ['min', 'max', 'general', 'default', 'none', 'null', 'true', 'false']
-                    if text_lower.strip() in noise_keywords:
-                        return True
-                    # 过滤纯数字（可能是坐标）
-                    if text.strip().replace('.', '').replace('-', '').isdigit() and len(text.strip()) < 5:
-                        return True
-                    return False
-                
-                # PaddleOCR 3.x 的返回格式可能是：
-                # 格式1: [[[x1,y1], [x2,y2], [x3,y3], [x4,y4]], ('text', confidence), ...]
-                # 格式2: [{'result': [{'text': '...', 'confidence': ...}, ...]}, ...]
-                # 格式3: 其他嵌套格式
-                
-                # 尝试解析不同格式
-                def extract_texts(data, depth=0):
-                    """递归提取文字"""
-                    if depth > 10:  # 防止无限递归
-                        return
-                    
-                    if isinstance(data, dict):
-                        # 如果是字典，查找可能的文本字段
-                        for key in ['text', 'result', 'content']:
-                            if key in data:
-                                extract_texts(data[key], depth + 1)
-                        # 递归处理所有值
-                        for value in data.values():
-                            extract_texts(value, depth + 1)
-                    elif isinstance(data, (list, tuple)):
-                        for item in data:
-                            if isinstance(item, tuple) and len(item) >= 1:
-                                # 可能是 (text, confidence) 格式
-                                if isinstance(item[0], str):
-                                    text = item[0]
-                                    # 过滤掉文件路径、系统关键字等
-                                    if text and not _is_noise_text(text):
-                                        texts.append(text)
-                                else:
-                                    extract_texts(item, depth + 1)
-                            elif isinstance(item, str):
-                                # 过滤掉文件路径、系统关键字等
-                                if not _is_noise_text(item):
-                                    texts.append(item)
-                            elif isinstance(item, (list, tuple, dict)):
-                                extract_texts(item, depth + 1)
-                    elif isinstance(data, str) and data:
-                        # 过滤掉文件路径、系统关键字等
-                        if not _is_noise_text(data):
-                            texts.append(data)
-                
-                extract_texts(result)
-                
-                print(f"[DEBUG OCR] 提取到 {len(texts)} 个文本片段")
-                if texts:
-                    print(f"[DEBUG OCR] 文本预览: {texts[:5]}")
-                
-                return "\n".join(texts) if texts else ""
-            except Exception as e:
-                print(f"[ERROR OCR] PaddleOCR 处理失败: {e}")
-                import traceback
-                traceback.print_exc()
-                return ""
-        else:
-            # 如果没有 PaddleOCR，返回空字符串
+                with open(image_path, "rb") as f:
+                    decoded = decode_image_bytes(f.read())
+                if decoded is not None:
+                    image = decoded
+            except OSError:
+                pass
+        return self._run_ocr(image)
+    
+    def ocr_image_from_bytes(self, data: bytes) -> str:
+        """
+        从内存中的图片字节识别文字（在内存中解码，不经过临时文件）
+        
+        Returns:
+            识别出的文字文本，如果没有 OCR 引擎、解码失败或识别失败则返回空字符串
+        """
+        result = self._recognize_bytes(data)
+        return result.text if result is not None else ""
+    
+    def _recognize_bytes(self, data: bytes) -> Optional[OCRResult]:
+        """解码并识别内存中的图片，失败时返回 None"""
+        if not (self.use_paddleocr and self.ocr_engine):
+            return None
+        image = decode_image_bytes(data)
+        if image is None:
+            print("警告：图片解码失败")
+            return None
+        return self._recognize(image)
+    
+    def _run_ocr(self, image) -> str:
+        """
+        调用 OCR 引擎并返回识别文本
+        
+        Args:
+            image: 图片路径或 BGR 格式的 numpy 数组
+        """
+        result = self._recognize(image)
+        return result.text if result is not None else ""
+    
+    def _recognize(self, image) -> Optional[OCRResult]:
+        """
+        调用 OCR 引擎并整理识别结果
+        
+        Returns:
+            OCRResult（没有识别到文字时 text 为空），没有 OCR 引擎或识别出错时返回 None
+        """
+        if not (self.use_paddleocr and self.ocr_engine):
+            # 如果没有可用的 OCR 后端，返回 None
             # 注意：不要在每次调用时都打印提示，这样会太吵
             # 只在初始化时打印一次即可
-            return ""
+            return None
+        if self._skip_by_prefilter(image):
+            return OCRResult(text="", skipped=True)
+        try:
+            tiles = self._preprocess(image)
+            # 新版本的 PaddleOCR (3.x) 不再支持 cls 参数
+            # 直接调用 ocr 方法，不带 cls 参数
+            if len(tiles) == 1:
+                raw_results = [self._shared.ocr(tiles[0].image)]
+            else:
+                raw_results = self._shared.ocr_batch([tile.image for tile in tiles])
+            return _merge_tile_results(tiles, [self._to_result(raw) for raw in raw_results])
+        except Exception as e:
+            print(f"[ERROR OCR] {self.backend} 处理失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
     
-    def ocr_images(self, image_urls: List[str]) -> str:
+    def _preprocess(self, image) -> List[ImageTile]:
+        """按配置预处理图片（未启用时原样返回一块）"""
+        if self.preprocess is None:
+            return [ImageTile(image)]
+        return preprocess_image(image, self.preprocess)
+    
+    @staticmethod
+    def _to_result(result) -> OCRResult:
+        """整理引擎对一张图片的返回结果"""
+        print(f"[DEBUG OCR] OCR 返回结果类型: {type(result)}")
+        print(f"[DEBUG OCR] OCR 返回结果长度: {len(result) if isinstance(result, (list, tuple)) else 'N/A'}")
+        if result and len(str(result)) < 500:
+            print(f"[DEBUG OCR] OCR 返回结果预览: {result}")
+        
+        if not result:
+            print(f"[DEBUG OCR] OCR 返回结果为空")
+            return OCRResult(text="")
+        
+        texts, confidences, boxes = _parse_ocr_output(result)
+        
+        print(f"[DEBUG OCR] 提取到 {len(texts)} 个文本片段")
+        if texts:
+            print(f"[DEBUG OCR] 文本预览: {texts[:5]}")
+        
+        return OCRResult(text="\n".join(texts), lines=texts, confidences=confidences, boxes=boxes)
+    
+    def recognize_batch(self, images: List, batch_size: int = OCR_BATCH_SIZE) -> List[Optional[OCRResult]]:
         """
-        批量 OCR 多张图片，返回合并的文本
+        批量识别多张图片
+        
+        图片先按尺寸分组（尺寸相近的放在同一批，减少填充），每批调用一次引擎，
+        结果按输入顺序返回。某一批出错时，该批的结果为 None，其余批不受影响。
+        
+        Args:
+            images: 图片路径或 BGR 格式的 numpy 数组列表
+            batch_size: 每批的图片数，为 1 时等同于逐张识别
+        """
+        results: List[Optional[OCRResult]] = [None] * len(images)
+        if not images or not (self.use_paddleocr and self.ocr_engine):
+            return results
+        batch_size = max(1, batch_size)
+        
+        def size_key(entry):
+            shape = getattr(entry[1].image, "shape", None)
+            if shape is None:
+                return (0, 0)
+            return (shape[0] // _SIZE_BUCKET, shape[1] // _SIZE_BUCKET)
+        
+        # 预处理后每张图片可能切成多块，按块送入引擎，再合并回每张图片
+        tiles: Dict[int, List[ImageTile]] = {}
+        entries = []  # (图片序号, 块)
+        for k, image in enumerate(images):
+            if self._skip_by_prefilter(image):
+                results[k] = OCRResult(text="", skipped=True)
+                continue
+            try:
+                tiles[k] = self._preprocess(image)
+            except Exception as e:
+                print(f"[ERROR OCR] 图片 {k + 1} 预处理失败: {e}")
+                continue
+            entries.extend((k, tile) for tile in tiles[k])
+        entries.sort(key=size_key)
+        tile_results: Dict[int, Dict[int, OCRResult]] = {k: {} for k in tiles}
+        for start in range(0, len(entries), batch_size):
+            chunk = entries[start:start + batch_size]
+            try:
+                if len(chunk) == 1:
+                    raw_results = [self._shared.ocr(chunk[0][1].image)]
+                else:
+                    raw_results = self._shared.ocr_batch([tile.image for _, tile in chunk])
+                for (k, tile), raw in zip(chunk, raw_results):
+                    tile_results[k][id(tile)] = self._to_result(raw)
+            except Exception as e:
+                print(f"[ERROR OCR] {self.backend} 批量处理失败（{len(chunk)} 块）: {e}")
+        for k, image_tiles in tiles.items():
+            done = tile_results[k]
+            # 任意一块失败时整张图片视为失败
+            if all(id(tile) in done for tile in image_tiles):
+                results[k] = _merge_tile_results(image_tiles, [done[id(tile)] for tile in image_tiles])
+        return results
+    
+    def _ocr_downloaded_batch(self, items: List[Tuple[str, bytes, str]]) -> List[str]:
+        """
+        批量识别已下载到内存中的图片，返回与输入一一对应的文本（失败为空字符串）
+        
+        Args:
+            items: (图片URL, 图片字节, Content-Type) 列表
+        """
+        return [result.text if result is not None else "" for result in self._ocr_downloaded_results(items)]
+    
+    def _ocr_downloaded_results(self, items: List[Tuple[str, bytes, str]]) -> List[Optional[OCRResult]]:
+        """
+        识别已下载到内存中的图片：先按内容哈希查缓存，再按感知哈希查近似重复，其余的一起送入引擎
+        
+        Args:
+            items: (图片URL, 图片字节, Content-Type) 列表
+        
+        Returns:
+            与输入一一对应的 OCRResult（source 标明结果来源），解码或识别失败为 None
+        """
+        results: List[Optional[OCRResult]] = [None] * len(items)
+        if not (self.use_paddleocr and self.ocr_engine):
+            return results
+        
+        todo = []  # (序号, 图片ID, 内容哈希, 感知哈希, 图片数组)
+        for k, (url, data, _content_type) in enumerate(items):
+            image_id = digest = None
+            if self.cache is not None or self.dedup is not None:
+                image_id = image_id_from_url(url)
+                digest = content_hash(data)
+            if self.cache is not None:
+                hit = self.cache.get_by_content(digest, self.engine_signature, image_id=image_id)
+                if hit is not None:
+                    results[k] = OCRResult(
+                        text=hit.text, lines=hit.text.splitlines(), confidences=hit.confidences, source="cache",
+                    )
+                    continue
+            image = decode_image_bytes(data)
+            if image is None:
+                print(f"警告：图片解码失败: {url}")
+                continue
+            reused, key = self._find_duplicate(image, digest, image_id)
+            if reused is not None:
+                results[k] = OCRResult(text=reused, lines=reused.splitlines(), source="duplicate")
+                continue
+            todo.append((k, image_id, digest, key, image))
+        
+        if len(todo) == 1:
+            recognized = [self._recognize(todo[0][-1])]
+        else:
+            recognized = self.recognize_batch([item[-1] for item in todo], batch_size=len(todo))
+        for (k, image_id, digest, key, _image), result in zip(todo, recognized):
+            if result is None:
+                # 识别失败不缓存，下次重试
+                continue
+            results[k] = result
+            if self.cache is not None and not result.skipped:
+                # 预筛选跳过的图片下次重新判断即可，不缓存
+                self.cache.put(digest, self.engine_signature, result.text, result.confidences, image_id=image_id)
+            self._remember(key, digest, image_id, result.text)
+        return results
+    
+    def ocr_images(
+        self,
+        image_urls: List[str],
+        max_workers: int = DOWNLOAD_WORKERS,
+        max_inflight_bytes: int = MAX_INFLIGHT_BYTES,
+        batch_size: int = 1,
+        pool=None,
+        time_budget: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> str:
+        """
+        批量 OCR 多张图片，返回合并的文本（逐张的结构化结果见 iter_ocr_images）
+        
+        Args:
+            image_urls: 图片 URL 列表
+            max_workers: 并发下载的线程数
+            max_inflight_bytes: 已下载、待识别图片占用内存的上限
+            batch_size: 每次送入引擎的图片数；大于 1 时攒够一批（或内存额度用尽）再批量识别
+            pool: 可选的 OCRPool，指定时图片分发到多个进程并行识别
+            time_budget: 整篇笔记的时间预算（秒），超时后剩余图片不再识别
+            cancel: 设置后剩余图片不再识别
         """
         if not image_urls:
             return ""
+        if pool is not None and time_budget is None and cancel is None:
+            return pool.ocr_images(image_urls)
+        results = self.iter_ocr_images(
+            image_urls, max_workers=max_workers, max_inflight_bytes=max_inflight_bytes, batch_size=batch_size,
+            pool=pool, time_budget=time_budget, cancel=cancel,
+        )
+        texts: List[Optional[str]] = [None] * len(image_urls)
+        for result in results:
+            texts[result.index] = result.text if result.ok else None
+        return _merge_ocr_texts(texts)
+    
+    def iter_ocr_images(
+        self,
+        image_urls: List[str],
+        max_workers: int = DOWNLOAD_WORKERS,
+        max_inflight_bytes: int = MAX_INFLIGHT_BYTES,
+        batch_size: int = 1,
+        pool=None,
+        time_budget: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Iterator[ImageOCRResult]:
+        """
+        流式识别多张图片：每张图片完成后立即返回结构化结果（文本、文本框、置信度、耗时）
         
-        results = []
-        successful = 0
-        failed = 0
+        图片在线程池中并发预下载，识别在当前线程按顺序进行，
+        下载与识别互相重叠；已下载但尚未识别的图片总字节数不超过 max_inflight_bytes。
+        启用缓存时，已识别过的图片直接使用缓存结果，不再下载。
         
-        for i, url in enumerate(image_urls, 1):
-            print(f"正在 OCR 第 {i}/{len(image_urls)} 张图片... ({url[:50]}...)")
-            try:
-                text = self.ocr_image_from_url(url)
-                if text and text.strip():
-                    results.append(f"[图片 {i} OCR 结果]\n{text}")
-                    successful += 1
-                    print(f"✓ 图片 {i} OCR 成功，识别到 {len(text)} 字符")
+        结果按完成顺序返回（缓存命中的图片可能早于正在凑批的图片），用 index 对应输入。
+        超出时间预算或取消后，剩余图片以 timeout / cancelled 状态返回；取消是协作式的，
+        正在进行的一次识别会先完成。调用方提前停止迭代时，尚未开始的下载同样会被取消。
+        
+        Args:
+            image_urls: 图片 URL 列表
+            max_workers: 并发下载的线程数
+            max_inflight_bytes: 已下载、待识别图片占用内存的上限
+            batch_size: 每次送入引擎的图片数；大于 1 时攒够一批（或内存额度用尽）再批量识别
+            pool: 可选的 OCRPool，指定时图片分发到多个进程并行识别
+                  （超时或取消后不再等待结果，但已提交给工作进程的图片仍会识别完；
+                  工作进程自行下载图片，不经过 image_store）
+            time_budget: 整篇笔记的时间预算（秒），None 表示不限
+            cancel: 取消事件，设置后剩余图片不再识别
+        """
+        if not image_urls:
+            return
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        
+        def stop_status() -> Optional[str]:
+            if cancel is not None and cancel.is_set():
+                return STATUS_CANCELLED
+            if deadline is not None and time.monotonic() >= deadline:
+                return STATUS_TIMEOUT
+            return None
+        
+        def wait_slice() -> float:
+            # 分段等待，以便及时响应取消
+            if deadline is None:
+                return 0.1
+            return max(0.0, min(0.1, deadline - time.monotonic()))
+        
+        def stopped(indices: List[int], status: str) -> Iterator[ImageOCRResult]:
+            if indices:
+                reason = "已取消" if status == STATUS_CANCELLED else f"超出时间预算 {time_budget} 秒"
+                print(f"⚠ OCR {reason}，剩余 {len(indices)} 张图片未识别")
+            for i in indices:
+                yield ImageOCRResult(index=i, url=image_urls[i], status=status)
+        
+        if pool is not None:
+            texts = pool.imap_texts(image_urls)
+            for i, url in enumerate(image_urls):
+                start = time.perf_counter()
+                while True:
+                    status = stop_status()
+                    if status:
+                        yield from stopped(list(range(i, len(image_urls))), status)
+                        return
+                    try:
+                        text = texts.next(timeout=wait_slice())
+                        break
+                    except multiprocessing.TimeoutError:
+                        continue
+                if text is None:
+                    item = ImageOCRResult(index=i, url=url, status=STATUS_FAILED)
                 else:
-                    failed += 1
-                    print(f"⚠ 图片 {i} OCR 未识别到文字")
+                    item = ImageOCRResult(index=i, url=url, status=STATUS_OK, text=text, lines=text.splitlines())
+                item.ocr_seconds = time.perf_counter() - start
+                _report_image(item)
+                yield item
+            return
+        
+        batch_size = max(1, batch_size)
+        checked, skipped = self.prefilter_checked, self.prefilter_skipped
+        budget = _ByteBudget(max_inflight_bytes)
+        # 先查缓存，命中的图片不提交下载
+        cached = {i: self._cached_by_url(url) for i, url in enumerate(image_urls)}
+        
+        # 已下载、等待凑批的图片：(序号, URL, 下载结果, 占用的额度, 下载耗时)
+        pending = []
+        
+        def flush() -> List[ImageOCRResult]:
+            if not pending:
+                return []
+            start = time.perf_counter()
+            error = None
+            try:
+                results = self._ocr_downloaded_results([(url, *downloaded) for _, url, downloaded, _, _ in pending])
             except Exception as e:
-                failed += 1
-                print(f"✗ 图片 {i} OCR 失败: {e}")
+                results = [None] * len(pending)
+                error = e
+            finally:
+                for _, _, _, reserved, _ in pending:
+                    budget.release(reserved)
+            per_image = (time.perf_counter() - start) / len(pending)
+            items = []
+            for (i, url, _, _, download_seconds), result in zip(pending, results):
+                timing = dict(download_seconds=download_seconds, ocr_seconds=per_image)
+                if result is None:
+                    item = ImageOCRResult(index=i, url=url, status=STATUS_FAILED, **timing)
+                else:
+                    item = ImageOCRResult.from_result(i, url, result, **timing)
+                _report_image(item, error)
+                items.append(item)
+            pending.clear()
+            return items
         
-        print(f"OCR 完成：成功 {successful}/{len(image_urls)}，失败 {failed}/{len(image_urls)}")
-        return "\n\n".join(results)
+        # 超时或取消时不等待正在进行的下载（下载线程在超时后自行结束），立即返回
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ocr-download")
+        futures = {}
+        for i, url in enumerate(image_urls):
+            if cached[i] is None:
+                # ticket 按提交顺序连续编号，与识别顺序一致
+                futures[i] = executor.submit(_prefetch_image, url, budget, len(futures), self._fetch)
+        try:
+            for i, url in enumerate(image_urls):
+                status = stop_status()
+                if status:
+                    break
+                print(f"正在 OCR 第 {i + 1}/{len(image_urls)} 张图片... ({url[:50]}...)")
+                if cached[i] is not None:
+                    print(f"图片 {i + 1} 使用缓存结果")
+                    item = ImageOCRResult(
+                        index=i, url=url, status=STATUS_CACHED, text=cached[i], lines=cached[i].splitlines(),
+                    )
+                    _report_image(item)
+                    yield item
+                    continue
+                # 凑批的图片占着额度，下一张可能拿不到额度而永远等待，此时先识别已有的图片
+                if sum(item[3] for item in pending) + _DEFAULT_IMAGE_BYTES > budget.limit:
+                    yield from flush()
+                while True:
+                    status = stop_status()
+                    if status:
+                        break
+                    try:
+                        downloaded, reserved, download_seconds = futures[i].result(timeout=wait_slice())
+                        break
+                    except FutureTimeoutError:
+                        continue
+                if status:
+                    break
+                if not downloaded:
+                    budget.release(reserved)
+                    item = ImageOCRResult(index=i, url=url, status=STATUS_FAILED, download_seconds=download_seconds)
+                    _report_image(item)
+                    yield item
+                    continue
+                pending.append((i, url, downloaded, reserved, download_seconds))
+                if len(pending) >= batch_size:
+                    yield from flush()
+            else:
+                status = None
+                yield from flush()
+            if status:
+                # 已下载、尚未识别的图片和之后的图片都不再识别
+                yield from stopped([item[0] for item in pending] + list(range(i, len(image_urls))), status)
+        finally:
+            # 提前退出时取消尚未开始的下载
+            for future in futures.values():
+                future.cancel()
+            for _, _, _, reserved, _ in pending:
+                budget.release(reserved)
+            pending.clear()
+            budget.close()
+            executor.shutdown(wait=False)
+    
+        checked, skipped = self.prefilter_checked - checked, self.prefilter_skipped - skipped
+        if checked:
+            print(f"预筛选：{skipped}/{checked} 张图片未检测到文字，跳过识别（{skipped / checked:.0%}）")
+
+
+def _report_image(item: ImageOCRResult, error: Optional[Exception] = None):
+    """打印一张图片的识别情况"""
+    i = item.index + 1
+    if item.status == STATUS_FAILED:
+        print(f"✗ 图片 {i} OCR 失败" + (f": {error}" if error else ""))
+    elif item.text.strip():
+        print(f"✓ 图片 {i} OCR 成功，识别到 {len(item.text)} 字符")
+    else:
+        print(f"⚠ 图片 {i} OCR 未识别到文字")
+
+
+def _format_ocr_texts(texts: List[Optional[str]]) -> Tuple[str, int]:
+    """按图片顺序拼接识别文本，返回 (合并的文本, 有文字的图片数)"""
+    results = []
+    for i, text in enumerate(texts, 1):
+        if text and text.strip():
+            results.append(f"[图片 {i} OCR 结果]\n{text}")
+    return "\n\n".join(results), len(results)
+
+
+def _merge_ocr_texts(texts: List[Optional[str]]) -> str:
+    """
+    按图片顺序合并识别结果，并打印统计
+
+    Args:
+        texts: 每张图片的识别文本（None 或空白表示失败/未识别到文字）
+    """
+    merged, successful = _format_ocr_texts(texts)
+    failed = len(texts) - successful
+    print(f"OCR 完成：成功 {successful}/{len(texts)}，失败 {failed}/{len(texts)}")
+    return merged
 
 
-def extract_ocr_from_note(note, ocr_processor: Optional[OCRProcessor] = None) -> str:
+def merge_ocr_results(results: Iterable[ImageOCRResult], total: Optional[int] = None) -> str:
+    """
+    把流式识别的结果按图片顺序合并为文本（格式与 ocr_images 相同），可以用于显示部分结果
+
+    Args:
+        results: 已完成的 ImageOCRResult（顺序不限）
+        total: 图片总数，默认按最大序号推算
+    """
+    results = list(results)
+    if total is None:
+        total = max((result.index for result in results), default=-1) + 1
+    texts: List[Optional[str]] = [None] * total
+    for result in results:
+        if result.ok:
+            texts[result.index] = result.text
+    return _format_ocr_texts(texts)[0]
+
+
+def _note_ocr_urls(note) -> List[str]:
+    # 每张图片使用仍然清晰的最小规格，减少下载字节数和解码时间
+    return note.ocr_image_urls() if hasattr(note, "ocr_image_urls") else list(note.images or [])
+
+
+def extract_ocr_from_note(
+    note,
+    ocr_processor: Optional[OCRProcessor] = None,
+    pool=None,
+    time_budget: Optional[float] = None,
+) -> str:
     """
     从 Note 对象的图片中提取 OCR 文本
     
     Args:
         note: Note 对象
-        ocr_processor: OCR 处理器，如果为 None 则创建一个新的
+        ocr_processor: OCR 处理器，如果为 None 则使用共享模型创建一个
+        pool: 可选的 OCRPool，指定时在多个进程中并行识别（不在当前进程加载模型）
+        time_budget: 整篇笔记的时间预算（秒），超时后只返回已识别的部分
     
     Returns:
         OCR 文本
@@ -250,10 +1305,39 @@ def extract_ocr_from_note(note, ocr_processor: Optional[OCRProcessor] = None) ->
     if not note.images:
         return ""
     
+    image_urls = _note_ocr_urls(note)
+    
+    if pool is not None and time_budget is None:
+        return pool.ocr_images(image_urls)
+    
     if ocr_processor is None:
-        ocr_processor = OCRProcessor()
+        ocr_processor = OCRProcessor(use_paddleocr=pool is None)
+    
+    return ocr_processor.ocr_images(image_urls, pool=pool, time_budget=time_budget)
+
+
+def iter_ocr_from_note(
+    note,
+    ocr_processor: Optional[OCRProcessor] = None,
+    pool=None,
+    time_budget: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+    image_urls: Optional[List[str]] = None,
+    **kwargs,
+) -> Iterator[ImageOCRResult]:
+    """
+    流式识别 Note 的图片，每张图片完成后立即返回结果（见 OCRProcessor.iter_ocr_images）
     
-    return ocr_processor.ocr_images(note.images)
+    用 merge_ocr_results 把已返回的结果合并为文本。
+    image_urls 默认每张图片使用 OCR 规格的链接；OCR 与保存共用一份下载时传入 note.archive_image_urls()。
+    """
+    if not note.images:
+        return iter(())
+    if ocr_processor is None:
+        ocr_processor = OCRProcessor(use_paddleocr=pool is None)
+    return ocr_processor.iter_ocr_images(
+        image_urls or _note_ocr_urls(note), pool=pool, time_budget=time_budget, cancel=cancel, **kwargs
+    )
 
 
 if __name__ == "__main__":
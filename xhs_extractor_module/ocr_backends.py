@@ -0,0 +1,311 @@
+# ocr_backends.py
+"""
+OCR 后端
+OCRProcessor 通过统一的后端接口调用具体的识别引擎，每个后端声明自己支持的能力：
+
+    paddle     PaddleOCR（paddle inference）                       pip install paddleocr paddlepaddle
+    onnx       同一套 PP-OCR 检测/识别模型的 ONNX Runtime CPU 推理   pip install rapidocr_onnxruntime
+    tesseract  Tesseract（需要系统安装 tesseract 及 chi_sim 语言包）  pip install pytesseract
+
+选择后端：OCRProcessor(backend="onnx")，或设置环境变量 XHS_OCR_BACKEND=onnx；
+都未指定时按 BACKEND_PREFERENCE 顺序使用第一个已安装的后端。
+
+后端的 ocr() 返回 ocr._parse_ocr_output 可以解析的结果（PaddleOCR 原始格式，
+或统一的 [[文本框, (文本, 置信度)], ...]）。
+"""
+from __future__ import annotations
+
+import os
+import shutil
+from typing import Dict, FrozenSet, List, Optional, Type
+
+try:
+    from paddleocr import PaddleOCR
+    PADDLEOCR_AVAILABLE = True
+except ImportError:
+    PADDLEOCR_AVAILABLE = False
+
+try:
+    from rapidocr_onnxruntime import RapidOCR
+    RAPIDOCR_AVAILABLE = True
+except ImportError:
+    RAPIDOCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+
+# 后端能力
+CAP_BATCH = "batch"            # 一次推理多张图片
+CAP_ANGLE = "angle"            # 文字方向分类（旋转 180° 的文字）
+CAP_BOXES = "boxes"            # 返回文本框坐标
+CAP_CONFIDENCE = "confidence"  # 返回每行置信度
+
+# 选择后端的环境变量
+BACKEND_ENV_VAR = "XHS_OCR_BACKEND"
+# 未指定后端时的选择顺序
+BACKEND_PREFERENCE = ("paddle", "onnx", "tesseract")
+
+
+class OCRBackend:
+    """OCR 后端基类"""
+
+    name = ""
+    capabilities: FrozenSet[str] = frozenset()
+    install_hint = ""
+
+    def __init__(self, lang: str, cpu_threads: Optional[int] = None):
+        """
+        Args:
+            lang: 识别语言（PaddleOCR 的语言代码，如 'ch'、'en'）
+            cpu_threads: 推理线程数，None 表示由引擎自行决定
+
+        Raises:
+            ImportError: 未安装依赖
+            ValueError: 不支持该语言
+        """
+        self.lang = lang
+        self.cpu_threads = cpu_threads
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """依赖是否已安装"""
+        return False
+
+    @property
+    def version(self) -> str:
+        """引擎/模型版本，写入缓存的引擎标识"""
+        return "unknown"
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    def ocr(self, image):
+        """识别一张图片（BGR numpy 数组或图片路径）"""
+        raise NotImplementedError
+
+    def ocr_batch(self, images: List) -> List:
+        """识别多张图片，返回与输入一一对应的结果；不支持批量推理的后端逐张识别"""
+        return [self.ocr(image) for image in images]
+
+
+def _create_paddle_engine(lang: str, cpu_threads: Optional[int] = None):
+    """创建 PaddleOCR 实例，兼容不同版本的构造参数"""
+    if cpu_threads:
+        # 限定推理线程数（多进程时每个进程只用分配给它的核心）
+        try:
+            return PaddleOCR(use_angle_cls=True, lang=lang, cpu_threads=cpu_threads)
+        except TypeError:
+            pass
+    # 新版本的 PaddleOCR 可能不支持 show_log 参数，使用 enable_mkldnn=False 来避免警告
+    try:
+        # 尝试新版本的参数
+        return PaddleOCR(use_angle_cls=True, lang=lang)
+    except TypeError:
+        # 如果失败，尝试旧版本的参数
+        try:
+            return PaddleOCR(use_angle_cls=True, lang=lang, show_log=False)
+        except TypeError:
+            # 再尝试最简单的参数
+            return PaddleOCR(lang=lang)
+
+
+class PaddleBackend(OCRBackend):
+    """PaddleOCR（paddle inference）"""
+
+    name = "paddle"
+    capabilities = frozenset({CAP_BATCH, CAP_ANGLE, CAP_BOXES, CAP_CONFIDENCE})
+    install_hint = "pip install paddleocr paddlepaddle"
+
+    def __init__(self, lang: str, cpu_threads: Optional[int] = None):
+        super().__init__(lang, cpu_threads)
+        if not PADDLEOCR_AVAILABLE:
+            raise ImportError(f"未安装 paddleocr: {self.install_hint}")
+        self.model = _create_paddle_engine(lang, cpu_threads=cpu_threads)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return PADDLEOCR_AVAILABLE
+
+    @property
+    def version(self) -> str:
+        try:
+            import paddleocr
+            return getattr(paddleocr, "__version__", "unknown")
+        except ImportError:
+            return "unknown"
+
+    def ocr(self, image):
+        return self.model.ocr(image)
+
+    def ocr_batch(self, images: List) -> List:
+        """
+        PaddleOCR 3.x 的 predict 接受图片列表，检测和识别在引擎内部按批执行；
+        旧版本没有 predict，退回逐张识别。
+        """
+        predict = getattr(self.model, "predict", None)
+        if callable(predict):
+            results = list(predict(list(images)))
+            if len(results) == len(images):
+                return results
+            print(f"警告：批量识别返回 {len(results)} 个结果（输入 {len(images)} 张），改为逐张识别")
+        return [self.model.ocr(image) for image in images]
+
+
+class RapidOCRBackend(OCRBackend):
+    """PP-OCR 模型的 ONNX Runtime CPU 推理（rapidocr_onnxruntime）"""
+
+    name = "onnx"
+    capabilities = frozenset({CAP_ANGLE, CAP_BOXES, CAP_CONFIDENCE})
+    install_hint = "pip install rapidocr_onnxruntime"
+    # 自带的模型是中英文识别模型
+    languages = ("ch", "en")
+
+    def __init__(self, lang: str, cpu_threads: Optional[int] = None):
+        super().__init__(lang, cpu_threads)
+        if not RAPIDOCR_AVAILABLE:
+            raise ImportError(f"未安装 rapidocr_onnxruntime: {self.install_hint}")
+        if lang not in self.languages:
+            raise ValueError(f"onnx 后端只支持 {', '.join(self.languages)}，不支持 lang={lang}")
+        self.model = None
+        if cpu_threads:
+            try:
+                self.model = RapidOCR(intra_op_num_threads=cpu_threads, inter_op_num_threads=1)
+            except TypeError:
+                pass
+        if self.model is None:
+            self.model = RapidOCR()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return RAPIDOCR_AVAILABLE
+
+    @property
+    def version(self) -> str:
+        try:
+            import rapidocr_onnxruntime
+            return getattr(rapidocr_onnxruntime, "__version__", "unknown")
+        except ImportError:
+            return "unknown"
+
+    def ocr(self, image):
+        # 返回 ([[文本框, 文本, 置信度], ...] 或 None, 各阶段耗时)
+        result, _elapse = self.model(image)
+        return [[box, (text, score)] for box, text, score in (result or [])]
+
+
+def _join_words(words: List[str]) -> str:
+    """拼接 Tesseract 的分词结果：英文单词之间加空格，中文字符之间不加"""
+    line = ""
+    for word in words:
+        if line and line[-1].isascii() and line[-1].isalnum() and word[0].isascii() and word[0].isalnum():
+            line += " "
+        line += word
+    return line
+
+
+class TesseractBackend(OCRBackend):
+    """Tesseract（pytesseract）"""
+
+    name = "tesseract"
+    capabilities = frozenset({CAP_BOXES, CAP_CONFIDENCE})
+    install_hint = "pip install pytesseract（并安装 tesseract 及 chi_sim 语言包）"
+    # PaddleOCR 语言代码 -> Tesseract 语言
+    LANG_MAP = {"ch": "chi_sim+eng", "en": "eng", "chinese_cht": "chi_tra+eng", "japan": "jpn", "korean": "kor"}
+
+    def __init__(self, lang: str, cpu_threads: Optional[int] = None):
+        """
+        tesseract 子进程的 OpenMP 线程数由进程环境中的 OMP_THREAD_LIMIT 决定（OCRPool 为工作进程设置），
+        这里不修改当前进程的环境变量
+        """
+        super().__init__(lang, cpu_threads)
+        if not PYTESSERACT_AVAILABLE:
+            raise ImportError(f"未安装 pytesseract: {self.install_hint}")
+        if not self.is_available():
+            raise ImportError(f"未找到 tesseract 可执行文件 {pytesseract.pytesseract.tesseract_cmd}: {self.install_hint}")
+        self.tesseract_lang = self.LANG_MAP.get(lang, lang)
+        try:
+            self._version = str(pytesseract.get_tesseract_version())
+        except OSError as e:
+            # TesseractNotFoundError：可执行文件无法运行
+            raise ImportError(f"无法运行 tesseract: {e}") from e
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """pytesseract 已安装，并且能找到 tesseract 可执行文件"""
+        return PYTESSERACT_AVAILABLE and shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    def ocr(self, image):
+        if hasattr(image, "shape") and image.ndim == 3:
+            # BGR -> RGB
+            image = image[:, :, 2::-1].copy()
+        data = pytesseract.image_to_data(image, lang=self.tesseract_lang, output_type=pytesseract.Output.DICT)
+        lines: Dict[tuple, dict] = {}
+        for k, word in enumerate(data["text"]):
+            conf = float(data["conf"][k])
+            if not word.strip() or conf < 0:
+                continue
+            key = (data["block_num"][k], data["par_num"][k], data["line_num"][k])
+            line = lines.setdefault(key, {"words": [], "confs": [], "box": [None, None, None, None]})
+            line["words"].append(word.strip())
+            line["confs"].append(conf)
+            left, top = data["left"][k], data["top"][k]
+            right, bottom = left + data["width"][k], top + data["height"][k]
+            box = line["box"]
+            box[0] = left if box[0] is None else min(box[0], left)
+            box[1] = top if box[1] is None else min(box[1], top)
+            box[2] = right if box[2] is None else max(box[2], right)
+            box[3] = bottom if box[3] is None else max(box[3], bottom)
+        result = []
+        for line in lines.values():
+            x1, y1, x2, y2 = line["box"]
+            score = sum(line["confs"]) / len(line["confs"]) / 100
+            result.append([[[x1, y1], [x2, y1], [x2, y2], [x1, y2]], (_join_words(line["words"]), score)])
+        return result
+
+
+BACKENDS: Dict[str, Type[OCRBackend]] = {
+    PaddleBackend.name: PaddleBackend,
+    RapidOCRBackend.name: RapidOCRBackend,
+    TesseractBackend.name: TesseractBackend,
+}
+
+
+def available_backends() -> List[str]:
+    """已安装依赖的后端名称（按 BACKEND_PREFERENCE 排序）"""
+    return [name for name in BACKEND_PREFERENCE if BACKENDS[name].is_available()]
+
+
+def resolve_backend_name(name: Optional[str] = None) -> str:
+    """
+    确定要使用的后端：参数 > 环境变量 XHS_OCR_BACKEND > 第一个已安装的后端
+
+    Raises:
+        ValueError: 未知的后端名称
+    """
+    name = name or os.environ.get(BACKEND_ENV_VAR)
+    if not name:
+        installed = available_backends()
+        return installed[0] if installed else BACKEND_PREFERENCE[0]
+    name = name.strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的 OCR 后端: {name}（可选: {', '.join(BACKENDS)}）")
+    return name
+
+
+def create_backend(name: str, lang: str, cpu_threads: Optional[int] = None) -> OCRBackend:
+    """
+    创建后端实例（加载模型）
+
+    Raises:
+        ValueError: 未知的后端名称或不支持的语言
+        ImportError: 未安装依赖
+    """
+    return BACKENDS[resolve_backend_name(name)](lang, cpu_threads=cpu_threads)
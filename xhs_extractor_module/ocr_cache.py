@@ -0,0 +1,242 @@
+# ocr_cache.py
+"""
+OCR 结果缓存模块
+同一张图片（例如被反复转载的面试题截图）只识别一次，结果持久化保存在本地 SQLite 中。
+
+两级查找：
+1. 图片ID（从 CDN 链接中提取的稳定文件ID）命中时，连下载都可以跳过
+2. 图片内容哈希（sha256）命中时，跳过识别
+
+缓存记录包含识别文本、每行置信度和使用的引擎/版本（后端:语言:版本），不同后端的结果互不影响；
+同一后端和语言的模型版本变化时旧版本的结果自动失效。
+缓存总大小超过上限时按最久未访问淘汰。
+
+多个进程（如 OCRPool 的工作进程）共用同一个缓存文件：总大小记录在 meta 表中，
+写入、淘汰和清除旧版本都在同一个写事务里更新它，各进程看到的总是同一个值。
+"""
+from __future__ import annotations
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+
+# 默认缓存文件路径（保存在模块目录下）
+DEFAULT_CACHE_PATH = Path(__file__).parent / "ocr_cache.sqlite3"
+# 默认缓存大小上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# meta 表中记录缓存总大小的键
+_TOTAL_KEY = "total_bytes"
+
+
+class CachedOCR(NamedTuple):
+    """一条缓存的识别结果"""
+    text: str
+    confidences: List[Optional[float]]
+    engine: str
+
+
+def content_hash(data: bytes) -> str:
+    """图片内容哈希"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class OCRCache:
+    """基于 SQLite 的 OCR 结果缓存（线程安全）"""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path: 缓存数据库路径
+            max_bytes: 缓存内容总大小上限（按识别文本和置信度的字节数计算）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                content_hash TEXT NOT NULL,
+                engine       TEXT NOT NULL,
+                text         TEXT NOT NULL,
+                confidences  TEXT NOT NULL,
+                size         INTEGER NOT NULL,
+                created_at   REAL NOT NULL,
+                accessed_at  REAL NOT NULL,
+                PRIMARY KEY (content_hash, engine)
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at);
+            CREATE TABLE IF NOT EXISTS image_ids (
+                image_id     TEXT NOT NULL,
+                engine       TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (image_id, engine)
+            );
+            CREATE INDEX IF NOT EXISTS idx_image_ids_content ON image_ids (content_hash, engine);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        # 旧版本的缓存没有记录总大小，统计一次
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) SELECT ?, COALESCE(SUM(size), 0) FROM results", (_TOTAL_KEY,)
+        )
+        self._conn.execute("COMMIT")
+        self.hits = 0
+        self.misses = 0
+
+    def ensure_engine(self, engine: str) -> int:
+        """
+        声明当前使用的引擎/版本（"后端:语言:版本"）；同一后端和语言的版本与上次记录不同时，清除旧版本的结果。
+        其他后端或语言的结果按引擎分开保存，不受影响（切换后端再切回来仍然命中）
+
+        Returns:
+            清除的记录数
+        """
+        prefix = engine.rsplit(":", 1)[0] + ":" if ":" in engine else engine
+        key = f"engine:{prefix}"
+        stale = "engine != ? AND substr(engine, 1, ?) = ?"
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if row and row[0] == engine:
+                return 0
+            args = (engine, len(prefix), prefix)
+            self._conn.execute("BEGIN IMMEDIATE")
+            freed = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM results WHERE {stale}", args).fetchone()[0]
+            removed = self._conn.execute(f"DELETE FROM results WHERE {stale}", args).rowcount
+            self._conn.execute(f"DELETE FROM image_ids WHERE {stale}", args)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, engine))
+            self._add_total(-freed)
+            self._conn.execute("COMMIT")
+        if removed:
+            print(f"OCR 缓存：{prefix.rstrip(':')} 的版本已变更为 {engine}，清除 {removed} 条旧结果")
+        return removed
+
+    def _get(self, where: str, args: tuple) -> Optional[CachedOCR]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT r.content_hash, r.text, r.confidences, r.engine FROM results r {where}", args
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE results SET accessed_at = ? WHERE content_hash = ? AND engine = ?",
+                (time.time(), row[0], row[3]),
+            )
+        return CachedOCR(text=row[1], confidences=json.loads(row[2]), engine=row[3])
+
+    def get_by_image_id(self, image_id: str, engine: str) -> Optional[CachedOCR]:
+        """按图片ID查找（命中时不需要下载图片）"""
+        if not image_id:
+            return None
+        return self._get(
+            "JOIN image_ids i ON i.content_hash = r.content_hash AND i.engine = r.engine "
+            "WHERE i.image_id = ? AND i.engine = ?",
+            (image_id, engine),
+        )
+
+    def get_by_content(self, digest: str, engine: str, image_id: Optional[str] = None) -> Optional[CachedOCR]:
+        """按内容哈希查找；命中且提供了 image_id 时记录 图片ID -> 内容 的映射"""
+        hit = self._get("WHERE r.content_hash = ? AND r.engine = ?", (digest, engine))
+        if hit is not None and image_id:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO image_ids (image_id, engine, content_hash) VALUES (?, ?, ?)",
+                    (image_id, engine, digest),
+                )
+        return hit
+
+    def put(
+        self,
+        digest: str,
+        engine: str,
+        text: str,
+        confidences: List[Optional[float]],
+        image_id: Optional[str] = None,
+    ):
+        """保存一条识别结果"""
+        conf_json = json.dumps(confidences)
+        size = len(text.encode("utf-8")) + len(conf_json)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            old = self._conn.execute(
+                "SELECT size FROM results WHERE content_hash = ? AND engine = ?", (digest, engine)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(content_hash, engine, text, confidences, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, engine, text, conf_json, size, now, now),
+            )
+            if image_id:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO image_ids (image_id, engine, content_hash) VALUES (?, ?, ?)",
+                    (image_id, engine, digest),
+                )
+            total = self._add_total(size - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(total)
+            self._conn.execute("COMMIT")
+
+    def _read_total(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (_TOTAL_KEY,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _add_total(self, delta: int) -> int:
+        """调整记录的总大小，返回调整后的值（调用方持有锁并且在写事务中）"""
+        total = self._read_total() + delta
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (_TOTAL_KEY, total))
+        return total
+
+    def _evict(self, total: int):
+        """按最久未访问淘汰，直到总大小降到上限的 90%（调用方持有锁并且在写事务中）"""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT content_hash, engine, size FROM results ORDER BY accessed_at"
+        )
+        victims = []
+        freed = 0
+        for digest, engine, size in rows:
+            if total - freed <= target:
+                break
+            victims.append((digest, engine))
+            freed += size
+        self._conn.executemany("DELETE FROM results WHERE content_hash = ? AND engine = ?", victims)
+        self._conn.executemany("DELETE FROM image_ids WHERE content_hash = ? AND engine = ?", victims)
+        self._add_total(-freed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        """缓存内容总大小（包括其他进程写入的结果）"""
+        with self._lock:
+            return self._read_total()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_DEFAULT_CACHE: Optional[OCRCache] = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_default_ocr_cache() -> OCRCache:
+    """进程内共享的默认缓存（模块目录下的 ocr_cache.sqlite3）"""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = OCRCache()
+        return _DEFAULT_CACHE
@@ -0,0 +1,210 @@
+# ocr_pool.py
+"""
+多进程 OCR 工作池
+OCR 是 CPU 密集型任务，单个进程只能用到多核机器的一部分算力。
+OCRPool 启动 N 个工作进程，每个进程常驻一份已加载的模型，并限定各自的推理线程数，
+保证 进程数 × 每进程线程数 不超过 CPU 核心数，避免线程过量争抢。
+
+使用方法：
+    with OCRPool(processes=8, threads_per_worker=4) as pool:
+        text = extract_ocr_from_note(note, pool=pool)           # 一篇笔记的图片分给多个进程
+        for note, text in pool.ocr_notes(notes):               # 多篇笔记并行，结果按输入顺序流式返回
+            note.ocr_text = text
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import multiprocessing
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import ocr
+from .ocr import OCRProcessor, _merge_ocr_texts
+
+
+# 每个工作进程默认的推理线程数
+DEFAULT_THREADS_PER_WORKER = 2
+
+# 在工作进程启动前设置的线程数环境变量（数学库在导入时读取，必须在进程启动时就生效；
+# OMP_THREAD_LIMIT 由工作进程启动的 tesseract 子进程继承）
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OMP_THREAD_LIMIT",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "FLAGS_cpu_math_library_num_threads",
+)
+
+# 工作进程内的 OCR 处理器（每个进程创建一次）
+_WORKER_PROCESSOR: Optional[OCRProcessor] = None
+
+
+def _init_ocr_worker(use_lang: str, threads: int, cache_path: Optional[str], backend: Optional[str] = None):
+    """工作进程初始化：限定线程数，加载模型；调试输出写到 stderr，避免混入结果输出"""
+    global _WORKER_PROCESSOR
+    sys.stdout = sys.stderr
+    ocr._ENGINE_CPU_THREADS = threads
+    if ocr.CV2_AVAILABLE:
+        ocr.cv2.setNumThreads(threads)
+    cache = None
+    if cache_path:
+        from .ocr_cache import OCRCache
+        cache = OCRCache(cache_path)
+    _WORKER_PROCESSOR = OCRProcessor(use_lang=use_lang, cache=cache, backend=backend)
+
+
+def _ocr_url_job(image_url: str) -> Optional[str]:
+    """工作进程：识别一张图片，异常返回 None，避免中断整个批次"""
+    try:
+        return _WORKER_PROCESSOR.ocr_image_from_url(image_url)
+    except Exception as e:
+        print(f"警告：OCR 图片 {image_url} 失败: {e}")
+        return None
+
+
+def _ocr_note_job(image_urls: List[str]) -> str:
+    """工作进程：识别一篇笔记的全部图片，返回合并的文本"""
+    try:
+        return _WORKER_PROCESSOR.ocr_images(image_urls)
+    except Exception as e:
+        print(f"警告：OCR 笔记图片失败: {e}")
+        return ""
+
+
+class OCRPool:
+    """多进程 OCR 工作池"""
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        use_lang: str = "ch",
+        cache_path: Optional[Union[str, Path]] = None,
+        mp_context: Optional[str] = "spawn",
+        backend: Optional[str] = None,
+    ):
+        """
+        Args:
+            processes: 工作进程数，默认 CPU 核心数 / 每进程线程数
+            threads_per_worker: 每个进程的推理线程数，默认 DEFAULT_THREADS_PER_WORKER
+                               （只指定 processes 时为 CPU 核心数 / 进程数）
+            use_lang: 识别语言
+            cache_path: OCR 结果缓存文件路径（各进程共用），为 None 时不使用缓存
+            mp_context: 多进程启动方式，默认 spawn（避免 fork 继承推理库的线程状态）
+            backend: OCR 后端（见 ocr_backends），None 时由工作进程按环境变量/已安装的后端选择
+        """
+        cpu_count = os.cpu_count() or 1
+        if threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count // processes) if processes else DEFAULT_THREADS_PER_WORKER
+        if processes is None:
+            processes = max(1, cpu_count // threads_per_worker)
+        self.processes = max(1, processes)
+        self.threads_per_worker = max(1, threads_per_worker)
+        if self.processes * self.threads_per_worker > cpu_count:
+            print(
+                f"⚠ 警告：{self.processes} 个进程 × {self.threads_per_worker} 线程超过 CPU 核心数 {cpu_count}，"
+                "可能因线程争抢而变慢",
+                file=sys.stderr,
+            )
+
+        # 子进程在启动时继承环境变量，创建进程池期间临时设置，创建后恢复
+        saved = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+        try:
+            for name in _THREAD_ENV_VARS:
+                os.environ[name] = str(self.threads_per_worker)
+            self._pool = multiprocessing.get_context(mp_context).Pool(
+                processes=self.processes,
+                initializer=_init_ocr_worker,
+                initargs=(use_lang, self.threads_per_worker, str(cache_path) if cache_path else None, backend),
+            )
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def imap_texts(self, image_urls: Iterable[str], chunksize: int = 1):
+        """
+        并行识别图片，返回按输入顺序的识别文本迭代器（识别出错时为 None）；
+        可以用 next(timeout=秒) 限时等待下一个结果
+        """
+        return self._pool.imap(_ocr_url_job, image_urls, chunksize=max(1, chunksize))
+
+    def imap_images(self, image_urls: Iterable[str], chunksize: int = 1) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        并行识别图片，按输入顺序流式返回 (图片URL, 识别文本)；识别出错时文本为 None
+        """
+        image_urls = list(image_urls)
+        return zip(image_urls, self.imap_texts(image_urls, chunksize=chunksize))
+
+    def ocr_images(self, image_urls: List[str]) -> str:
+        """
+        把一篇笔记的图片分给多个进程识别，返回合并的文本（格式与 OCRProcessor.ocr_images 相同）
+        """
+        if not image_urls:
+            return ""
+        texts = []
+        for i, (url, text) in enumerate(self.imap_images(image_urls), 1):
+            texts.append(text)
+            if text is None:
+                print(f"✗ 图片 {i} OCR 失败")
+            elif text.strip():
+                print(f"✓ 图片 {i} OCR 成功，识别到 {len(text)} 字符")
+            else:
+                print(f"⚠ 图片 {i} OCR 未识别到文字")
+        return _merge_ocr_texts(texts)
+
+    def ocr_notes(self, notes: Iterable, max_inflight: Optional[int] = None) -> Iterator[Tuple[object, str]]:
+        """
+        多篇笔记并行识别（每篇笔记在一个进程中处理），按输入顺序流式返回 (笔记, OCR 文本)
+
+        Args:
+            max_inflight: 已提交、结果尚未取走的笔记数上限，默认进程数的 2 倍。
+                          Pool.imap 在后台线程中尽快读完输入，不加限制时很长的笔记流会全部积压在内存中
+        """
+        slots = threading.Semaphore(max(1, max_inflight or self.processes * 2))
+        stopped = threading.Event()
+        notes_iter = iter(notes)
+        pending = deque()
+
+        def note_images():
+            # 在进程池的任务分发线程中执行：每提交一篇笔记占用一个名额，结果被取走时归还
+            for note in notes_iter:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                pending.append(note)
+                yield note.ocr_image_urls() if hasattr(note, "ocr_image_urls") else list(note.images or [])
+
+        try:
+            for text in self._pool.imap(_ocr_note_job, note_images()):
+                slots.release()
+                yield pending.popleft(), text
+        finally:
+            # 调用方提前停止时，唤醒等待名额的分发线程，让它结束（否则关闭进程池时会一直等待）
+            stopped.set()
+            slots.release()
+
+    def close(self):
+        """等待已提交的任务完成后关闭进程池"""
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """立即终止所有工作进程"""
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> "OCRPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
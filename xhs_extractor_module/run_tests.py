@@ -73,11 +73,48 @@ def run_unit_tests_only():
     from test_xhs_share import TestXhsShare
     from test_xhs_fetch import TestParseNoteFromState, TestFetchNoteMocked
     from test_xhs_login import TestXhsLogin
+    from test_xhs_batch import TestXhsBatch
+    from test_models import TestNote, TestImageVariants
+    from test_state_archive import TestStateArchive
+    from test_xhs_url import TestXhsUrl
+    from test_xhs_harvest import TestXhsHarvest
+    from test_image_download import TestImageDownload
+    from test_blob_store import TestBlobStore
+    from test_save_manifest import TestSaveManifest
+    from test_note_bundle import TestNoteBundle
+    from test_note_search import TestNoteSearch
+    from test_note_parquet import TestNoteParquet
+    from test_ocr import TestSharedEngine, TestOcrImages, TestOcrFromBytes, TestOCRCache, TestBatchedOcr, TestOCRPool, TestPrefilter, TestParseOcrOutput, TestImageDedup, TestOCRBackends, TestStreamingOcr, TestPreprocess, TestImageStore
     
     suite.addTests(loader.loadTestsFromTestCase(TestXhsShare))
     suite.addTests(loader.loadTestsFromTestCase(TestParseNoteFromState))
     suite.addTests(loader.loadTestsFromTestCase(TestFetchNoteMocked))
     suite.addTests(loader.loadTestsFromTestCase(TestXhsLogin))
+    suite.addTests(loader.loadTestsFromTestCase(TestXhsBatch))
+    suite.addTests(loader.loadTestsFromTestCase(TestNote))
+    suite.addTests(loader.loadTestsFromTestCase(TestImageVariants))
+    suite.addTests(loader.loadTestsFromTestCase(TestStateArchive))
+    suite.addTests(loader.loadTestsFromTestCase(TestXhsUrl))
+    suite.addTests(loader.loadTestsFromTestCase(TestXhsHarvest))
+    suite.addTests(loader.loadTestsFromTestCase(TestSharedEngine))
+    suite.addTests(loader.loadTestsFromTestCase(TestOcrImages))
+    suite.addTests(loader.loadTestsFromTestCase(TestOcrFromBytes))
+    suite.addTests(loader.loadTestsFromTestCase(TestOCRCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestBatchedOcr))
+    suite.addTests(loader.loadTestsFromTestCase(TestOCRPool))
+    suite.addTests(loader.loadTestsFromTestCase(TestPrefilter))
+    suite.addTests(loader.loadTestsFromTestCase(TestParseOcrOutput))
+    suite.addTests(loader.loadTestsFromTestCase(TestImageDedup))
+    suite.addTests(loader.loadTestsFromTestCase(TestOCRBackends))
+    suite.addTests(loader.loadTestsFromTestCase(TestStreamingOcr))
+    suite.addTests(loader.loadTestsFromTestCase(TestPreprocess))
+    suite.addTests(loader.loadTestsFromTestCase(TestImageStore))
+    suite.addTests(loader.loadTestsFromTestCase(TestImageDownload))
+    suite.addTests(loader.loadTestsFromTestCase(TestBlobStore))
+    suite.addTests(loader.loadTestsFromTestCase(TestSaveManifest))
+    suite.addTests(loader.loadTestsFromTestCase(TestNoteBundle))
+    suite.addTests(loader.loadTestsFromTestCase(TestNoteSearch))
+    suite.addTests(loader.loadTestsFromTestCase(TestNoteParquet))
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
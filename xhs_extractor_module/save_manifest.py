@@ -0,0 +1,149 @@
+# save_manifest.py
+"""
+笔记文件夹的保存清单
+重复保存同一篇笔记时，内容没有变化的文件不再写入、图片不再下载。每个笔记文件夹中有一个
+.xhs_manifest.json，记录上次保存的 Markdown 内容哈希，以及每张图片的来源、文件、大小、内容哈希和 ETag：
+
+    {
+      "version": 1,
+      "note_id": "...",
+      "markdown": {"file": "标题.md", "sha256": "...", "size": 1234},
+      "images": [
+        {"url": "...", "source": "xhs:...!nd_dft_...", "file": "image_001.webp",
+         "size": 123456, "sha256": "...", "etag": "\\"...\\""},
+        ...
+      ]
+    }
+
+- Markdown：渲染结果的哈希与清单一致且文件仍在时不写入
+- 图片：来源标识（CDN 图片ID + 规格）相同且文件仍在、大小一致时不发请求；
+  来源变化但有 ETag 时发送 If-None-Match，304 时沿用原文件
+"""
+from __future__ import annotations
+
+import json
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .image_download import SavedImage, Validator, atomic_write_bytes, source_key
+
+
+MANIFEST_NAME = ".xhs_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class NoteManifest:
+    """一个笔记文件夹的保存清单"""
+
+    def __init__(self, folder: Union[str, Path], data: Optional[Dict[str, Any]] = None):
+        self.folder = Path(folder)
+        self.path = self.folder / MANIFEST_NAME
+        data = data or {}
+        self.note_id: Optional[str] = data.get("note_id")
+        self.markdown: Optional[Dict[str, Any]] = data.get("markdown")
+        self.images: List[Optional[Dict[str, Any]]] = list(data.get("images") or [])
+        self._saved = self._serialize() if data else None
+
+    @classmethod
+    def load(cls, folder: Union[str, Path]) -> "NoteManifest":
+        """读取清单；不存在、损坏或版本不同时返回空清单（所有文件重新保存）"""
+        path = Path(folder) / MANIFEST_NAME
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(folder)
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return cls(folder)
+        return cls(folder, data)
+
+    def _serialize(self) -> str:
+        return json.dumps(
+            {"version": MANIFEST_VERSION, "note_id": self.note_id, "markdown": self.markdown, "images": self.images},
+            ensure_ascii=False, indent=2,
+        )
+
+    def _file_matches(self, name: Optional[str], size: Optional[int]) -> bool:
+        """文件仍然存在且大小与记录一致"""
+        if not name:
+            return False
+        try:
+            return (self.folder / name).stat().st_size == size
+        except OSError:
+            return False
+
+    # ---- Markdown ----
+
+    def markdown_unchanged(self, filename: str, content: str) -> bool:
+        """Markdown 内容与上次保存的一致，且文件仍在"""
+        md = self.markdown
+        return (
+            md is not None
+            and md.get("file") == filename
+            and md.get("sha256") == text_hash(content)
+            and self._file_matches(filename, md.get("size"))
+        )
+
+    def set_markdown(self, filename: str, content: str):
+        """记录已写入的 Markdown（大小取实际文件，换行符转换后也能匹配）"""
+        size = (self.folder / filename).stat().st_size
+        self.markdown = {"file": filename, "sha256": text_hash(content), "size": size}
+
+    # ---- 图片 ----
+
+    def image(self, index: int) -> Optional[Dict[str, Any]]:
+        return self.images[index] if index < len(self.images) else None
+
+    def current_image(self, index: int, url: str) -> Optional[SavedImage]:
+        """
+        来源相同且文件仍在时返回表示“未变化”的 SavedImage（不需要任何请求），否则返回 None
+        """
+        entry = self.image(index)
+        if entry is None or entry.get("source") != source_key(url):
+            return None
+        if not self._file_matches(entry.get("file"), entry.get("size")):
+            return None
+        return SavedImage(
+            index, url, path=self.folder / entry["file"], nbytes=entry["size"],
+            digest=entry.get("sha256"), etag=entry.get("etag"), unchanged=True,
+        )
+
+    def validator(self, index: int) -> Optional[Validator]:
+        """来源变化但之前的文件仍在、有 ETag 时，用于条件请求"""
+        entry = self.image(index)
+        if entry is None or not entry.get("etag") or not self._file_matches(entry.get("file"), entry.get("size")):
+            return None
+        return Validator(self.folder / entry["file"], entry["etag"])
+
+    def update_images(self, saved: List[SavedImage]):
+        """按本次保存结果更新图片记录（失败的图片清除记录，下次重新下载）"""
+        images: List[Optional[Dict[str, Any]]] = []
+        for item in saved:
+            if not item.ok:
+                images.append(None)
+                continue
+            previous = self.image(item.index) or {}
+            # 304 时响应没有新内容，内容哈希沿用之前的记录
+            digest = item.digest or (previous.get("sha256") if item.unchanged else None)
+            images.append({
+                "url": item.url,
+                "source": source_key(item.url),
+                "file": item.path.name,
+                "size": item.nbytes,
+                "sha256": digest,
+                "etag": item.etag,
+            })
+        self.images = images
+
+    def save(self) -> bool:
+        """内容有变化时原子写入清单，返回是否写入"""
+        serialized = self._serialize()
+        if serialized == self._saved and self.path.exists():
+            return False
+        atomic_write_bytes(self.path, serialized.encode("utf-8"))
+        self._saved = serialized
+        return True
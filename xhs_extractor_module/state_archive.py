@@ -0,0 +1,217 @@
+# state_archive.py
+"""
+原始数据归档模块
+把抓取到的 window.__INITIAL_STATE__（或其中的笔记子树）连同最终URL
+按内容寻址保存为 zstd 压缩文件，解析逻辑更新后可以离线重新解析，不需要再访问网页。
+
+目录结构：
+    archive_root/
+    ├── objects/ab/abcdef....json.zst   # 每份原始数据一个文件，文件名为内容的 sha256
+    └── index.jsonl                     # 抓取记录（笔记ID、URL、对象摘要、抓取时间（UTC））
+
+对象文件与 xhs_batch 的 state dump 格式一致，可以直接交给 parse_states_parallel。
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .models import Note
+from .xhs_fetch import _locate_note_data
+from .xhs_url import canonicalize_url
+from .xhs_batch import (
+    ZSTD_AVAILABLE,
+    _compress,
+    load_state_dump,
+    parse_states_parallel,
+)
+
+
+# 归档范围："note" 只保存笔记子树（体积小），"full" 保存完整 state
+ARCHIVE_SCOPES = ("note", "full")
+
+
+class StateArchive:
+    """内容寻址的原始数据归档"""
+
+    def __init__(self, root: Union[str, Path], scope: str = "note", level: int = 10):
+        """
+        Args:
+            root: 归档根目录
+            scope: 归档范围，"note" 只保存笔记子树，"full" 保存完整 state
+            level: zstd 压缩级别
+        """
+        if scope not in ARCHIVE_SCOPES:
+            raise ValueError(f"不支持的归档范围: {scope}，可选: {ARCHIVE_SCOPES}")
+        self.root = Path(root)
+        self.scope = scope
+        self.level = level
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.jsonl"
+        # 未安装 zstandard 时退回 gzip，读取时按后缀自动识别
+        self.suffix = ".json.zst" if ZSTD_AVAILABLE else ".json.gz"
+        if not ZSTD_AVAILABLE:
+            print("⚠ 警告：未安装 zstandard，原始数据归档改用 gzip 压缩（pip install zstandard）")
+
+    def _object_path(self, digest: str, suffix: Optional[str] = None) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{suffix or self.suffix}"
+
+    def _find_object(self, digest: str) -> Optional[Path]:
+        for suffix in (".json.zst", ".json.gz"):
+            path = self._object_path(digest, suffix)
+            if path.exists():
+                return path
+        return None
+
+    @staticmethod
+    def _note_subtree_state(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """只保留笔记子树，并包装成 _parse_note_from_state 能识别的结构"""
+        note_data, note_id = _locate_note_data(state)
+        if not isinstance(note_data, dict) or not note_id:
+            return None
+        return {"note": {"firstNoteId": note_id, "noteDetailMap": {note_id: {"note": note_data}}}}
+
+    def put(self, state: Dict[str, Any], url: str, note_id: Optional[str] = None) -> str:
+        """
+        归档一份原始数据
+
+        Args:
+            state: window.__INITIAL_STATE__ 的字典对象
+            url: 笔记的最终URL
+            note_id: 笔记ID（写入索引，便于按笔记查找）
+
+        Returns:
+            对象的 sha256 摘要（内容相同的数据只会保存一份）
+        """
+        scope = self.scope
+        payload = state
+        if scope == "note":
+            payload = self._note_subtree_state(state)
+            if payload is None:
+                # 找不到笔记子树时保存完整 state，保证之后能用新的解析逻辑重试
+                payload, scope = state, "full"
+
+        record = {"url": url, "scope": scope, "state": payload}
+        data = json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = self._find_object(digest)
+        if path is None:
+            path = self._object_path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(_compress(data, path.name, self.level))
+            os.replace(tmp_path, path)
+
+        entry = {
+            "digest": digest,
+            "path": str(path.relative_to(self.root)),
+            "note_id": note_id,
+            "key": canonicalize_url(url),
+            "url": url,
+            "scope": scope,
+            "size": path.stat().st_size,
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return digest
+
+    def get(self, digest: str) -> Tuple[Dict[str, Any], str]:
+        """
+        读取一份归档的原始数据
+
+        Returns:
+            (state, url) 元组
+
+        Raises:
+            KeyError: 归档中没有该对象
+        """
+        path = self._find_object(digest)
+        if path is None:
+            raise KeyError(digest)
+        return load_state_dump(path)
+
+    def iter_index(self) -> Iterator[Dict[str, Any]]:
+        """按写入顺序遍历抓取记录"""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def paths(self, latest_only: bool = True) -> List[Path]:
+        """
+        归档对象文件列表
+
+        Args:
+            latest_only: 同一篇笔记只返回最近一次抓取的数据
+        """
+        selected: Dict[str, Path] = {}
+        for entry in self.iter_index():
+            key = entry.get("note_id") or entry.get("key") or entry.get("url") or entry["digest"]
+            if not latest_only:
+                key = entry["digest"]
+            # 重新赋值前先删除，保证顺序为最近一次出现的位置
+            selected.pop(key, None)
+            selected[key] = self.root / entry["path"]
+        return list(selected.values())
+
+    def reparse(self, workers: Optional[int] = None, latest_only: bool = True, **kwargs) -> Iterator[Note]:
+        """
+        离线重新解析归档中的原始数据（不访问网络）
+
+        其余参数透传给 parse_states_parallel
+        """
+        return parse_states_parallel(self.paths(latest_only=latest_only), workers=workers, **kwargs)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+    import contextlib
+
+    parser = argparse.ArgumentParser(description="小红书原始数据归档工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_reparse = sub.add_parser("reparse", help="离线重新解析归档中的笔记，输出 JSON Lines")
+    p_reparse.add_argument("archive", help="归档根目录")
+    p_reparse.add_argument("--workers", "-w", type=int, default=None, help="进程数（默认使用全部 CPU 核心）")
+    p_reparse.add_argument("--all", action="store_true", help="解析所有抓取记录（默认同一笔记只取最近一次）")
+    p_reparse.add_argument("--output", "-O", type=str, help="输出文件（默认输出到标准输出）")
+
+    p_ls = sub.add_parser("ls", help="列出归档中的抓取记录")
+    p_ls.add_argument("archive", help="归档根目录")
+
+    args = parser.parse_args(argv)
+    archive = StateArchive(args.archive)
+
+    if args.command == "ls":
+        count = 0
+        for entry in archive.iter_index():
+            count += 1
+            print(f"{entry['fetched_at']}  {entry.get('note_id') or '-':<26} {entry['scope']:<4}  {entry['size']:>8}B  {entry['url']}")
+        print(f"共 {count} 条抓取记录", file=sys.stderr)
+        return
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            for note in archive.reparse(workers=args.workers, latest_only=not args.all, keep_raw=False):
+                out.write(json.dumps(note.to_dict(include_raw=False), ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# test_blob_store.py
+"""
+测试 blob_store 模块
+"""
+import os
+import unittest
+import tempfile
+from pathlib import Path
+
+from xhs_extractor_module.blob_store import BlobStore, LINK_HARDLINK
+
+
+class TestBlobStore(unittest.TestCase):
+    """测试按内容寻址的图片存储"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name)
+        self.store = BlobStore.for_save_dir(self.base)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_same_content_stored_once(self):
+        """测试相同内容只写入一次"""
+        first = self.store.put_bytes(b"image-bytes", ".png")
+        second = self.store.put_bytes(b"image-bytes", ".jpg")
+        self.assertEqual(first, second)
+        self.assertEqual(first.path.suffix, ".png")
+        self.assertEqual((self.store.objects_written, self.store.bytes_written), (1, 11))
+        chunked = self.store.put_chunks([b"image-", b"bytes"], ".png")
+        self.assertEqual(chunked.digest, first.digest)
+        self.assertEqual(self.store.bytes_written, 11)
+        self.assertEqual(list((self.store.root / "tmp").iterdir()), [])
+
+    def test_hardlinks_into_note_folders(self):
+        """测试多篇笔记中的同一图片是同一个文件（硬链接）"""
+        blob = self.store.put_bytes(b"shared", ".webp")
+        paths = []
+        for note in ("a", "b"):
+            (self.base / note).mkdir()
+            path = self.base / note / "image_001.webp"
+            self.assertEqual(self.store.link(blob, path), LINK_HARDLINK)
+            paths.append(path)
+        self.assertTrue(os.path.samefile(paths[0], paths[1]))
+        self.assertEqual(os.stat(blob.path).st_nlink, 3)
+        # 重复链接同一路径不报错，替换已有的普通文件
+        self.store.link(blob, paths[0])
+        other = self.base / "a" / "image_002.webp"
+        other.write_bytes(b"old")
+        self.store.link(blob, other)
+        self.assertEqual(other.read_bytes(), b"shared")
+
+    def test_manifest_maps_notes_to_blobs(self):
+        """测试清单记录笔记与对象的对应关系，来源标识可以查回对象"""
+        blob = self.store.put_bytes(b"shared", ".jpg")
+        self.store.remember_source("xhs:abc!nd_dft", blob.digest, "https://x/abc")
+        self.assertEqual(self.store.lookup_source("xhs:abc!nd_dft"), blob)
+        self.assertIsNone(self.store.lookup_source("xhs:other"))
+        self.store.record_note_files("n1", [("/a/image_001.jpg", blob.digest, "https://x/abc")])
+        self.store.record_note_files("n2", [("/b/image_003.jpg", blob.digest, None)])
+        self.store.record_note_files("n1", [("/a/image_002.jpg", blob.digest, None)])
+        self.assertEqual([f.path for f in self.store.note_files("n1")], ["/a/image_002.jpg"])
+        self.assertEqual(self.store.notes_using(blob.digest), ["n1", "n2"])
+        self.assertEqual(self.store.stats()["notes"], 2)
+
+    def test_missing_object_is_not_reused(self):
+        """测试对象文件被删除后不再视为已保存"""
+        blob = self.store.put_bytes(b"gone", ".jpg")
+        blob.path.unlink()
+        self.assertIsNone(self.store.get(blob.digest))
+        self.assertTrue(self.store.put_bytes(b"gone", ".jpg").path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
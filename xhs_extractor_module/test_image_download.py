@@ -0,0 +1,311 @@
+# test_image_download.py
+"""
+测试 image_download 模块
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import requests
+
+from xhs_extractor_module.image_download import (
+    ImageDownloader, SavedImage, Validator, atomic_write_bytes, image_extension, sniff_extension,
+)
+from xhs_extractor_module.image_store import ImageStore
+from xhs_extractor_module.blob_store import BlobStore
+
+
+PNG_HEAD = b"\x89PNG\r\n\x1a\n" + b"\0" * 8
+WEBP_HEAD = b"RIFF\0\0\0\0WEBPVP8 "
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, content_type: str, status: int = 200):
+        self.body = body
+        self.headers = {"Content-Type": content_type}
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """按链接返回预设响应，记录并发数"""
+
+    def __init__(self, responses, delay=0.0):
+        self.responses = responses
+        self.delay = delay
+        self.calls = []
+        self.headers = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.calls.append(url)
+            self.headers.append(kwargs.get("headers"))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return FakeResponse(*self.responses[url])
+
+    def close(self):
+        pass
+
+
+class RangeSession:
+    """
+    支持 Range / If-Range 的服务器；前 cuts 次响应只发送 cut 字节后断开（drop）或直接结束（截断）；
+    指定 shift 时范围请求返回的 206 从断点前 shift 字节开始
+    """
+
+    def __init__(self, body: bytes, etag='"v1"', cut=10, cuts=1, drop=True, shift=0):
+        self.body = body
+        self.etag = etag
+        self.cut = cut
+        self.cuts = cuts
+        self.drop = drop
+        self.shift = shift
+        self.headers = []
+        self.sent = 0
+
+    def get(self, url, **kwargs):
+        headers = kwargs.get("headers") or {}
+        self.headers.append(headers)
+        start = 0
+        if "Range" in headers and headers.get("If-Range", self.etag) == self.etag:
+            start = int(headers["Range"][len("bytes="):-1]) - self.shift
+        body = self.body[start:]
+        response = FakeResponse(body, "image/png", 206 if start else 200)
+        response.headers.update({"ETag": self.etag, "Content-Length": str(len(body))})
+        if start:
+            response.headers["Content-Range"] = f"bytes {start}-{len(self.body) - 1}/{len(self.body)}"
+        cut = self.cut if len(self.headers) <= self.cuts else None
+        session = self
+
+        def iter_content(chunk_size=1):
+            data = body if cut is None else body[:cut]
+            for i in range(0, len(data), chunk_size):
+                session.sent += len(data[i:i + chunk_size])
+                yield data[i:i + chunk_size]
+            if cut is not None and session.drop:
+                raise requests.ConnectionError("connection reset")
+
+        response.iter_content = iter_content
+        return response
+
+    def close(self):
+        pass
+
+
+class TestImageDownload(unittest.TestCase):
+    """测试并发保存图片"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_extension_from_content_type_then_magic(self):
+        """测试扩展名优先取 Content-Type，无法识别时检查文件头"""
+        self.assertEqual(image_extension("image/webp"), ".webp")
+        self.assertEqual(image_extension("image/PNG; charset=binary"), ".png")
+        self.assertEqual(image_extension("application/octet-stream", WEBP_HEAD), ".webp")
+        self.assertEqual(image_extension("", b"\xff\xd8\xff\xe0"), ".jpg")
+        self.assertEqual(image_extension("", b"unknown"), ".jpg")
+        self.assertEqual(sniff_extension(b"\0\0\0\x1cftypavif"), ".avif")
+
+    def test_parallel_download_with_real_extensions(self):
+        """测试并发下载、按格式命名，总耗时接近最慢的一张"""
+        responses = {f"https://x/{i}": (PNG_HEAD + bytes(100 * i), "image/png") for i in range(8)}
+        responses["https://x/3"] = (WEBP_HEAD, "image/webp")
+        session = FakeSession(responses, delay=0.1)
+        progress = []
+        start = time.perf_counter()
+        results = ImageDownloader(max_workers=8, session=session).download_all(
+            list(responses), self.dir, on_progress=lambda *args: progress.append(args)
+        )
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.5)
+        self.assertGreater(session.max_active, 1)
+        self.assertEqual([r.index for r in results], list(range(8)))
+        self.assertEqual(results[0].path.name, "image_001.png")
+        self.assertEqual(results[3].path.name, "image_004.webp")
+        self.assertEqual(results[5].path.read_bytes(), responses["https://x/5"][0])
+        self.assertEqual([p[0] for p in progress], list(range(1, 9)))
+        self.assertEqual(progress[-1][2], sum(len(body) for body, _ in responses.values()))
+
+    def test_failures_are_reported_not_raised(self):
+        """测试单张失败不影响其他图片"""
+        session = FakeSession({"https://x/ok": (PNG_HEAD, "image/png"), "https://x/bad": (b"", "", 404)})
+        results = ImageDownloader(session=session).download_all(["https://x/ok", "https://x/bad"], self.dir)
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+        self.assertIn("404", results[1].error)
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ["image_001.png"])
+
+    def test_uses_image_store_and_prepare(self):
+        """测试共享下载层中已有的图片不再下载，prepare 可以跳过下载"""
+        store = ImageStore(fetcher=lambda url: None)
+        store.put("https://x/0", WEBP_HEAD, "image/webp")
+        session = FakeSession({"https://x/1": (PNG_HEAD, "image/png")})
+
+        def prepare(index, url, dest_dir, stem):
+            if index == 2:
+                path = dest_dir / f"{stem}.gif"
+                path.write_bytes(b"GIF89a")
+                return SavedImage(index, url, path=path, nbytes=6, reused=True)
+            return None
+
+        results = ImageDownloader(image_store=store, session=session).download_all(
+            ["https://x/0", "https://x/1", "https://x/2"], self.dir, prepare=prepare
+        )
+        self.assertEqual(session.calls, ["https://x/1"])
+        self.assertEqual([r.path.name for r in results], ["image_001.webp", "image_002.png", "image_003.gif"])
+        self.assertTrue(results[2].reused)
+
+    def test_repeat_saves_cost_no_bytes(self):
+        """测试使用 BlobStore 时，再次保存同一图片不下载、不写入"""
+        urls = [f"https://sns-webpic-qc.xhscdn.com/2024/{'a' * 30}{i}!nd_dft_wlteh_webp_3" for i in range(3)]
+        session = FakeSession({url: (PNG_HEAD + bytes([i]), "image/png") for i, url in enumerate(urls)})
+        blobs = BlobStore.for_save_dir(self.dir)
+        try:
+            downloader = ImageDownloader(session=session, blob_store=blobs)
+            (self.dir / "n1").mkdir()
+            (self.dir / "n2").mkdir()
+            first = downloader.download_all(urls, self.dir / "n1")
+            written = blobs.bytes_written
+            second = downloader.download_all(urls, self.dir / "n2")
+        finally:
+            blobs.close()
+        self.assertEqual(len(session.calls), 3)
+        self.assertEqual(blobs.bytes_written, written)
+        for a, b in zip(first, second):
+            self.assertEqual(a.digest, b.digest)
+            self.assertEqual(a.path.name, "image_00%d.png" % (a.index + 1))
+            self.assertTrue(os.path.samefile(a.path, b.path))
+
+    def test_resave_with_new_format_removes_old_file(self):
+        """测试重新保存时图片格式变化（.webp -> .jpg），笔记文件夹中不留下旧格式的文件"""
+        old_url = f"https://sns-webpic-qc.xhscdn.com/2024/{'c' * 31}!nd_dft_wlteh_webp_3"
+        new_url = f"https://sns-webpic-qc.xhscdn.com/2024/{'d' * 31}!nd_dft_wlteh_jpg_3"
+        (self.dir / "image_001.txt").write_text("不是图片")
+        for blobs in (None, BlobStore.for_save_dir(self.dir / "blobs")):
+            session = FakeSession({old_url: (WEBP_HEAD, "image/webp"), new_url: (b"\xff\xd8\xff\xe0jpeg", "image/jpeg")})
+            try:
+                downloader = ImageDownloader(session=session, blob_store=blobs)
+                downloader.download(old_url, self.dir, "image_001")
+                path = downloader.download(new_url, self.dir, "image_001")
+            finally:
+                if blobs is not None:
+                    blobs.close()
+            self.assertEqual(path.name, "image_001.jpg")
+            self.assertEqual(sorted(p.name for p in self.dir.glob("image_001*")), ["image_001.jpg", "image_001.txt"])
+            path.unlink()
+
+    def test_conditional_request_not_modified(self):
+        """测试带 ETag 的条件请求，304 时沿用原文件"""
+        old = self.dir / "image_001.png"
+        old.write_bytes(PNG_HEAD)
+        session = FakeSession({"https://x/0": (b"", "", 304), "https://x/1": (PNG_HEAD + b"new", "image/png")})
+        results = ImageDownloader(session=session).download_all(
+            ["https://x/0", "https://x/1"], self.dir, validators={0: Validator(old, '"abc"')}
+        )
+        self.assertEqual(session.headers[session.calls.index("https://x/0")], {"If-None-Match": '"abc"'})
+        self.assertTrue(results[0].unchanged)
+        self.assertEqual((results[0].path, results[0].etag), (old, '"abc"'))
+        self.assertFalse(results[1].unchanged)
+        self.assertEqual(results[1].path.read_bytes(), PNG_HEAD + b"new")
+
+    def test_resume_after_dropped_connection(self):
+        """测试连接中断后用 Range 从断点继续，目录中只有完整的图片"""
+        body = PNG_HEAD + bytes(range(200))
+        session = RangeSession(body, cut=50)
+        path = ImageDownloader(session=session).download("https://x/0", self.dir, "image_001")
+        self.assertEqual(path.read_bytes(), body)
+        self.assertEqual(session.headers[1], {"Range": "bytes=50-", "If-Range": '"v1"'})
+        self.assertEqual(session.sent, len(body))
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["image_001.png"])
+
+    def test_truncated_download_kept_as_part_and_resumed_later(self):
+        """测试长度不足时不生成图片文件，.part 保留，之后（如进程重启后）从断点继续"""
+        body = PNG_HEAD + bytes(range(200))
+        session = RangeSession(body, cut=30, cuts=10, drop=False)
+        result = ImageDownloader(session=session).download_all(["https://x/0"], self.dir)[0]
+        self.assertFalse(result.ok)
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), [".image_001.part", ".image_001.part.json"])
+        received = (self.dir / ".image_001.part").stat().st_size
+        self.assertLess(received, len(body))
+
+        session = RangeSession(body, cuts=0)
+        result = ImageDownloader(session=session).download_all(["https://x/0"], self.dir)[0]
+        self.assertTrue(result.ok)
+        self.assertEqual(result.path.read_bytes(), body)
+        self.assertEqual(session.sent, len(body) - received)
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["image_001.png"])
+
+    def test_misaligned_partial_response_restarts(self):
+        """测试 206 的 Content-Range 起点与断点不一致时不把部分内容当作完整图片，丢弃 .part 后从头下载"""
+        body = PNG_HEAD + bytes(range(200))
+        session = RangeSession(body, cut=50, shift=20)
+        path = ImageDownloader(session=session).download("https://x/0", self.dir, "image_001")
+        self.assertEqual(path.read_bytes(), body)
+        self.assertEqual([h.get("Range") for h in session.headers], [None, "bytes=50-", None])
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["image_001.png"])
+
+    def test_changed_resource_restarts_part(self):
+        """测试 ETag 变化时 If-Range 不匹配，服务器返回完整内容，从头写入"""
+        session = RangeSession(PNG_HEAD + b"old" * 50, etag='"v1"', cut=20, cuts=99, drop=False)
+        self.assertFalse(ImageDownloader(session=session).download_all(["https://x/0"], self.dir)[0].ok)
+        new_body = PNG_HEAD + b"new" * 60
+        session = RangeSession(new_body, etag='"v2"', cuts=0)
+        path = ImageDownloader(session=session).download("https://x/0", self.dir, "image_001")
+        self.assertEqual(session.headers[0]["If-Range"], '"v1"')
+        self.assertEqual(path.read_bytes(), new_body)
+
+    def test_resumed_blob_digest_covers_whole_file(self):
+        """测试存入 BlobStore 时续传的图片内容哈希覆盖完整内容"""
+        url = f"https://sns-webpic-qc.xhscdn.com/2024/{'b' * 31}!nd_dft_wlteh_webp_3"
+        body = PNG_HEAD + os.urandom(5000)
+        blobs = BlobStore.for_save_dir(self.dir)
+        try:
+            session = RangeSession(body, cut=1234)
+            result = ImageDownloader(session=session, blob_store=blobs).download_all([url], self.dir)[0]
+            self.assertEqual(list(blobs.tmp.iterdir()), [])
+        finally:
+            blobs.close()
+        self.assertEqual(len(session.headers), 2)
+        self.assertEqual(result.digest, hashlib.sha256(body).hexdigest())
+        self.assertEqual(result.path.read_bytes(), body)
+
+    def test_atomic_write_bytes(self):
+        """测试原子写入替换已有文件，不留下临时文件"""
+        path = self.dir / "note.md"
+        path.write_bytes(b"old")
+        atomic_write_bytes(path, "新内容".encode("utf-8"))
+        self.assertEqual(path.read_text(encoding="utf-8"), "新内容")
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["note.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# test_models.py
+"""
+测试 models 模块
+"""
+import pickle
+import unittest
+
+from xhs_extractor_module.models import Note, MSGPACK_AVAILABLE, select_image_variant
+
+
+def _make_note(**kwargs) -> Note:
+    params = dict(
+        id="abc123",
+        url="https://www.xiaohongshu.com/explore/abc123",
+        title="测试标题",
+        text="测试正文",
+        images=["https://example.com/1.jpg"],
+        raw={"noteId": "abc123", "interactInfo": {"likedCount": "10"}, "tagList": [{"name": "面经"}]},
+    )
+    params.update(kwargs)
+    return Note(**params)
+
+
+class TestNote(unittest.TestCase):
+    """测试紧凑版 Note"""
+
+    def test_raw_roundtrip(self):
+        """测试 raw 压缩保存后可以还原"""
+        note = _make_note()
+        self.assertEqual(note.raw["interactInfo"]["likedCount"], "10")
+        self.assertGreater(note.raw_nbytes, 0)
+        self.assertFalse(hasattr(note, "__dict__"))
+
+    def test_drop_raw(self):
+        """测试丢弃 raw"""
+        note = _make_note()
+        note.drop_raw()
+        self.assertEqual(note.raw, {})
+        self.assertEqual(note.raw_nbytes, 0)
+
+        note = _make_note(keep_raw=False)
+        self.assertEqual(note.raw, {})
+
+    def test_defaults(self):
+        """测试默认值与原 dataclass 一致"""
+        note = Note(id="x", url="u", title="t", text="")
+        self.assertEqual(note.ocr_text, "")
+        self.assertEqual(note.images, [])
+        self.assertEqual(note.raw, {})
+
+    def test_dict_roundtrip(self):
+        """测试 to_dict / from_dict"""
+        note = _make_note(ocr_text="OCR")
+        self.assertEqual(Note.from_dict(note.to_dict()), note)
+        self.assertNotIn("raw", note.to_dict(include_raw=False))
+
+    def test_pickle(self):
+        """测试可以被 pickle（多进程传输需要）"""
+        note = _make_note()
+        self.assertEqual(pickle.loads(pickle.dumps(note)), note)
+
+    @unittest.skipUnless(MSGPACK_AVAILABLE, "需要安装 msgpack")
+    def test_msgpack_roundtrip(self):
+        """测试 msgpack 序列化"""
+        note = _make_note()
+        restored = Note.from_msgpack(note.to_msgpack())
+        self.assertEqual(restored, note)
+        self.assertEqual(Note.from_msgpack(note.to_msgpack(include_raw=False)).raw, {})
+
+
+class TestImageVariants(unittest.TestCase):
+    """测试图片规格选择"""
+
+    ENTRY = {
+        "url": "https://example.com/dft.jpg",
+        "width": 1080,
+        "height": 1440,
+        "variants": [
+            {"scene": "ORIGIN", "url": "https://example.com/origin.jpg", "width": 1080},
+            {"scene": "WB_DFT", "url": "https://example.com/dft.jpg", "width": None},
+            {"scene": "WB_PRV", "url": "https://example.com/prv.jpg", "width": None},
+        ],
+    }
+
+    def test_select_by_purpose(self):
+        """测试 OCR 选最小规格，保存选原图"""
+        self.assertEqual(select_image_variant(self.ENTRY, "ocr"), "https://example.com/prv.jpg")
+        self.assertEqual(select_image_variant(self.ENTRY, "archive"), "https://example.com/origin.jpg")
+        with self.assertRaises(ValueError):
+            select_image_variant(self.ENTRY, "thumbnail")
+
+    def test_too_small_variant_is_skipped(self):
+        """测试已知宽度不够清晰的规格不用于 OCR"""
+        entry = dict(self.ENTRY, variants=[
+            {"scene": "WB_PRV", "url": "https://example.com/prv.jpg", "width": 360},
+            {"scene": "WB_DFT", "url": "https://example.com/dft.jpg", "width": 1080},
+        ])
+        self.assertEqual(select_image_variant(entry, "ocr"), "https://example.com/dft.jpg")
+        self.assertEqual(select_image_variant(entry, "ocr", min_width=300), "https://example.com/prv.jpg")
+
+    def test_note_without_variants_falls_back(self):
+        """测试没有规格信息的旧数据仍使用 images，且规格随序列化保存"""
+        note = _make_note()
+        self.assertEqual(note.ocr_image_urls(), note.images)
+        note = _make_note(image_variants=[self.ENTRY])
+        self.assertEqual(Note.from_dict(note.to_dict()).archive_image_urls(), ["https://example.com/origin.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# test_note_bundle.py
+"""
+测试 note_bundle 模块
+"""
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from xhs_extractor_module.models import Note
+from xhs_extractor_module.note_bundle import SqliteBundle, ZipBundle, bundle_format, main, open_bundle
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 8
+WEBP = b"RIFF\0\0\0\0WEBPVP8 " + b"\1" * 8
+
+
+def _make_note(note_id: str, n_images: int = 2) -> Note:
+    return Note(
+        id=note_id,
+        url=f"https://www.xiaohongshu.com/explore/{note_id}",
+        title=f"标题 {note_id}",
+        text="正文",
+        ocr_text="OCR 文本",
+        images=[f"https://x/{note_id}/{i}" for i in range(n_images)],
+        raw={"noteId": note_id},
+    )
+
+
+class TestNoteBundle(unittest.TestCase):
+    """测试 SQLite / ZIP 单文件归档"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _roundtrip(self, name: str, **kwargs):
+        path = self.dir / name
+        image_file = self.dir / "shared.webp"
+        image_file.write_bytes(WEBP)
+        with open_bundle(path, **kwargs) as bundle:
+            for i in range(5):
+                bundle.add_note(_make_note(f"n{i}"), images=[PNG + bytes([i]), image_file])
+            bundle.add_note(_make_note("n2", n_images=1), images=[None])
+        with open_bundle(path, readonly=True) as bundle:
+            self.assertEqual(list(bundle.note_ids()), [f"n{i}" for i in range(5)])
+            self.assertIn("n3", bundle)
+            self.assertNotIn("missing", bundle)
+            self.assertIsNone(bundle.get("missing"))
+            note = bundle.get("n3")
+            self.assertEqual((note.title, note.ocr_text, note.raw), ("标题 n3", "OCR 文本", {"noteId": "n3"}))
+            self.assertEqual([image.name for image in bundle.images("n3")], ["image_001.png", "image_002.webp"])
+            self.assertEqual(bundle.images("n3")[1].url, "https://x/n3/1")
+            self.assertEqual(bundle.read_image("n3", 0), PNG + bytes([3]))
+            self.assertEqual(bundle.read_image("n4", 1), WEBP)
+            # 再次写入的笔记以最新版本为准
+            self.assertEqual(bundle.get("n2").images, ["https://x/n2/0"])
+            self.assertEqual(bundle.images("n2"), [])
+            with self.assertRaises(KeyError):
+                bundle.read_image("n2", 0)
+            return bundle.stats()
+
+    def test_sqlite_roundtrip_and_dedup(self):
+        """测试 SQLite 归档按ID读取，相同图片只存一份"""
+        stats = self._roundtrip("notes.sqlite", batch_size=2)
+        # 5 张不同的 PNG + 所有笔记共用的 1 张 WEBP
+        self.assertEqual((stats["notes"], stats["images"], stats["blobs"]), (5, 8, 6))
+        # 关闭后 WAL 已合并，单个文件即是完整归档
+        wal = self.dir / "notes.sqlite-wal"
+        self.assertTrue(not wal.exists() or wal.stat().st_size == 0)
+
+    def test_zip_roundtrip(self):
+        """测试 ZIP 归档按ID读取，追加写入同一笔记时以最新的为准"""
+        stats = self._roundtrip("notes.zip")
+        self.assertEqual(stats["notes"], 5)
+
+    def test_sqlite_failed_note_keeps_batch(self):
+        """测试一篇笔记写入失败时，同一批次中之前的笔记仍会提交"""
+        path = self.dir / "notes.sqlite"
+        with SqliteBundle(path, batch_size=100) as bundle:
+            bundle.add_note(_make_note("ok"), images=[PNG])
+            with self.assertRaises(FileNotFoundError):
+                bundle.add_note(_make_note("bad"), images=[self.dir / "missing.png"])
+            bundle.add_note(_make_note("ok2"))
+        with SqliteBundle(path, readonly=True) as bundle:
+            self.assertEqual(list(bundle.note_ids()), ["ok", "ok2"])
+            with self.assertRaises(PermissionError):
+                bundle.add_note(_make_note("x"))
+        conn = sqlite3.connect(str(path))
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_format_and_readonly_missing(self):
+        self.assertEqual(bundle_format("a.ZIP"), "zip")
+        self.assertEqual(bundle_format("a.db"), "sqlite")
+        with open_bundle(self.dir / "b.zip") as bundle:
+            self.assertIsInstance(bundle, ZipBundle)
+        with self.assertRaises(FileNotFoundError):
+            open_bundle(self.dir / "missing.sqlite", readonly=True)
+
+    def test_cli_export_and_extract(self):
+        """测试命令行从 JSON Lines 导出并取出一篇笔记"""
+        jsonl = self.dir / "notes.jsonl"
+        jsonl.write_text(
+            "\n".join(json.dumps(_make_note(f"c{i}", 0).to_dict(include_raw=False), ensure_ascii=False) for i in range(3)),
+            encoding="utf-8",
+        )
+        bundle = self.dir / "out.sqlite"
+        main(["export", str(bundle), str(jsonl)])
+        main(["extract", str(bundle), "c1", str(self.dir / "c1")])
+        data = json.loads((self.dir / "c1" / "note.json").read_text(encoding="utf-8"))
+        self.assertEqual(data["title"], "标题 c1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# test_note_parquet.py
+"""
+测试 note_parquet 模块
+"""
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+from xhs_extractor_module.models import Note
+from xhs_extractor_module.note_bundle import open_bundle
+from xhs_extractor_module.note_parquet import (
+    PYARROW_AVAILABLE, export_notes, flatten_note, iter_record_batches, main, parse_count,
+)
+
+if PYARROW_AVAILABLE:
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+
+def _note(i: int) -> Note:
+    return Note(
+        id=f"n{i}",
+        url=f"https://www.xiaohongshu.com/explore/n{i}",
+        title="面经" * (i % 3 + 1),
+        text="正文" * i,
+        images=[f"https://x/{i}/{k}" for k in range(i % 4)],
+        raw={
+            "type": "normal",
+            "time": 1700000000000 + i,
+            "user": {"userId": "u1", "nickname": "作者"},
+            "interactInfo": {"likedCount": "1.2万" if i == 0 else str(i), "collectedCount": "10万+", "commentCount": 3},
+            "tagList": [{"name": "面经"}, {"name": "后端"}],
+        },
+    )
+
+
+class TestNoteParquet(unittest.TestCase):
+    """测试笔记的列式导出"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_count(self):
+        self.assertEqual(parse_count("1234"), 1234)
+        self.assertEqual(parse_count("1.2万"), 12000)
+        self.assertEqual(parse_count("10万+"), 100000)
+        self.assertEqual(parse_count("1,024"), 1024)
+        self.assertEqual(parse_count(7), 7)
+        self.assertIsNone(parse_count(""))
+        self.assertIsNone(parse_count("赞"))
+
+    def test_flatten_note(self):
+        """测试从 raw 展开点赞数、标签、时间等字段"""
+        row = flatten_note(_note(2), include_text=False)
+        self.assertNotIn("text", row)
+        self.assertEqual((row["title_len"], row["text_len"], row["image_count"]), (6, 4, 2))
+        self.assertEqual((row["liked_count"], row["collected_count"], row["comment_count"]), (2, 100000, 3))
+        self.assertIsNone(row["share_count"])
+        self.assertEqual(row["tags"], ["面经", "后端"])
+        self.assertEqual(row["published_at"], 1700000000002)
+        empty = flatten_note(Note(id="x", url="", title="", text=""))
+        self.assertIsNone(empty["liked_count"])
+        self.assertEqual(empty["tags"], [])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, "未安装 pyarrow")
+    def test_parquet_row_groups(self):
+        """测试按批写入 row group，读回的列类型和值正确"""
+        path = self.dir / "notes.parquet"
+        self.assertEqual(export_notes((_note(i) for i in range(25)), path, batch_rows=10), 25)
+        parquet = pq.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read(columns=["id", "liked_count", "tags", "published_at"])
+        self.assertEqual(table.column("liked_count").to_pylist()[:3], [12000, 1, 2])
+        self.assertEqual(table.column("tags").to_pylist()[0], ["面经", "后端"])
+        self.assertEqual(
+            table.column("published_at").to_pylist()[0],
+            datetime.fromtimestamp(1700000000, tz=timezone.utc),
+        )
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["notes.parquet"])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, "未安装 pyarrow")
+    def test_arrow_ipc_and_batches(self):
+        """测试 Arrow IPC 输出与不含正文的批次"""
+        batches = list(iter_record_batches((_note(i) for i in range(5)), batch_rows=2, include_text=False))
+        self.assertEqual([batch.num_rows for batch in batches], [2, 2, 1])
+        self.assertNotIn("text", batches[0].schema.names)
+        path = self.dir / "notes.arrow"
+        export_notes((_note(i) for i in range(5)), path, batch_rows=2)
+        with pyarrow.ipc.open_file(str(path)) as reader:
+            self.assertEqual(reader.num_record_batches, 3)
+            self.assertEqual(reader.read_all().num_rows, 5)
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, "未安装 pyarrow")
+    def test_cli_from_bundle_keeps_raw_fields(self):
+        """测试命令行从归档导出时保留 raw 展开的字段"""
+        bundle = self.dir / "notes.sqlite"
+        with open_bundle(bundle) as b:
+            for i in range(3):
+                b.add_note(_note(i))
+        out = self.dir / "out.parquet"
+        main([str(out), str(bundle), "--no-text"])
+        table = pq.read_table(out)
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column("collected_count").to_pylist(), [100000] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# test_note_search.py
+"""
+测试 note_search 模块
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from xhs_extractor_module.models import Note
+from xhs_extractor_module.note_bundle import iter_notes, open_bundle
+from xhs_extractor_module.note_search import JIEBA_AVAILABLE, SearchIndex, build_match_query, main, tokenize
+
+
+def _note(note_id: str, title: str, text: str = "", ocr_text: str = "") -> Note:
+    return Note(id=note_id, url=f"https://www.xiaohongshu.com/explore/{note_id}", title=title, text=text,
+                ocr_text=ocr_text)
+
+
+NOTES = [
+    _note("a", "字节跳动后端面试", "问了 Redis 分布式锁的实现", "图片：集群与哨兵"),
+    _note("b", "腾讯面经", "Java 基础和锁升级", ""),
+    _note("c", "美团一面", "项目介绍", "手写 LRU 缓存，面试官追问分布式锁"),
+]
+
+
+class TestNoteSearch(unittest.TestCase):
+    """测试全文索引与检索"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.index = SearchIndex(self.dir / "search.sqlite3")
+        self.index.index_notes(NOTES)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def _ids(self, query: str):
+        return [hit.note_id for hit in self.index.search(query)]
+
+    def test_tokenize_bigram(self):
+        """测试中文按二元组切分，英文按单词切分且不区分大小写"""
+        self.assertEqual(tokenize("Redis集群面试 a字"), ["redis", "集群", "群面", "面试", "试", "a", "字"])
+        self.assertEqual(build_match_query("面试题 redis 锁"), '"面试 试题" AND "redis" AND "锁" *')
+        self.assertIsNone(build_match_query("  ，。 "))
+
+    def test_search_chinese_substrings(self):
+        """测试中文子串、单字、英文和多个词同时出现"""
+        self.assertEqual(self._ids("跳动后"), ["a"])
+        self.assertEqual(sorted(self._ids("分布式锁")), ["a", "c"])
+        self.assertEqual(sorted(self._ids("锁")), ["a", "b", "c"])
+        self.assertEqual(self._ids("REDIS"), ["a"])
+        self.assertEqual(self._ids("哨兵 面试"), ["a"])
+        self.assertEqual(self._ids("不存在的词"), [])
+        self.assertEqual(self.index.count("分布式锁"), 2)
+
+    def test_title_ranks_higher_and_snippet(self):
+        """测试标题命中的笔记排在前面，摘要标出关键词"""
+        hits = self.index.search("面试")
+        self.assertEqual(hits[0].note_id, "a")
+        self.assertIn("【面试】", hits[0].snippet)
+        self.assertIn("【分布式锁】", self.index.search("分布式锁")[0].snippet)
+
+    def test_incremental_update(self):
+        """测试内容没有变化时不重新写入，变化时替换旧内容"""
+        self.assertEqual(self.index.index_notes(NOTES), 0)
+        self.assertTrue(self.index.index_note(_note("b", "腾讯面经", "消息队列")))
+        self.assertEqual(self._ids("锁升级"), [])
+        self.assertEqual(self._ids("消息队列"), ["b"])
+        self.assertEqual(len(self.index), 3)
+        self.assertTrue(self.index.remove("b"))
+        self.assertNotIn("b", self.index)
+        self.assertEqual(self._ids("消息"), [])
+
+    def test_tokenizer_is_remembered(self):
+        """测试重新打开时沿用索引的分词方式"""
+        self.index.close()
+        self.index = SearchIndex(self.dir / "search.sqlite3")
+        self.assertEqual(self.index.tokenizer, "bigram")
+        if not JIEBA_AVAILABLE:
+            with self.assertRaises(ValueError):
+                SearchIndex(self.dir / "search.sqlite3", tokenizer="jieba")
+
+    def test_cli_index_from_jsonl_and_bundle(self):
+        """测试命令行从 JSON Lines 和归档建立索引"""
+        jsonl = self.dir / "notes.jsonl"
+        jsonl.write_text(json.dumps(NOTES[0].to_dict(include_raw=False), ensure_ascii=False) + "\n", encoding="utf-8")
+        with open_bundle(self.dir / "notes.sqlite") as bundle:
+            bundle.add_note(NOTES[1])
+        self.assertEqual([note.id for note in iter_notes([jsonl, self.dir / "notes.sqlite"])], ["a", "b"])
+        path = self.dir / "cli.sqlite3"
+        main(["index", str(path), str(jsonl), str(self.dir / "notes.sqlite")])
+        with SearchIndex(path) as index:
+            self.assertEqual(len(index), 2)
+            self.assertEqual([hit.note_id for hit in index.search("锁升级")], ["b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
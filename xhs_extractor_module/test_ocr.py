@@ -0,0 +1,1012 @@
+# test_ocr.py
+"""
+测试 ocr 模块（使用 Mock 代替 PaddleOCR，不需要安装模型）
+"""
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from xhs_extractor_module import ocr, ocr_backends
+from xhs_extractor_module.models import Note
+from xhs_extractor_module.ocr_cache import OCRCache
+from xhs_extractor_module.image_dedup import PerceptualIndex, aspect_ratio, dhash, fingerprint, hamming_distances
+from xhs_extractor_module.image_store import ImageStore
+from xhs_extractor_module.ocr_pool import OCRPool
+
+
+class FakePaddleOCR:
+    """模拟 PaddleOCR，记录加载次数"""
+    instances = 0
+
+    def __init__(self, **kwargs):
+        FakePaddleOCR.instances += 1
+
+    def ocr(self, image):
+        return [[[[0, 0], [1, 0], [1, 1], [0, 1]], ("识别文字", 0.98)]]
+
+
+class OCRTestCase(unittest.TestCase):
+    """使用模拟引擎的基类：每个测试使用独立的引擎注册表"""
+
+    def setUp(self):
+        FakePaddleOCR.instances = 0
+        patchers = [
+            patch.object(ocr_backends, "PADDLEOCR_AVAILABLE", True),
+            patch.object(ocr_backends, "PaddleOCR", FakePaddleOCR, create=True),
+            patch.dict(os.environ, {ocr_backends.BACKEND_ENV_VAR: "paddle"}),
+            patch.object(ocr, "_ENGINES", {}),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+class TestSharedEngine(OCRTestCase):
+    """测试进程内共享的 OCR 引擎"""
+
+    def test_processors_share_one_model(self):
+        """测试多个 OCRProcessor 只加载一次模型"""
+        processors = [ocr.OCRProcessor() for _ in range(3)]
+        self.assertEqual(FakePaddleOCR.instances, 1)
+        self.assertIs(processors[0].ocr_engine, processors[2].ocr_engine)
+        self.assertEqual(processors[1].ocr_image_from_file("x.jpg"), "识别文字")
+
+    def test_background_warm_up_from_threads(self):
+        """测试后台预热与多线程并发获取"""
+        self.assertTrue(ocr.warm_up_ocr(background=True))
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(ocr.OCRProcessor().ocr_image_from_file("x.jpg")))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["识别文字"] * 4)
+        self.assertEqual(FakePaddleOCR.instances, 1)
+
+    def test_languages_are_separate(self):
+        """测试不同语言分别加载"""
+        ocr.OCRProcessor(use_lang="ch")
+        ocr.OCRProcessor(use_lang="en")
+        self.assertEqual(FakePaddleOCR.instances, 2)
+
+
+@unittest.skipUnless(ocr.NUMPY_AVAILABLE and ocr.PIL_AVAILABLE, "需要安装 numpy 和 Pillow")
+class TestOcrFromBytes(OCRTestCase):
+    """测试内存中的图片识别"""
+
+    def _png_bytes(self):
+        import io
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (4, 2), (255, 0, 0)).save(buf, format="PNG")
+        return buf.getvalue()
+
+    def test_decode_to_bgr_array(self):
+        """测试解码为 BGR 数组"""
+        image = ocr.decode_image_bytes(self._png_bytes())
+        self.assertEqual(image.shape, (2, 4, 3))
+        self.assertEqual(tuple(image[0, 0]), (0, 0, 255))
+        self.assertIsNone(ocr.decode_image_bytes(b"not an image"))
+
+    def test_engine_receives_array(self):
+        """测试引擎直接收到数组而不是文件路径"""
+        processor = ocr.OCRProcessor()
+        with patch.object(FakePaddleOCR, "ocr", autospec=True, return_value=[("文字", 0.9)]) as mock_ocr:
+            self.assertEqual(processor.ocr_image_from_bytes(self._png_bytes()), "文字")
+        image = mock_ocr.call_args[0][1]
+        self.assertEqual(getattr(image, "shape", None), (2, 4, 3))
+
+
+@unittest.skipUnless(ocr.NUMPY_AVAILABLE and ocr.PIL_AVAILABLE, "需要安装 numpy 和 Pillow")
+class TestPrefilter(OCRTestCase):
+    """测试文字预筛选"""
+
+    def _photo(self):
+        """没有文字的平滑图片（渐变 + 轻微噪声）"""
+        import numpy as np
+        y, x = np.mgrid[0:800, 0:600]
+        image = np.stack([x * 200 // 600, y * 180 // 800, np.full_like(x, 90)], axis=-1).astype(np.float32)
+        image += np.random.default_rng(0).normal(0, 4, image.shape)
+        return image.clip(0, 255).astype(np.uint8)
+
+    def _caption(self, text="Short caption"):
+        """白底上一行小字"""
+        import numpy as np
+        from PIL import Image, ImageDraw
+        img = Image.new("RGB", (600, 800), (255, 255, 255))
+        ImageDraw.Draw(img).text((40, 60), text, fill=(0, 0, 0))
+        return np.asarray(img)[:, :, ::-1].copy()
+
+    def test_likely_has_text(self):
+        """测试平滑图片判定无文字，一行小字判定有文字，小图不判断"""
+        import numpy as np
+        self.assertFalse(ocr.likely_has_text(self._photo()))
+        self.assertTrue(ocr.likely_has_text(self._caption()))
+        self.assertTrue(ocr.likely_has_text(np.zeros((20, 20, 3), dtype=np.uint8)))
+        self.assertTrue(ocr.likely_has_text("path.jpg"))
+
+    def test_skips_recognition_and_counts(self):
+        """测试跳过识别并统计跳过次数"""
+        processor = ocr.OCRProcessor()
+        with patch.object(FakePaddleOCR, "ocr", autospec=True, return_value=[("文字", 0.9)]) as mock_ocr:
+            results = processor.recognize_batch([self._photo(), self._caption(), self._photo()], batch_size=1)
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertEqual([r.skipped for r in results], [True, False, True])
+        self.assertEqual((processor.prefilter_checked, processor.prefilter_skipped), (3, 2))
+
+    def test_prefilter_can_be_disabled(self):
+        """测试关闭预筛选后全部识别"""
+        processor = ocr.OCRProcessor(prefilter=False)
+        self.assertEqual(processor._run_ocr(self._photo()), "识别文字")
+        self.assertEqual(processor.prefilter_checked, 0)
+
+
+def _fake_get(delay=0.0, size=1024):
+    """模拟 requests.get：延迟后返回图片字节"""
+    def fake_get(url, **kwargs):
+        time.sleep(delay)
+        response = MagicMock()
+        response.content = url.encode("utf-8").ljust(size, b"\0")
+        response.headers = {"Content-Type": "image/jpeg"}
+        return response
+    return fake_get
+
+
+def _fake_downloaded_results(transform, delay=0.0):
+    """模拟 OCRProcessor._ocr_downloaded_results：识别结果取自图片内容"""
+    def fake(processor, items):
+        time.sleep(delay * len(items))
+        results = []
+        for _url, data, _content_type in items:
+            text = transform(data.rstrip(b"\0").decode("utf-8"))
+            results.append(ocr.OCRResult(text=text, lines=[text], confidences=[0.9], boxes=[[[0.0, 0.0], [1.0, 1.0]]]))
+        return results
+    return fake
+
+
+class TestOcrImages(OCRTestCase):
+    """测试批量 OCR 的并发下载"""
+
+    def setUp(self):
+        super().setUp()
+        # 识别结果直接取自图片内容，便于检查顺序
+        patcher = patch.object(
+            ocr.OCRProcessor, "_ocr_downloaded_results", _fake_downloaded_results(lambda text: text),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_order_and_format(self):
+        """测试输出顺序与格式保持不变"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(6)]
+        with patch.object(ocr.requests, "get", _fake_get(delay=0.05)):
+            text = ocr.OCRProcessor().ocr_images(urls)
+        expected = "\n\n".join(f"[图片 {i} OCR 结果]\n{url}" for i, url in enumerate(urls, 1))
+        self.assertEqual(text, expected)
+
+    def test_downloads_overlap(self):
+        """测试下载并发进行"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(8)]
+        start = time.perf_counter()
+        with patch.object(ocr.requests, "get", _fake_get(delay=0.2)):
+            ocr.OCRProcessor().ocr_images(urls, max_workers=4)
+        self.assertLess(time.perf_counter() - start, 1.2)
+
+    def test_small_budget_does_not_deadlock(self):
+        """测试内存额度小于单张图片时依然按顺序完成"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(5)]
+        with patch.object(ocr.requests, "get", _fake_get(size=4096)):
+            text = ocr.OCRProcessor().ocr_images(urls, max_workers=3, max_inflight_bytes=1)
+        self.assertEqual(text.count("OCR 结果"), 5)
+
+
+class TestStreamingOcr(OCRTestCase):
+    """测试流式识别、时间预算和取消"""
+
+    def setUp(self):
+        super().setUp()
+        self.urls = [f"https://example.com/{i}.jpg" for i in range(6)]
+
+    def _patch_recognize(self, delay=0.0):
+        patcher = patch.object(
+            ocr.OCRProcessor, "_ocr_downloaded_results",
+            _fake_downloaded_results(lambda text: text.rsplit("/", 1)[-1], delay=delay),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_yields_structured_results_as_they_finish(self):
+        """测试每张图片完成后立即返回文本、文本框、置信度和耗时"""
+        self._patch_recognize(delay=0.05)
+        processor = ocr.OCRProcessor()
+        start = time.perf_counter()
+        with patch.object(ocr.requests, "get", _fake_get(delay=0.02)):
+            stream = processor.iter_ocr_images(self.urls)
+            first = next(stream)
+            first_at = time.perf_counter() - start
+            results = [first] + list(stream)
+            total = time.perf_counter() - start
+            merged = processor.ocr_images(self.urls)
+        self.assertLess(first_at, total / 2)
+        self.assertEqual([r.index for r in results], list(range(6)))
+        self.assertEqual(first.status, ocr.STATUS_OK)
+        self.assertEqual((first.text, first.confidences, first.boxes), ("0.jpg", [0.9], [[[0.0, 0.0], [1.0, 1.0]]]))
+        self.assertGreater(first.download_seconds, 0)
+        self.assertGreater(first.ocr_seconds, 0)
+        self.assertEqual(ocr.merge_ocr_results(results), merged)
+
+    def test_time_budget(self):
+        """测试超出时间预算后剩余图片返回 timeout，合并文本只包含已完成的部分"""
+        self._patch_recognize(delay=0.1)
+        start = time.perf_counter()
+        with patch.object(ocr.requests, "get", _fake_get()):
+            results = list(ocr.OCRProcessor().iter_ocr_images(self.urls, time_budget=0.25, batch_size=2))
+        self.assertLess(time.perf_counter() - start, 0.6)
+        statuses = [r.status for r in sorted(results, key=lambda r: r.index)]
+        self.assertIn(ocr.STATUS_OK, statuses)
+        self.assertEqual(statuses[-1], ocr.STATUS_TIMEOUT)
+        self.assertEqual(len(results), 6)
+        partial = ocr.merge_ocr_results(results)
+        self.assertIn("0.jpg", partial)
+        self.assertNotIn("5.jpg", partial)
+
+    def test_timeout_while_downloading(self):
+        """测试等待下载时也遵守时间预算"""
+        self._patch_recognize()
+        start = time.perf_counter()
+        with patch.object(ocr.requests, "get", _fake_get(delay=0.5)):
+            text = ocr.OCRProcessor().ocr_images(self.urls[:2], max_workers=1, time_budget=0.1)
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(text, "")
+
+    def test_cancel(self):
+        """测试设置取消事件后剩余图片返回 cancelled，缓存命中的图片标记为 cached"""
+        self._patch_recognize()
+        cancel = threading.Event()
+        processor = ocr.OCRProcessor()
+        results = []
+        with patch.object(ocr.requests, "get", _fake_get()), \
+                patch.object(ocr.OCRProcessor, "_cached_by_url", lambda self, url: "缓存" if url.endswith("/0.jpg") else None):
+            for result in processor.iter_ocr_images(self.urls, cancel=cancel):
+                results.append(result)
+                if result.index == 1:
+                    cancel.set()
+        self.assertEqual(
+            [r.status for r in results],
+            [ocr.STATUS_CACHED, ocr.STATUS_OK] + [ocr.STATUS_CANCELLED] * 4,
+        )
+        self.assertFalse(results[-1].ok)
+
+
+class TestOCRCache(OCRTestCase):
+    """测试 OCR 结果缓存"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = OCRCache(Path(self.tmp.name) / "cache.sqlite3")
+        self.addCleanup(self.cache.close)
+        self.calls = []
+        for patcher in (
+            patch.object(ocr, "decode_image_bytes", lambda data: data),
+            patch.object(ocr.OCRProcessor, "_recognize", lambda processor, data: self._fake_recognize(data)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _fake_recognize(self, data):
+        self.calls.append(data)
+        text = data.rstrip(b"\0").decode("utf-8")
+        return ocr.OCRResult(text=text, lines=[text], confidences=[0.9])
+
+    def test_same_image_recognized_once(self):
+        """测试同一图片（CDN 链接不同）只下载、识别一次"""
+        urls = [
+            "https://sns-webpic-qc.xhscdn.com/202401011200/abc/1040g2sg30abcdefghijk!nd_dft_wlteh_webp_3",
+            "https://sns-webpic-qc.xhscdn.com/202402021200/def/1040g2sg30abcdefghijk!nd_prv_wlteh_webp_3",
+        ]
+        processor = ocr.OCRProcessor(cache=self.cache)
+        with patch.object(ocr.requests, "get", _fake_get()):
+            first = processor.ocr_images(urls[:1])
+        with patch.object(ocr.requests, "get", side_effect=AssertionError("不应下载")):
+            second = processor.ocr_images(urls[1:])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first, second)
+
+    def test_content_hash_hit_skips_recognition(self):
+        """测试不同链接但内容相同的图片只识别一次"""
+        processor = ocr.OCRProcessor(cache=self.cache)
+        data = b"same-bytes"
+        self.assertEqual(processor._ocr_downloaded("https://a.example.com/1.jpg", data, "image/jpeg"), "same-bytes")
+        self.assertEqual(processor._ocr_downloaded("https://b.example.com/2.jpg", data, "image/jpeg"), "same-bytes")
+        self.assertEqual(len(self.calls), 1)
+        # 内容命中后记录了新链接的图片ID
+        self.assertIsNotNone(self.cache.get_by_image_id("https://b.example.com/2.jpg", processor.engine_signature))
+
+    def test_failures_are_not_cached(self):
+        """测试识别失败的结果不写入缓存"""
+        processor = ocr.OCRProcessor(cache=self.cache)
+        with patch.object(ocr.OCRProcessor, "_recognize", lambda self, image: None):
+            processor._ocr_downloaded("https://a.example.com/1.jpg", b"x", "image/jpeg")
+        self.assertEqual(len(self.cache), 0)
+
+    def test_engine_change_invalidates(self):
+        """测试引擎版本变化时清除旧结果"""
+        self.cache.ensure_engine("paddle:ch:1")
+        self.cache.put("d1", "paddle:ch:1", "旧结果", [0.5], image_id="xhs:1")
+        self.assertEqual(self.cache.ensure_engine("paddle:ch:1"), 0)
+        self.assertEqual(self.cache.ensure_engine("paddle:ch:2"), 1)
+        self.assertIsNone(self.cache.get_by_image_id("xhs:1", "paddle:ch:1"))
+
+    def test_switching_backends_keeps_results(self):
+        """测试在不同后端之间切换不清除其他后端的结果，只有同一后端的旧版本失效"""
+        self.cache.ensure_engine("paddle:ch:1")
+        self.cache.put("d1", "paddle:ch:1", "paddle 结果", [0.9], image_id="xhs:1")
+        self.assertEqual(self.cache.ensure_engine("onnx:ch:1"), 0)
+        self.cache.put("d1", "onnx:ch:1", "onnx 结果", [0.8], image_id="xhs:1")
+        self.assertEqual(self.cache.ensure_engine("paddle:ch:1"), 0)
+        self.assertEqual(self.cache.ensure_engine("onnx:ch:1"), 0)
+        self.assertEqual(self.cache.get_by_image_id("xhs:1", "paddle:ch:1").text, "paddle 结果")
+        self.assertEqual(self.cache.get_by_content("d1", "onnx:ch:1").text, "onnx 结果")
+        self.assertEqual(self.cache.ensure_engine("onnx:ch:2"), 1)
+        self.assertEqual(len(self.cache), 1)
+        self.assertIsNotNone(self.cache.get_by_image_id("xhs:1", "paddle:ch:1"))
+
+    def test_lru_eviction(self):
+        """测试超过大小上限时淘汰最久未访问的结果"""
+        cache = OCRCache(Path(self.tmp.name) / "small.sqlite3", max_bytes=100)
+        self.addCleanup(cache.close)
+        for i in range(3):
+            cache.put(f"d{i}", "e", "x" * 30, [])
+            time.sleep(0.01)
+        cache.get_by_content("d0", "e")  # d0 变为最近访问
+        cache.put("d3", "e", "x" * 30, [])
+        self.assertIsNotNone(cache.get_by_content("d0", "e"))
+        self.assertIsNone(cache.get_by_content("d1", "e"))
+        self.assertLessEqual(cache.total_bytes, 100)
+
+    def test_size_shared_between_processes(self):
+        """测试多个进程共用缓存文件时按同一个总大小淘汰"""
+        path = Path(self.tmp.name) / "shared.sqlite3"
+        first, second = OCRCache(path, max_bytes=100), OCRCache(path, max_bytes=100)
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        for i in range(3):
+            first.put(f"d{i}", "e", "x" * 28, [])
+            time.sleep(0.01)
+        self.assertEqual(second.total_bytes, 90)
+        second.put("d3", "e", "x" * 28, [])
+        self.assertEqual(len(first), 3)
+        self.assertIsNone(first.get_by_content("d0", "e"))
+        self.assertEqual(first.total_bytes, 90)
+        actual = first._conn.execute("SELECT SUM(size) FROM results").fetchone()[0]
+        self.assertEqual(actual, first.total_bytes)
+        self.assertEqual(first.ensure_engine("paddle:ch:1"), 0)
+        first.put("d4", "paddle:ch:1", "x", [])
+        second.ensure_engine("paddle:ch:2")
+        self.assertEqual((first.total_bytes, second.total_bytes), (90, 90))
+        plan = first._conn.execute(
+            "EXPLAIN QUERY PLAN DELETE FROM image_ids WHERE content_hash = ? AND engine = ?", ("d0", "e")
+        ).fetchall()
+        self.assertIn("idx_image_ids_content", str(plan))
+
+
+def _screenshot(text, size=(600, 800), quality=None):
+    """白底文字截图；指定 size 时缩放，指定 quality 时按 JPEG 重新压缩"""
+    import io
+    import numpy as np
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (600, 800), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for row in range(12):
+        draw.text((40, 40 + row * 60), f"{text} {row}", fill=(0, 0, 0))
+    draw.rectangle((40, 760, 560, 780), fill=(200, 60, 60))
+    img = img.resize(size)
+    if quality:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        img = Image.open(io.BytesIO(buf.getvalue())).convert("RGB")
+    return np.asarray(img)[:, :, ::-1].copy()
+
+
+def _template_screenshot(lines, size=(600, 800), quality=None):
+    """同一模板（标题栏 + 大字号题目列表）的截图，只有题目文字不同"""
+    import io
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+    font = ImageFont.load_default(size=28)
+    img = Image.new("RGB", (600, 800), (250, 245, 235))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 600, 90), fill=(220, 60, 60))
+    draw.text((30, 30), "Interview Q&A", fill=(255, 255, 255), font=font)
+    for row, line in enumerate(lines):
+        draw.text((40, 130 + row * 50), line, fill=(30, 30, 30), font=font)
+    img = img.resize(size)
+    if quality:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        img = Image.open(io.BytesIO(buf.getvalue())).convert("RGB")
+    return np.asarray(img)[:, :, ::-1].copy()
+
+
+class TestImageDedup(OCRTestCase):
+    """测试感知哈希去重"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name) / "phash"
+
+    def _index(self, **kwargs):
+        index = PerceptualIndex(self.root, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def test_near_duplicates_match(self):
+        """测试缩放、重新压缩后的图片判定为近似重复，不同内容和不同宽高比的图片不判定"""
+        index = self._index()
+        original = _screenshot("Question about Redis")
+        index.add(dhash(original), aspect_ratio(original), text="Redis")
+
+        for variant in (_screenshot("Question about Redis", size=(300, 400), quality=60),
+                        _screenshot("Question about Redis", quality=30)):
+            match = index.find(dhash(variant), aspect=aspect_ratio(variant))
+            self.assertIsNotNone(match)
+            self.assertEqual(match.text, "Redis")
+        other = _screenshot("Kafka partitions and consumer groups")
+        self.assertIsNone(index.find(dhash(other), aspect=aspect_ratio(other)))
+        cropped = _screenshot("Question about Redis", size=(600, 600))
+        self.assertIsNone(index.find(dhash(cropped), aspect=aspect_ratio(cropped)))
+
+    def test_require_and_remember(self):
+        """测试按需要的字段过滤，remember 为同一张图片补充字段"""
+        index = self._index()
+        key = fingerprint(_screenshot("MySQL index"))
+        idx = index.remember(key.hash, key.aspect, text="MySQL", thumb=key.thumb)
+        self.assertIsNone(index.find(key.hash, require="file", thumb=key.thumb))
+        saved = Path(self.tmp.name) / "image_001.jpg"
+        saved.write_bytes(b"jpg")
+        self.assertEqual(index.remember(key.hash, key.aspect, file=str(saved), thumb=key.thumb), idx)
+        self.assertEqual(len(index), 1)
+        match = index.find(key.hash, require="file", thumb=key.thumb)
+        self.assertEqual((match.text, match.file), ("MySQL", str(saved)))
+        saved.unlink()
+        self.assertIsNone(index.find(key.hash, require="file", thumb=key.thumb))
+
+    def test_same_template_needs_verification(self):
+        """测试同一模板、文字不同的截图哈希接近，但通不过缩略图校验；缩放、重新压缩的同一张截图可以通过"""
+        index = self._index()
+        questions = ["1. What is a B+ tree?", "2. Why MVCC in InnoDB?", "3. Redo log vs binlog", "4. Explain gap locks"]
+        key = fingerprint(_template_screenshot(questions))
+        index.add(key.hash, key.aspect, text="B+ tree", thumb=key.thumb)
+
+        edited = fingerprint(_template_screenshot(questions[:3] + ["4. Explain next-key locks"]))
+        self.assertLessEqual(int(hamming_distances(key.hash[None, :], edited.hash)[0]), 8)
+        self.assertIsNone(index.find(edited.hash, aspect=edited.aspect, max_distance=8, thumb=edited.thumb))
+
+        repost = fingerprint(_template_screenshot(questions, size=(300, 400), quality=60))
+        match = index.find(repost.hash, aspect=repost.aspect, thumb=repost.thumb)
+        self.assertEqual(match.text, "B+ tree")
+
+    def test_exact_match_and_unverified_entries(self):
+        """测试按内容哈希/图片ID精确命中；没有校验缩略图的记录不会按哈希命中"""
+        index = self._index()
+        key = fingerprint(_screenshot("Redis cluster"))
+        index.add(key.hash, key.aspect, content_hash="sha-1", image_id="xhs:abc", text="old")
+        self.assertIsNone(index.find(key.hash, aspect=key.aspect, thumb=key.thumb))
+        self.assertEqual(index.find_exact(content_hash="sha-1", require="text").text, "old")
+        self.assertEqual(index.find_exact(image_id="xhs:abc").text, "old")
+        self.assertIsNone(index.find_exact(image_id="xhs:abc", require="file"))
+        self.assertIsNone(index.find_exact())
+        self.assertEqual(index.remember(key.hash, key.aspect, image_id="xhs:abc", text="new", thumb=key.thumb), 0)
+        self.assertEqual((len(index), index.find_exact(image_id="xhs:abc").text), (1, "new"))
+        self.assertEqual(index.find(key.hash, aspect=key.aspect, thumb=key.thumb).text, "new")
+
+    def test_persist_and_repair(self):
+        """测试重新打开后索引仍在，哈希文件被截断时两边对齐"""
+        index = self._index()
+        images = [_screenshot(text) for text in ("Redis persistence", "TCP handshake", "Kafka consumer groups")]
+        for i, image in enumerate(images):
+            index.add(dhash(image), aspect_ratio(image), text=f"t{i}")
+        index.close()
+
+        reopened = self._index()
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened.find(dhash(images[2])).text, "t2")
+        reopened.close()
+
+        with open(self.root / "hashes.bin", "r+b") as f:
+            f.truncate(2 * 32 + 5)
+        repaired = self._index()
+        self.assertEqual(len(repaired), 2)
+        self.assertIsNone(repaired.find(dhash(images[2]), max_distance=0))
+        self.assertEqual(repaired.add(dhash(images[2]), 0.75, text="t2"), 2)
+
+    def test_shared_between_processes(self):
+        """测试多个进程共用索引目录：序号不冲突，各自能查到对方新增的记录"""
+        first, second = self._index(), self._index()
+        a = fingerprint(_screenshot("Redis persistence"))
+        b = fingerprint(_screenshot("Kafka consumer groups"))
+        self.assertEqual(first.add(a.hash, a.aspect, content_hash="sha-a", text="a", thumb=a.thumb), 0)
+        self.assertEqual(second.add(b.hash, b.aspect, content_hash="sha-b", text="b", thumb=b.thumb), 1)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(first.find(b.hash, max_distance=0).index, 1)
+        self.assertEqual(second.find(a.hash, max_distance=0).index, 0)
+
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target=_add_dedup_entries, args=(str(self.root), n)) for n in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            self.assertEqual(worker.exitcode, 0)
+        reopened = self._index()
+        self.assertEqual(len(reopened), 2 + 2 * 20)
+        self.assertEqual((self.root / "hashes.bin").stat().st_size, len(reopened) * 32)
+        self.assertEqual(reopened.find(b.hash, max_distance=0).index, 1)
+
+    def test_remember_failure_keeps_text(self):
+        """测试写入去重索引失败时仍返回识别结果"""
+        import io
+        import sqlite3
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.fromarray(_screenshot("Java GC")[:, :, ::-1]).save(buf, format="PNG")
+        index = self._index()
+        processor = ocr.OCRProcessor(dedup=index)
+        with patch.object(index, "remember", side_effect=sqlite3.OperationalError("database is locked")), \
+                patch.object(FakePaddleOCR, "ocr", autospec=True, return_value=[("Java GC", 0.9)]):
+            text = processor._ocr_downloaded("https://a.example.com/1.png", buf.getvalue(), "image/png")
+        self.assertEqual(text, "Java GC")
+
+    def test_ocr_skipped_for_near_duplicate(self):
+        """测试近似重复的图片复用识别文本，不再识别"""
+        import io
+        from PIL import Image
+
+        def encode(image, fmt, **kwargs):
+            buf = io.BytesIO()
+            Image.fromarray(image[:, :, ::-1]).save(buf, format=fmt, **kwargs)
+            return buf.getvalue()
+
+        processor = ocr.OCRProcessor(dedup=self._index())
+        first = encode(_screenshot("Java GC"), "PNG")
+        repost = encode(_screenshot("Java GC", size=(450, 600)), "JPEG", quality=50)
+        with patch.object(FakePaddleOCR, "ocr", autospec=True, return_value=[("Java GC", 0.9)]) as mock_ocr:
+            self.assertEqual(processor._ocr_downloaded("https://a.example.com/1.png", first, "image/png"), "Java GC")
+            self.assertEqual(processor._ocr_downloaded_batch([
+                ("https://b.example.com/2.jpg", repost, "image/jpeg"),
+                ("https://c.example.com/3.jpg", repost, "image/jpeg"),
+            ]), ["Java GC", "Java GC"])
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertEqual(processor.dedup_hits, 2)
+
+
+def _add_dedup_entries(root: str, worker: int):
+    """子进程：向共用的索引目录写入 20 条记录"""
+    import numpy as np
+    index = PerceptualIndex(root)
+    rng = np.random.default_rng(worker)
+    for i in range(20):
+        index.add(rng.integers(0, 2 ** 63, size=4, dtype=np.uint64), 1.0, text=f"{worker}-{i}")
+    index.close()
+
+
+class FakeBatchPaddleOCR(FakePaddleOCR):
+    """支持 predict 批量接口的模拟引擎，记录每次调用的批大小"""
+    batches = []
+
+    def ocr(self, image):
+        FakeBatchPaddleOCR.batches.append(1)
+        return [[[[0, 0]], (_image_text(image), 0.9)]]
+
+    def predict(self, images):
+        FakeBatchPaddleOCR.batches.append(len(images))
+        return [[[[[0, 0]], (_image_text(image), 0.9)]] for image in images]
+
+
+def _image_text(image):
+    """模拟图片（字节）对应的识别文字"""
+    return image.rstrip(b"\0").rsplit(b"/", 1)[-1].decode("utf-8")
+
+
+class TestBatchedOcr(OCRTestCase):
+    """测试批量识别"""
+
+    def setUp(self):
+        super().setUp()
+        FakeBatchPaddleOCR.batches = []
+        patchers = [
+            patch.object(ocr_backends, "PaddleOCR", FakeBatchPaddleOCR, create=True),
+            # 直接把图片字节当作“解码后的图片”交给引擎
+            patch.object(ocr, "decode_image_bytes", lambda data: data),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_recognize_batch_keeps_order(self):
+        """测试按尺寸分组后结果仍按输入顺序返回"""
+        class Image(bytes):
+            shape = None
+
+        images = []
+        for i, height in enumerate([900, 100, 880, 120, 500]):
+            image = Image(f"图{i}".encode("utf-8"))
+            image.shape = (height, 300, 3)
+            images.append(image)
+        results = ocr.OCRProcessor().recognize_batch(images, batch_size=2)
+        self.assertEqual([r.text for r in results], [f"图{i}" for i in range(5)])
+        self.assertEqual(FakeBatchPaddleOCR.batches, [2, 2, 1])
+
+    def test_ocr_images_batched_matches_per_image(self):
+        """测试批量识别与逐张识别输出一致"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(5)]
+        with patch.object(ocr.requests, "get", _fake_get()):
+            single = ocr.OCRProcessor().ocr_images(urls)
+            batched = ocr.OCRProcessor().ocr_images(urls, batch_size=4)
+        self.assertEqual(single, batched)
+        self.assertIn("[图片 5 OCR 结果]\n4.jpg", batched)
+        self.assertEqual(FakeBatchPaddleOCR.batches, [1] * 5 + [4, 1])
+
+    def test_small_budget_flushes_partial_batch(self):
+        """测试内存额度不足一批时提前识别，不会死锁"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(5)]
+        with patch.object(ocr.requests, "get", _fake_get(size=4096)):
+            text = ocr.OCRProcessor().ocr_images(urls, max_workers=3, max_inflight_bytes=1, batch_size=4)
+        self.assertEqual(text.count("OCR 结果"), 5)
+
+
+@unittest.skipUnless(ocr.NUMPY_AVAILABLE, "需要安装 numpy")
+class TestPreprocess(OCRTestCase):
+    """测试识别前的图片预处理"""
+
+    def _canvas(self, height, width, bands=()):
+        """白底图片，bands 中的每个 (起始行, 结束行, 起始列, 结束列) 画成黑色色块"""
+        import numpy as np
+        image = np.full((height, width, 3), 255, dtype=np.uint8)
+        for y0, y1, x0, x1 in bands:
+            image[y0:y1, x0:x1] = 0
+        return image
+
+    def test_trim_borders_and_offsets(self):
+        """测试裁掉白边并记录偏移"""
+        tiles = ocr.preprocess_image(self._canvas(400, 300, [(100, 120, 50, 250)]))
+        self.assertEqual(len(tiles), 1)
+        tile = tiles[0]
+        self.assertEqual((tile.x0, tile.y0, tile.scale), (34, 84, 1.0))
+        self.assertEqual(tile.image.shape, (20 + 32, 200 + 32, 3))
+
+    def test_downscale_wide_image(self):
+        """测试过宽的图片等比缩小到工作分辨率"""
+        config = ocr.PreprocessConfig(trim_borders=False)
+        tiles = ocr.preprocess_image(self._canvas(1000, 1920, [(100, 140, 0, 1920)]), config)
+        self.assertEqual(tiles[0].image.shape, (500, 960, 3))
+        self.assertEqual(tiles[0].scale, 0.5)
+        self.assertEqual(tiles[0].image[130, 0, 0], 255)
+        self.assertEqual(tiles[0].image[60, 0, 0], 0)
+
+    def test_tall_image_cut_in_blank_rows(self):
+        """测试过高的图片在空白行处切块，不切断文字行"""
+        bands = [(y, y + 30, 20, 280) for y in range(10, 2400, 50)]
+        image = self._canvas(2400, 300, bands)
+        tiles = ocr.preprocess_image(image, ocr.PreprocessConfig(trim_borders=False))
+        self.assertGreater(len(tiles), 3)
+        self.assertEqual(sum(t.image.shape[0] for t in tiles), 2400)
+        for tile in tiles:
+            self.assertLessEqual(tile.image.shape[0], 600)
+            # 每块的第一行都是空白行
+            self.assertEqual(tile.image[0].min(), 255)
+            self.assertTrue((image[int(tile.y0):int(tile.y0) + 1] == tile.image[:1]).all())
+
+    def test_boxes_mapped_to_original(self):
+        """测试各块的文本框换算回原图坐标，文本按从上到下合并"""
+        tile = ocr.ImageTile(None, x0=10, y0=100, scale=0.5)
+        self.assertEqual(tile.to_original([[2, 4], [6, 8]]), [[14.0, 108.0], [22.0, 116.0]])
+
+        image = self._canvas(2400, 300, [(y, y + 30, 20, 280) for y in range(10, 2400, 50)])
+        processor = ocr.OCRProcessor(prefilter=False)
+        tiles = ocr.preprocess_image(image, processor.preprocess)
+        result = processor._recognize(image)
+        self.assertEqual(result.lines, ["识别文字"] * len(tiles))
+        self.assertEqual([box[0][1] for box in result.boxes], [t.y0 for t in tiles])
+        self.assertEqual(result.boxes[0][0][0], tiles[0].x0)
+
+    def test_disabled_passes_original_image(self):
+        """测试关闭预处理后引擎收到原图"""
+        image = self._canvas(400, 300, [(100, 120, 50, 250)])
+        processor = ocr.OCRProcessor(prefilter=False, preprocess=False)
+        self.assertIsNone(processor.preprocess)
+        with patch.object(FakePaddleOCR, "ocr", autospec=True, return_value=[("文字", 0.9)]) as mock_ocr:
+            self.assertEqual(processor._run_ocr(image), "文字")
+        self.assertIs(mock_ocr.call_args[0][1], image)
+
+    def test_grayscale_and_passthrough(self):
+        """测试灰度转换保持三通道，非数组输入原样返回"""
+        image = self._canvas(100, 100, [(40, 60, 10, 90)])
+        image[40:60, 10:90] = (255, 0, 0)
+        tile = ocr.preprocess_image(image, ocr.PreprocessConfig(grayscale=True))[0]
+        self.assertEqual(tile.image.ndim, 3)
+        self.assertTrue((tile.image[..., 0] == tile.image[..., 2]).all())
+        self.assertEqual(ocr.preprocess_image("x.jpg")[0].image, "x.jpg")
+
+
+class TestImageStore(OCRTestCase):
+    """测试共享的图片下载层"""
+
+    def test_concurrent_fetches_download_once(self):
+        """测试多个线程同时请求同一链接时只下载一次"""
+        calls = []
+
+        def fetcher(url):
+            calls.append(url)
+            time.sleep(0.05)
+            return url.encode("utf-8"), "image/jpeg"
+
+        store = ImageStore(fetcher=fetcher)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.fetch("https://x/1.jpg"))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(calls, ["https://x/1.jpg"])
+        self.assertEqual(results, [(b"https://x/1.jpg", "image/jpeg")] * 4)
+        self.assertEqual((store.downloads, store.hits), (1, 3))
+
+    def test_evicts_least_recently_used(self):
+        """测试超出字节上限时淘汰最久未使用的图片，失败不缓存"""
+        store = ImageStore(max_bytes=10, fetcher=lambda url: (b"x" * 4, "") if "ok" in url else None)
+        store.fetch("https://x/ok1")
+        store.fetch("https://x/ok2")
+        store.get("https://x/ok1")
+        store.fetch("https://x/ok3")
+        self.assertIn("https://x/ok1", store)
+        self.assertNotIn("https://x/ok2", store)
+        self.assertEqual(store.nbytes, 8)
+        self.assertIsNone(store.fetch("https://x/bad"))
+        self.assertIsNone(store.fetch("https://x/bad"))
+        self.assertEqual(store.stats()["failures"], 2)
+
+    def test_ocr_then_save_reuses_download(self):
+        """测试 OCR 下载过的图片，保存时不再下载"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(3)]
+        store = ImageStore()
+        with patch.object(ocr.requests, "get", _fake_get()), \
+                patch.object(ocr.OCRProcessor, "_ocr_downloaded_results", _fake_downloaded_results(str.upper)):
+            text = ocr.OCRProcessor(image_store=store).ocr_images(urls)
+        self.assertIn("[图片 3 OCR 结果]", text)
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(ocr.requests, "get", side_effect=AssertionError("不应下载")):
+            for i, url in enumerate(urls):
+                self.assertTrue(store.save(url, Path(tmp) / f"{i}.jpg"))
+            self.assertEqual(len(list(Path(tmp).iterdir())), 3)
+        self.assertEqual((store.downloads, store.hits), (3, 3))
+
+
+class FakeRapidOCR:
+    """模拟 rapidocr_onnxruntime.RapidOCR"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def __call__(self, image):
+        return [[[[0, 0], [9, 0], [9, 9], [0, 9]], "onnx文字", 0.95]], [0.01, 0.0, 0.02]
+
+
+class FakePytesseract:
+    """模拟 pytesseract：两行，第二行是两个英文单词"""
+
+    class Output:
+        DICT = "dict"
+
+    class pytesseract:
+        # 任意存在的可执行文件
+        tesseract_cmd = sys.executable
+
+    @staticmethod
+    def get_tesseract_version():
+        return "5.3.0"
+
+    @staticmethod
+    def image_to_data(image, lang=None, output_type=None):
+        return {
+            "text": ["", "面试", "题", "Redis", "cluster"],
+            "conf": [-1, 90, 80, 70, 50],
+            "block_num": [1, 1, 1, 1, 1],
+            "par_num": [1, 1, 1, 1, 1],
+            "line_num": [0, 1, 1, 2, 2],
+            "left": [0, 10, 40, 10, 60],
+            "top": [0, 10, 10, 40, 42],
+            "width": [0, 30, 10, 45, 50],
+            "height": [0, 20, 20, 20, 18],
+        }
+
+
+class TestOCRBackends(OCRTestCase):
+    """测试可插拔的 OCR 后端"""
+
+    def setUp(self):
+        super().setUp()
+        patchers = [
+            patch.object(ocr_backends, "RAPIDOCR_AVAILABLE", True),
+            patch.object(ocr_backends, "RapidOCR", FakeRapidOCR, create=True),
+            patch.object(ocr_backends, "PYTESSERACT_AVAILABLE", True),
+            patch.object(ocr_backends, "pytesseract", FakePytesseract, create=True),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_resolve_backend_name(self):
+        """测试参数 > 环境变量 > 第一个已安装的后端，未知名称报错"""
+        self.assertEqual(ocr_backends.resolve_backend_name("ONNX"), "onnx")
+        with patch.dict(os.environ, {ocr_backends.BACKEND_ENV_VAR: "tesseract"}):
+            self.assertEqual(ocr_backends.resolve_backend_name(), "tesseract")
+        with patch.dict(os.environ, {ocr_backends.BACKEND_ENV_VAR: ""}), \
+                patch.object(ocr_backends, "PADDLEOCR_AVAILABLE", False):
+            self.assertEqual(ocr_backends.resolve_backend_name(), "onnx")
+        with self.assertRaises(ValueError):
+            ocr_backends.resolve_backend_name("easyocr")
+
+    def test_onnx_backend(self):
+        """测试 ONNX Runtime 后端的结果转换、能力声明和缓存标识"""
+        processor = ocr.OCRProcessor(backend="onnx")
+        self.assertEqual(processor._run_ocr("x.jpg"), "onnx文字")
+        self.assertEqual(processor.recognize_batch(["a.jpg", "b.jpg"])[1].confidences, [0.95])
+        self.assertNotIn(ocr_backends.CAP_BATCH, processor.capabilities)
+        self.assertTrue(processor.engine_signature.startswith("onnx:ch:"))
+        # 与 paddle 后端的模型分别加载
+        self.assertEqual(FakePaddleOCR.instances, 0)
+        ocr.OCRProcessor(backend="onnx", use_lang="en")
+        self.assertEqual(len(ocr._ENGINES), 2)
+        with patch.object(ocr_backends.RapidOCRBackend, "languages", ("ch",)):
+            self.assertIsNone(ocr.OCRProcessor(backend="onnx", use_lang="korean").ocr_engine)
+
+    def test_tesseract_backend_groups_lines(self):
+        """测试 Tesseract 后端按行合并单词（中文不加空格），置信度换算到 0-1"""
+        result = ocr.OCRProcessor(backend="tesseract").recognize_batch(["x.jpg"])[0]
+        self.assertEqual(result.lines, ["面试题", "Redis cluster"])
+        self.assertEqual(result.confidences, [0.85, 0.6])
+        self.assertEqual(ocr.OCRProcessor(backend="tesseract").engine_signature, "tesseract:ch:5.3.0")
+
+    def test_tesseract_requires_binary(self):
+        """测试找不到 tesseract 可执行文件时不自动选择，创建时报 ImportError；不修改进程环境变量"""
+        with patch.dict(os.environ, {ocr_backends.BACKEND_ENV_VAR: ""}):
+            with patch.object(FakePytesseract.pytesseract, "tesseract_cmd", "/nonexistent/tesseract"), \
+                    patch.object(ocr_backends, "PADDLEOCR_AVAILABLE", False), \
+                    patch.object(ocr_backends, "RAPIDOCR_AVAILABLE", False):
+                self.assertEqual(ocr_backends.available_backends(), [])
+                with self.assertRaises(ImportError):
+                    ocr_backends.create_backend("tesseract", "ch")
+            environ = dict(os.environ)
+            ocr_backends.create_backend("tesseract", "ch", cpu_threads=3)
+            self.assertEqual(dict(os.environ), environ)
+
+    def test_unavailable_backend_disables_ocr(self):
+        """测试选择了未安装的后端时给出提示，不做识别"""
+        with patch.object(ocr_backends, "RAPIDOCR_AVAILABLE", False):
+            processor = ocr.OCRProcessor(backend="onnx")
+            self.assertFalse(ocr.warm_up_ocr(backend="onnx"))
+        self.assertIsNone(processor.ocr_engine)
+        self.assertEqual(processor._run_ocr("x.jpg"), "")
+
+    def test_compare_backends_uses_public_api(self):
+        """测试基准测试通过 recognize_batch 识别，结果与标注比较"""
+        from xhs_extractor_module.bench_ocr import compare_backends
+        with patch.object(ocr.OCRProcessor, "_recognize", side_effect=AssertionError("不应调用私有方法")):
+            rows = compare_backends(["a.jpg", "b.jpg"], ["onnx文字", None], ["onnx", "tesseract"], repeat=1)
+        self.assertEqual([row[0] for row in rows], ["onnx", "tesseract"])
+        self.assertEqual(rows[0][3], 1.0)
+
+    def test_char_accuracy(self):
+        """测试基准测试的字符准确率"""
+        from xhs_extractor_module.bench_ocr import char_accuracy
+        self.assertEqual(char_accuracy("面试 题", "面试题"), 1.0)
+        self.assertAlmostEqual(char_accuracy("面式题", "面试题"), 2 / 3)
+        self.assertEqual(char_accuracy("", "abc"), 0.0)
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "需要 fork 启动方式（工作进程继承模拟引擎）")
+class TestOCRPool(OCRTestCase):
+    """测试多进程 OCR 工作池（fork 方式启动，工作进程继承模拟引擎和模拟下载）"""
+
+    def setUp(self):
+        super().setUp()
+        patchers = [
+            patch.object(ocr.requests, "get", _fake_get()),
+            patch.object(
+                ocr.OCRProcessor, "_ocr_downloaded_results",
+                _fake_downloaded_results(lambda text: text.rsplit("/", 1)[-1]),
+            ),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.parent_omp = os.environ.get("OMP_NUM_THREADS")
+        self.pool = OCRPool(processes=2, threads_per_worker=1, mp_context="fork")
+        self.addCleanup(self.pool.terminate)
+
+    def test_ocr_images_matches_single_process(self):
+        """测试多进程识别与单进程输出一致"""
+        urls = [f"https://example.com/{i}.jpg" for i in range(6)]
+        self.assertEqual(self.pool.ocr_images(urls), ocr.OCRProcessor().ocr_images(urls))
+        note = Note(id="n", url="u", title="t", text="", images=urls)
+        self.assertEqual(ocr.extract_ocr_from_note(note, pool=self.pool), self.pool.ocr_images(urls))
+        results = list(ocr.iter_ocr_from_note(note, pool=self.pool, time_budget=30))
+        self.assertEqual([(r.index, r.status, r.text) for r in results], [(i, ocr.STATUS_OK, f"{i}.jpg") for i in range(6)])
+
+    def test_ocr_notes_streams_in_order(self):
+        """测试多篇笔记按输入顺序返回"""
+        notes = [
+            Note(id=str(n), url="u", title="t", text="", images=[f"https://example.com/{n}-{i}.jpg" for i in range(n)])
+            for n in range(5)
+        ]
+        results = list(self.pool.ocr_notes(notes))
+        self.assertEqual([note.id for note, _ in results], [note.id for note in notes])
+        self.assertEqual(results[0][1], "")
+        self.assertIn("[图片 3 OCR 结果]\n3-2.jpg", results[3][1])
+
+    def test_ocr_notes_bounds_inflight(self):
+        """测试输入很长时只提前读取有限篇笔记，提前停止后进程池仍可使用"""
+        pulled = []
+
+        def endless_notes():
+            for n in itertools.count():
+                pulled.append(n)
+                yield Note(id=str(n), url="u", title="t", text="", images=[f"https://example.com/{n}.jpg"])
+
+        results = self.pool.ocr_notes(endless_notes(), max_inflight=3)
+        first = [note.id for note, _ in itertools.islice(results, 5)]
+        time.sleep(0.2)
+        self.assertEqual(first, ["0", "1", "2", "3", "4"])
+        self.assertLessEqual(len(pulled), 5 + 3 + 1)
+        results.close()
+        urls = ["https://example.com/x.jpg"]
+        self.assertEqual(self.pool.ocr_images(urls), ocr.OCRProcessor().ocr_images(urls))
+
+    def test_worker_thread_env_is_pinned(self):
+        """测试工作进程的数学库线程数被限定，主进程环境不受影响"""
+        self.assertEqual(self.pool._pool.apply(os.getenv, ("OMP_NUM_THREADS",)), "1")
+        self.assertEqual(self.pool._pool.apply(os.getenv, ("MKL_NUM_THREADS",)), "1")
+        self.assertEqual(self.pool._pool.apply(os.getenv, ("OMP_THREAD_LIMIT",)), "1")
+        self.assertEqual(os.environ.get("OMP_NUM_THREADS"), self.parent_omp)
+
+
+class TestParseOcrOutput(unittest.TestCase):
+    """测试识别结果解析"""
+
+    def test_tuple_format_with_confidence(self):
+        texts, confidences, boxes = ocr._parse_ocr_output(
+            [[[[0, 0], [1, 1]], ("第一行", 0.9)], [[[0, 0]], ("/tmp/x", 0.8)]]
+        )
+        self.assertEqual(texts, ["第一行"])
+        self.assertEqual(confidences, [0.9])
+        self.assertEqual(boxes, [[[0.0, 0.0], [1.0, 1.0]]])
+
+    def test_rec_texts_format(self):
+        import numpy as np
+        texts, confidences, boxes = ocr._parse_ocr_output([{
+            "rec_texts": ["甲", "乙"], "rec_scores": [0.7, 0.6], "input_path": None,
+            "rec_polys": [np.array([[0, 0], [4, 0], [4, 2], [0, 2]]), None],
+        }])
+        self.assertEqual(texts, ["甲", "乙"])
+        self.assertEqual(confidences, [0.7, 0.6])
+        self.assertEqual(boxes, [[[0.0, 0.0], [4.0, 0.0], [4.0, 2.0], [0.0, 2.0]], None])
+
+
+if __name__ == "__main__":
+    unittest.main()
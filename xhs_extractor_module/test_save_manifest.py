@@ -0,0 +1,85 @@
+# test_save_manifest.py
+"""
+测试 save_manifest 模块
+"""
+import json
+import unittest
+import tempfile
+from pathlib import Path
+
+from xhs_extractor_module.image_download import SavedImage
+from xhs_extractor_module.save_manifest import MANIFEST_NAME, NoteManifest
+
+
+URL = "https://sns-webpic-qc.xhscdn.com/202401/abc/" + "f" * 32 + "!nd_dft_wlteh_webp_3"
+NEW_URL = "https://sns-webpic-qc.xhscdn.com/202402/xyz/" + "f" * 32 + "!nd_dft_wgth_webp_3"
+
+
+class TestSaveManifest(unittest.TestCase):
+    """测试笔记文件夹的保存清单"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _saved_image(self, data=b"image", etag='"e1"'):
+        path = self.dir / "image_001.webp"
+        path.write_bytes(data)
+        return SavedImage(0, URL, path=path, nbytes=len(data), digest="d1", etag=etag)
+
+    def test_markdown_unchanged(self):
+        """测试 Markdown 内容相同且文件仍在时判定未变化"""
+        manifest = NoteManifest(self.dir)
+        (self.dir / "a.md").write_text("# 标题", encoding="utf-8")
+        manifest.set_markdown("a.md", "# 标题")
+        self.assertTrue(manifest.markdown_unchanged("a.md", "# 标题"))
+        self.assertFalse(manifest.markdown_unchanged("a.md", "# 新标题"))
+        (self.dir / "a.md").unlink()
+        self.assertFalse(manifest.markdown_unchanged("a.md", "# 标题"))
+
+    def test_current_image_and_validator(self):
+        """测试来源相同时不需要请求，来源变化时使用 ETag 条件请求"""
+        manifest = NoteManifest(self.dir)
+        manifest.update_images([self._saved_image()])
+        current = manifest.current_image(0, URL)
+        self.assertTrue(current.unchanged)
+        self.assertEqual((current.path.name, current.digest, current.etag), ("image_001.webp", "d1", '"e1"'))
+        # 同一图片ID的其他规格不算同一来源
+        self.assertIsNone(manifest.current_image(0, NEW_URL))
+        self.assertEqual(manifest.validator(0).etag, '"e1"')
+        self.assertIsNone(manifest.current_image(1, URL))
+        # 文件被修改（大小不同）后重新下载
+        (self.dir / "image_001.webp").write_bytes(b"changed!")
+        self.assertIsNone(manifest.current_image(0, URL))
+        self.assertIsNone(manifest.validator(0))
+
+    def test_not_modified_keeps_digest(self):
+        """测试 304 时沿用之前的内容哈希，失败的图片清除记录"""
+        manifest = NoteManifest(self.dir)
+        manifest.update_images([self._saved_image()])
+        not_modified = SavedImage(0, NEW_URL, path=self.dir / "image_001.webp", nbytes=5, etag='"e1"', unchanged=True)
+        manifest.update_images([not_modified, SavedImage(1, URL, error="404")])
+        self.assertEqual(manifest.images[0]["sha256"], "d1")
+        self.assertEqual(manifest.images[0]["url"], NEW_URL)
+        self.assertIsNone(manifest.images[1])
+
+    def test_save_only_when_changed(self):
+        """测试清单没有变化时不重新写入"""
+        manifest = NoteManifest(self.dir)
+        manifest.note_id = "n1"
+        manifest.update_images([self._saved_image()])
+        self.assertTrue(manifest.save())
+        loaded = NoteManifest.load(self.dir)
+        self.assertEqual(loaded.note_id, "n1")
+        self.assertIsNotNone(loaded.current_image(0, URL))
+        loaded.update_images([loaded.current_image(0, URL)])
+        self.assertFalse(loaded.save())
+        (self.dir / MANIFEST_NAME).write_text(json.dumps({"version": 0}), encoding="utf-8")
+        self.assertEqual(NoteManifest.load(self.dir).images, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
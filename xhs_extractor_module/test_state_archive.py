@@ -0,0 +1,71 @@
+# test_state_archive.py
+"""
+测试 state_archive 模块
+"""
+import unittest
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from xhs_extractor_module.state_archive import StateArchive
+
+
+def _make_state(note_id: str, title: str) -> dict:
+    return {
+        "global": {"appSettings": {"large": "x" * 100}},
+        "note": {
+            "firstNoteId": note_id,
+            "noteDetailMap": {
+                note_id: {"note": {"noteId": note_id, "title": title, "desc": "正文", "imageList": []}}
+            },
+        },
+    }
+
+
+class TestStateArchive(unittest.TestCase):
+    """测试原始数据归档与离线重新解析"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = StateArchive(Path(self.tmp.name) / "archive")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_is_content_addressed(self):
+        """测试相同内容只保存一份"""
+        state = _make_state("a1", "标题")
+        d1 = self.archive.put(state, "https://www.xiaohongshu.com/explore/a1", note_id="a1")
+        d2 = self.archive.put(state, "https://www.xiaohongshu.com/explore/a1", note_id="a1")
+        self.assertEqual(d1, d2)
+        self.assertEqual(len(list(self.archive.objects_dir.rglob("*.json*"))), 1)
+        self.assertEqual(len(list(self.archive.iter_index())), 2)
+        fetched_at = datetime.fromisoformat(next(self.archive.iter_index())["fetched_at"])
+        self.assertEqual(fetched_at.utcoffset(), timedelta(0))
+
+    def test_note_scope_keeps_only_subtree(self):
+        """测试 note 范围只保存笔记子树"""
+        digest = self.archive.put(_make_state("a1", "标题"), "u", note_id="a1")
+        state, url = self.archive.get(digest)
+        self.assertNotIn("global", state)
+        self.assertEqual(url, "u")
+
+    def test_unrecognized_state_falls_back_to_full(self):
+        """测试找不到笔记结构时保存完整 state"""
+        self.archive.put({"other": {"x": 1}}, "u")
+        entry = next(self.archive.iter_index())
+        self.assertEqual(entry["scope"], "full")
+
+    def test_reparse_latest_only(self):
+        """测试离线重新解析，同一笔记只取最近一次"""
+        self.archive.put(_make_state("a1", "旧标题"), "u1", note_id="a1")
+        self.archive.put(_make_state("b2", "另一篇"), "u2", note_id="b2")
+        self.archive.put(_make_state("a1", "新标题"), "u1", note_id="a1")
+
+        notes = list(self.archive.reparse(workers=1))
+        self.assertEqual([(n.id, n.title) for n in notes], [("b2", "另一篇"), ("a1", "新标题")])
+        self.assertEqual(len(list(self.archive.reparse(workers=1, latest_only=False))), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# test_xhs_batch.py
+"""
+测试 xhs_batch 模块
+"""
+import time
+import itertools
+import unittest
+import tempfile
+from pathlib import Path
+
+from xhs_extractor_module.xhs_batch import (
+    save_state_dump,
+    load_state_dump,
+    iter_state_files,
+    parse_states_parallel,
+)
+
+
+def _make_state(note_id: str, title: str) -> dict:
+    return {
+        "note": {
+            "firstNoteId": note_id,
+            "noteDetailMap": {
+                note_id: {
+                    "note": {
+                        "noteId": note_id,
+                        "title": title,
+                        "desc": f"{title} 的正文",
+                        "imageList": [{"url": f"https://example.com/{note_id}.jpg"}],
+                    }
+                }
+            },
+        }
+    }
+
+
+class TestXhsBatch(unittest.TestCase):
+    """测试 state dump 批量解析"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dump_roundtrip_gzip(self):
+        """测试 gzip 压缩的 dump 读写"""
+        state = _make_state("a1", "标题")
+        path = save_state_dump(state, "https://www.xiaohongshu.com/explore/a1", self.dir / "a1.json.gz")
+        loaded, url = load_state_dump(path)
+        self.assertEqual(loaded, state)
+        self.assertEqual(url, "https://www.xiaohongshu.com/explore/a1")
+
+    def test_parse_parallel_keeps_order(self):
+        """测试多进程解析结果保持输入顺序"""
+        paths = []
+        for i in range(20):
+            note_id = f"{i:04x}"
+            suffix = ".json.gz" if i % 2 else ".json"
+            paths.append(save_state_dump(_make_state(note_id, f"笔记{i}"), "", self.dir / f"{i:03d}{suffix}"))
+
+        stats = {}
+        notes = list(parse_states_parallel(paths, workers=2, chunksize=3, stats=stats))
+
+        self.assertEqual([n.id for n in notes], [f"{i:04x}" for i in range(20)])
+        self.assertEqual(notes[5].title, "笔记5")
+        self.assertEqual(stats["total"], 20)
+        self.assertEqual(stats["failed"], 0)
+
+    def test_parse_parallel_bounds_inflight(self):
+        """测试调用方处理得慢时只提前读取有限个文件，提前停止不会卡住"""
+        path = save_state_dump(_make_state("d1", "x"), "", self.dir / "d1.json")
+        pulled = []
+
+        def endless_paths():
+            for n in itertools.count():
+                pulled.append(n)
+                yield path
+
+        notes = parse_states_parallel(endless_paths(), workers=2, chunksize=2, max_inflight=4, report_every=0)
+        first = [note.id for note in itertools.islice(notes, 5)]
+        time.sleep(0.2)
+        self.assertEqual(first, ["d1"] * 5)
+        self.assertLessEqual(len(pulled), 5 + 4 + 1)
+        notes.close()
+
+    def test_parse_skips_broken_files(self):
+        """测试损坏的文件被跳过而不是中断整个批次"""
+        good = save_state_dump(_make_state("b1", "正常"), "", self.dir / "good.json")
+        broken = self.dir / "broken.json"
+        broken.write_text("{not json", encoding="utf-8")
+
+        stats = {}
+        notes = list(parse_states_parallel([broken, good], workers=1, stats=stats))
+
+        self.assertEqual([n.id for n in notes], ["b1"])
+        self.assertEqual(stats["failed"], 1)
+
+    def test_iter_state_files_directory(self):
+        """测试目录展开只包含 dump 文件"""
+        save_state_dump(_make_state("c1", "x"), "", self.dir / "sub" / "c1.json.gz")
+        (self.dir / "sub" / "notes.txt").write_text("ignored", encoding="utf-8")
+        files = list(iter_state_files([self.dir]))
+        self.assertEqual([p.name for p in files], ["c1.json.gz"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -113,6 +113,50 @@ class TestParseNoteFromState(unittest.TestCase):
         self.assertIn("https://example.com/img4.jpg", note.images)
         self.assertIn("https://example.com/img5.jpg", note.images)
         self.assertIn("https://example.com/img6.jpg", note.images)
+    
+    def test_parse_image_variants(self):
+        """测试保留每张图片的全部 CDN 规格，OCR 用预览图，保存用原图"""
+        prv = "http://sns-webpic-qc.xhscdn.com/202401/abc/1040g2sg30abcdefghijk!nd_prv_wlteh_webp_3"
+        dft = "http://sns-webpic-qc.xhscdn.com/202401/abc/1040g2sg30abcdefghijk!nd_dft_wlteh_webp_3"
+        origin = "https://ci.xiaohongshu.com/1040g2sg30abcdefghijk"
+        state = {
+            "note": {
+                "firstNoteId": "note999",
+                "noteDetailMap": {
+                    "note999": {
+                        "note": {
+                            "noteId": "note999",
+                            "title": "测试",
+                            "desc": "内容",
+                            "imageList": [
+                                {
+                                    "width": 1080,
+                                    "height": 1440,
+                                    "urlDefault": dft,
+                                    "urlPre": prv,
+                                    "originUrl": origin,
+                                    "infoList": [
+                                        {"imageScene": "WB_PRV", "url": prv},
+                                        {"imageScene": "WB_DFT", "url": dft},
+                                    ],
+                                },
+                                "https://example.com/plain.jpg",
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+        
+        note = _parse_note_from_state(state, "https://www.xiaohongshu.com/explore/note999")
+        
+        # images 保持原来的选择逻辑
+        self.assertEqual(note.images, [origin, "https://example.com/plain.jpg"])
+        self.assertEqual(len(note.image_variants), 2)
+        scenes = {v["scene"]: v["url"] for v in note.image_variants[0]["variants"]}
+        self.assertEqual(scenes, {"WB_PRV": prv, "WB_DFT": dft, "ORIGIN": origin})
+        self.assertEqual(note.ocr_image_urls(), [prv, "https://example.com/plain.jpg"])
+        self.assertEqual(note.archive_image_urls(), [origin, "https://example.com/plain.jpg"])
 
 
 class TestFetchNoteIntegration(unittest.TestCase):
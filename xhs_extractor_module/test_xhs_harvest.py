@@ -0,0 +1,90 @@
+# test_xhs_harvest.py
+"""
+测试 xhs_harvest 模块
+"""
+import io
+import tracemalloc
+import unittest
+
+from xhs_extractor_module.xhs_harvest import harvest_share_links, BoundedSeenSet, MAX_URL_CHARS
+
+CHAT_EXPORT = (
+    "2024-11-16 10:01 张三: 算法面经：字节大模型Agent 11.16 一面： 请介绍 Tran... "
+    "http://xhslink.com/o/EEfBYaRn4M 复制后打开【小红书】查看笔记！\n"
+    "2024-11-16 10:02 李四: 好的\n"
+    "2024-11-16 10:03 王五: 美团后端二面 https://www.xiaohongshu.com/explore/64f0c2a1000000001f03b7a2?xsec_token=T&xhsshare=CopyLink，"
+    "还有这个 https://www.xiaohongshu.com/discovery/item/64f0c2a1000000001f03b7a2 重复的\n"
+    "无关链接 https://example.com/page\n"
+    "再发一次 http://xhslink.com/o/EEfBYaRn4M?appuid=1 复制后打开【小红书】查看笔记！"
+)
+
+
+class TestXhsHarvest(unittest.TestCase):
+    """测试流式链接收集"""
+
+    def _harvest(self, text, chunk_size, **kwargs):
+        return list(harvest_share_links(io.StringIO(text), chunk_size=chunk_size, **kwargs))
+
+    def test_harvest_with_titles(self):
+        """测试提取链接和标题并去重"""
+        links = self._harvest(CHAT_EXPORT, chunk_size=1 << 16)
+        self.assertEqual(len(links), 2)
+        self.assertEqual(links[0].url, "http://xhslink.com/o/EEfBYaRn4M")
+        self.assertIsNone(links[0].note_id)
+        self.assertTrue(links[0].title.endswith("请介绍 Tran"))
+        self.assertEqual(links[1].note_id, "64f0c2a1000000001f03b7a2")
+        self.assertEqual(links[1].url, "https://www.xiaohongshu.com/explore/64f0c2a1000000001f03b7a2?xsec_token=T")
+        self.assertTrue(links[1].title.endswith("美团后端二面"))
+
+    def test_chunk_boundaries(self):
+        """测试任意块大小结果都一致（链接跨块边界）"""
+        expected = self._harvest(CHAT_EXPORT, chunk_size=1 << 16, dedupe=False)
+        self.assertEqual(len(expected), 4)
+        for chunk_size in (1, 3, 7, 16, 31):
+            self.assertEqual(self._harvest(CHAT_EXPORT, chunk_size=chunk_size, dedupe=False), expected, chunk_size)
+
+    def test_huge_token_without_separators(self):
+        """测试没有分隔符的超长“链接”被整段丢弃，内存不随它增长，之后的链接不受影响"""
+        text = "垃圾数据 http://" + "a" * (4 << 20) + "\n标题 http://xhslink.com/o/EEfBYaRn4M 复制后打开【小红书】查看笔记！"
+        stream = io.StringIO(text)
+        tracemalloc.start()
+        try:
+            links = list(harvest_share_links(stream, chunk_size=1 << 16))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual([(link.url, link.title) for link in links], [("http://xhslink.com/o/EEfBYaRn4M", "标题")])
+        self.assertLess(peak, 1 << 20)
+
+        # 块内完整出现的超长链接同样丢弃，结果与块大小无关
+        text = "a http://" + "b" * (MAX_URL_CHARS + 10) + "http://xhslink.com/o/x1 后面 标题 http://xhslink.com/o/x2"
+        for chunk_size in (7, 100, 1 << 16):
+            links = self._harvest(text, chunk_size=chunk_size)
+            self.assertEqual([(link.url, link.title) for link in links], [("http://xhslink.com/o/x2", "后面 标题")])
+
+    def test_malformed_link_is_skipped(self):
+        """测试格式错误的链接被跳过并计数，之后的链接照常收集"""
+        stats = {}
+        links = list(harvest_share_links(io.StringIO("hello https://[oops world 小红书 http://xhslink.com/o/A1 ok"),
+                                         stats=stats))
+        self.assertEqual([(link.url, link.title) for link in links], [("http://xhslink.com/o/A1", "world 小红书")])
+        self.assertEqual(stats, {"links": 1, "duplicates": 0, "skipped": 1})
+
+        stats = {}
+        self._harvest(CHAT_EXPORT, chunk_size=7, stats=stats)
+        self.assertEqual(stats, {"links": 2, "duplicates": 2, "skipped": 1})
+
+    def test_bounded_seen_set(self):
+        """测试去重集合容量上限"""
+        seen = BoundedSeenSet(max_size=2)
+        self.assertTrue(seen.add("a"))
+        self.assertTrue(seen.add("b"))
+        self.assertFalse(seen.add("a"))
+        self.assertTrue(seen.add("c"))  # 淘汰 b
+        self.assertEqual(len(seen), 2)
+        self.assertNotIn("b", seen)
+        self.assertIn("a", seen)
+
+
+if __name__ == "__main__":
+    unittest.main()
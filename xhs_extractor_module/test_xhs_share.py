@@ -39,6 +39,11 @@ class TestXhsShare(unittest.TestCase):
         url = extract_xhs_url_from_share_text(text)
         self.assertTrue(url.startswith("https://www.xiaohongshu.com"))
     
+    def test_malformed_url(self):
+        """测试无法解析的链接原样返回，不抛出异常"""
+        url = extract_xhs_url_from_share_text("内容 https://[oops 复制后打开")
+        self.assertEqual(url, "https://[oops")
+    
     def test_no_url_found(self):
         """测试没有URL的情况"""
         text = "这是一段没有链接的文本"
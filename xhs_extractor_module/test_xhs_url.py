@@ -0,0 +1,92 @@
+# test_xhs_url.py
+"""
+测试 xhs_url 模块
+"""
+import unittest
+from xhs_extractor_module.xhs_url import (
+    extract_note_id,
+    canonicalize_url,
+    canonicalize_many,
+    strip_tracking_params,
+    is_short_link,
+    extract_urls_from_text,
+    image_id_from_url,
+)
+
+NOTE_ID = "64f0c2a1000000001f03b7a2"
+USER_ID = "5b1e2f3a4c5d6e7f8a9b0c1d"
+
+
+class TestXhsUrl(unittest.TestCase):
+    """测试链接规范化"""
+
+    def test_extract_note_id_forms(self):
+        """测试各种链接形式都能提取到同一个 note_id"""
+        urls = [
+            f"https://www.xiaohongshu.com/explore/{NOTE_ID}",
+            f"https://www.xiaohongshu.com/explore/{NOTE_ID}?xsec_token=abc&xsec_source=pc_share",
+            f"https://www.xiaohongshu.com/discovery/item/{NOTE_ID}?app_platform=ios&share_from_user_hidden=true",
+            f"https://www.xiaohongshu.com/user/profile/{USER_ID}/{NOTE_ID}",
+            f"www.xiaohongshu.com/explore/{NOTE_ID}",
+        ]
+        for url in urls:
+            self.assertEqual(extract_note_id(url), NOTE_ID, url)
+
+    def test_short_link(self):
+        """测试短链接不能离线提取 note_id"""
+        url = "http://xhslink.com/o/EEfBYaRn4M"
+        self.assertTrue(is_short_link(url))
+        self.assertIsNone(extract_note_id(url))
+        self.assertEqual(canonicalize_url(url + "?appuid=1"), "https://xhslink.com/o/EEfBYaRn4M")
+
+    def test_canonicalize_agrees_across_forms(self):
+        """测试不同形式得到同一个规范链接"""
+        expected = f"https://www.xiaohongshu.com/explore/{NOTE_ID}"
+        self.assertEqual(canonicalize_url(f"http://xiaohongshu.com/discovery/item/{NOTE_ID}?xhsshare=WeixinSession"), expected)
+        self.assertEqual(canonicalize_url(f"https://www.xiaohongshu.com/user/profile/{USER_ID}/{NOTE_ID}#comments"), expected)
+        self.assertIsNone(canonicalize_url("https://example.com/explore/abc"))
+
+    def test_strip_tracking_keeps_access_token(self):
+        """测试去掉追踪参数但保留 xsec_token"""
+        url = f"https://www.xiaohongshu.com/explore/{NOTE_ID}?xsec_token=T1&xhsshare=CopyLink&appuid=9&apptime=1&xsec_source=app_share"
+        self.assertEqual(
+            strip_tracking_params(url),
+            f"https://www.xiaohongshu.com/explore/{NOTE_ID}?xsec_token=T1&xsec_source=app_share",
+        )
+        self.assertEqual(strip_tracking_params("https://example.com/?a=1"), "https://example.com/?a=1")
+
+    def test_canonicalize_many(self):
+        """测试批量规范化保持顺序"""
+        urls = [f"https://www.xiaohongshu.com/explore/{NOTE_ID}?a=1", "bad", f"https://www.xiaohongshu.com/explore/{NOTE_ID}?a=1"]
+        self.assertEqual(
+            canonicalize_many(urls),
+            [f"https://www.xiaohongshu.com/explore/{NOTE_ID}", None, f"https://www.xiaohongshu.com/explore/{NOTE_ID}"],
+        )
+
+    def test_extract_urls_from_text(self):
+        """测试提取文本中全部链接"""
+        text = "第一篇 http://xhslink.com/o/A1，第二篇 https://xhslink.com/o/B2）结束"
+        self.assertEqual(extract_urls_from_text(text), ["http://xhslink.com/o/A1", "https://xhslink.com/o/B2"])
+
+    def test_image_id_from_url(self):
+        """测试图片ID不受时间戳目录和规格后缀影响"""
+        a = "https://sns-webpic-qc.xhscdn.com/202401011200/abc/1040g2sg30abcdefghijk!nd_dft_wlteh_webp_3"
+        b = "http://sns-webpic-qc.xhscdn.com/202402021200/def/1040g2sg30abcdefghijk!nd_prv_wlteh_webp_3"
+        self.assertEqual(image_id_from_url(a), "xhs:1040g2sg30abcdefghijk")
+        self.assertEqual(image_id_from_url(a), image_id_from_url(b))
+        self.assertEqual(image_id_from_url("https://example.com/a.jpg?x=1"), "https://example.com/a.jpg")
+
+    def test_malformed_urls(self):
+        """测试无法拆分的链接（不完整的 IPv6 主机）按无法识别处理，不抛出异常"""
+        for url in ("https://[abc", "https://[x/explore/abc", "xhslink.com]/o/A1["):
+            self.assertIsNone(extract_note_id(url))
+            self.assertIsNone(canonicalize_url(url))
+            self.assertFalse(is_short_link(url))
+            self.assertEqual(strip_tracking_params(url), url)
+            self.assertEqual(image_id_from_url(url), url)
+        self.assertEqual(canonicalize_many(["https://[abc", f"https://www.xiaohongshu.com/explore/{NOTE_ID}"]),
+                         [None, f"https://www.xiaohongshu.com/explore/{NOTE_ID}"])
+
+
+if __name__ == "__main__":
+    unittest.main()
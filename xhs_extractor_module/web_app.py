@@ -5,12 +5,14 @@
 """
 from __future__ import annotations
 
-import os
 import re
 import json
 import sys
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 # 添加项目根目录到路径，确保可以导入模块
 project_root = Path(__file__).parent.parent
@@ -22,8 +24,20 @@ import streamlit as st
 from xhs_extractor_module.xhs_fetch import fetch_note_from_url, fetch_note_from_share_text
 from xhs_extractor_module.xhs_share import extract_xhs_url_from_share_text
 from xhs_extractor_module.xhs_login import check_login_state_exists, STATE_PATH
-from xhs_extractor_module.ocr import OCRProcessor, extract_ocr_from_note
+from xhs_extractor_module.ocr import (
+    OCRProcessor, iter_ocr_from_note, merge_ocr_results, warm_up_ocr, _download_image_for_ocr, decode_image_bytes,
+    STATUS_TIMEOUT,
+)
+from xhs_extractor_module.ocr_cache import get_default_ocr_cache
+from xhs_extractor_module.image_dedup import fingerprint, get_default_dedup_index
+from xhs_extractor_module.image_store import ImageStore
+from xhs_extractor_module.image_download import ImageDownloader, SavedImage, atomic_copy, atomic_write_bytes
+from xhs_extractor_module.blob_store import BlobStore
+from xhs_extractor_module.save_manifest import NoteManifest
+from xhs_extractor_module.note_search import SEARCH_INDEX_NAME, SearchIndex
+from xhs_extractor_module.ocr_backends import available_backends
 from xhs_extractor_module.models import Note
+from xhs_extractor_module.xhs_url import image_id_from_url
 
 
 def sanitize_filename(filename: str) -> str:
@@ -41,57 +55,169 @@ def sanitize_filename(filename: str) -> str:
     return filename
 
 
-def download_image(image_url: str, save_path: Path) -> bool:
-    """下载单张图片"""
+def reuse_duplicate_image(
+    preview_url: str,
+    save_stem: Path,
+    dedup,
+    image_store: Optional[ImageStore] = None,
+    blob_store: Optional[BlobStore] = None,
+) -> Tuple[Optional[Path], Optional[tuple]]:
+    """
+    已保存过同一张图片时直接复制，跳过原图下载：图片ID相同时直接复用；
+    否则用较小的预览图计算感知哈希，近似重复的候选还要通过缩略图校验（同一模板的不同截图哈希几乎一样）
+    
+    Args:
+        save_stem: 保存路径（不含扩展名，复制时沿用已有文件的扩展名）
+        blob_store: 指定时通过内容寻址存储硬链接，而不是复制
+    
+    Returns:
+        (复制得到的文件或 None, 用于之后写入索引的 Fingerprint，按图片ID命中时为 None)
+    """
+    key = None
+    match = dedup.find_exact(image_id=image_id_from_url(preview_url), require="file")
+    if match is None:
+        if image_store is not None:
+            downloaded = image_store.fetch(preview_url)
+        else:
+            downloaded = _download_image_for_ocr(preview_url)
+        image = decode_image_bytes(downloaded[0]) if downloaded else None
+        if image is None:
+            return None, None
+        key = fingerprint(image)
+        match = dedup.find(key.hash, aspect=key.aspect, require="file", thumb=key.thumb)
+    if match is None:
+        return None, key
+    save_path = save_stem.with_suffix(Path(match.file).suffix or ".jpg")
     try:
-        import requests
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-            'Referer': 'https://www.xiaohongshu.com/',
-        }
-        
-        response = requests.get(image_url, headers=headers, timeout=30, stream=True)
-        response.raise_for_status()
-        
-        # 确定文件扩展名
-        content_type = response.headers.get('Content-Type', '').lower()
-        if 'png' in content_type:
-            ext = '.png'
-        elif 'gif' in content_type:
-            ext = '.gif'
-        elif 'webp' in content_type:
-            ext = '.webp'
+        if blob_store is not None:
+            blob_store.link_file(match.file, save_path)
         else:
-            ext = '.jpg'
-        
-        # 从URL提取文件名（如果有）
-        url_filename = os.path.basename(image_url).split('?')[0]
-        if url_filename and '.' in url_filename:
-            ext = os.path.splitext(url_filename)[1]
-        
-        # 保存文件
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        return True
-    except Exception as e:
-        st.error(f"下载图片失败 {image_url[:50]}...: {e}")
-        return False
+            atomic_copy(match.file, save_path)
+    except OSError:
+        return None, key
+    return save_path, key
+
+
+def save_images(
+    note: Note,
+    save_dir: Path,
+    image_store: Optional[ImageStore] = None,
+    on_progress=None,
+    blob_store: Optional[BlobStore] = None,
+    manifest: Optional[NoteManifest] = None,
+    use_dedup: bool = False,
+) -> List[SavedImage]:
+    """
+    并发保存笔记的全部原图（启用 use_dedup 时，重复的图片直接复制之前保存的文件）
+    
+    Args:
+        on_progress: 进度回调 (已完成张数, 总张数, 已保存字节数)，在调用线程中执行
+        blob_store: 按内容寻址的存储，指定时图片只在其中保存一份，笔记文件夹中是硬链接，
+                    并在清单中记录笔记与图片的对应关系
+        manifest: 笔记文件夹的保存清单，上次保存后没有变化的图片不再请求；
+                  链接变化时用之前的 ETag 发送条件请求
+        use_dedup: 是否查找之前保存过的同一张图片（见 reuse_duplicate_image）
+    
+    Returns:
+        按图片顺序排列的 SavedImage 列表
+    """
+    archive_urls = note.archive_image_urls()
+    preview_urls = note.ocr_image_urls()
+    dedup = get_default_dedup_index() if use_dedup else None
+    keys = {}
+    
+    def prepare(index: int, url: str, dest_dir: Path, stem: str) -> Optional[SavedImage]:
+        if manifest is not None:
+            current = manifest.current_image(index, url)
+            if current is not None:
+                return current
+        if dedup is None:
+            return None
+        # 共享下载层中已有原图时直接用它计算哈希，不再下载预览图
+        hash_url = url if image_store is not None and url in image_store else preview_urls[index]
+        path, keys[index] = reuse_duplicate_image(hash_url, dest_dir / stem, dedup, image_store, blob_store)
+        if path is None:
+            return None
+        digest = blob_store.put_file(path).digest if blob_store is not None else None
+        return SavedImage(index, url, path=path, nbytes=path.stat().st_size, reused=True, digest=digest)
+    
+    validators = {}
+    if manifest is not None:
+        validators = {i: manifest.validator(i) for i in range(len(archive_urls))}
+        validators = {i: v for i, v in validators.items() if v is not None}
+    with ImageDownloader(image_store=image_store, blob_store=blob_store) as downloader:
+        saved = downloader.download_all(
+            archive_urls, save_dir, on_progress=on_progress, prepare=prepare, validators=validators,
+        )
+    for item in saved:
+        if item.ok and not item.reused and keys.get(item.index) is not None:
+            key = keys[item.index]
+            try:
+                dedup.remember(
+                    key.hash, key.aspect, content_hash=item.digest, image_id=image_id_from_url(item.url),
+                    file=str(item.path.resolve()), thumb=key.thumb,
+                )
+            except (sqlite3.Error, OSError) as e:
+                # 只是去重记录，图片已经保存好
+                st.warning(f"写入去重索引失败: {e}")
+    if blob_store is not None and not all(item.unchanged for item in saved):
+        blob_store.record_note_files(note.id, [(item.path, item.digest, item.url) for item in saved if item.digest])
+    return saved
+
+
+def render_note_markdown(note: Note, saved: List[SavedImage], use_ocr: bool = False) -> str:
+    """
+    渲染笔记的 Markdown（标题、正文、OCR 文本、图片引用）
+    
+    Args:
+        saved: 已保存的图片，成功的图片引用本地文件，其余图片保留链接
+    """
+    md_content = f"# {note.title}\n\n"
+    md_content += f"**链接**: {note.url}\n\n"
+    md_content += f"**笔记ID**: {note.id}\n\n"
+    md_content += "---\n\n"
+    md_content += "## 正文\n\n"
+    md_content += note.text + "\n\n"
+    
+    # 如果有OCR文本，添加
+    if use_ocr and note.ocr_text:
+        md_content += "---\n\n"
+        md_content += "## 图片文字识别\n\n"
+        md_content += note.ocr_text + "\n\n"
+    
+    # 如果有图片，添加图片引用（下载失败的图片保留链接）
+    if note.images:
+        md_content += "---\n\n"
+        md_content += "## 图片\n\n"
+        for i, img_url in enumerate(note.archive_image_urls(), 1):
+            item = saved[i - 1] if i <= len(saved) else None
+            if item is not None and item.ok:
+                md_content += f"![图片 {i}]({item.path.name})\n\n"
+            else:
+                md_content += f"- [图片 {i}]({img_url})\n\n"
+    return md_content
 
 
 def save_note_to_local(
     note: Note,
     base_dir: Path,
     download_images: bool = False,
-    use_ocr: bool = False
+    use_ocr: bool = False,
+    image_store: Optional[ImageStore] = None,
+    use_dedup: bool = False,
 ) -> dict:
     """
     保存笔记到本地
     
+    增量保存：笔记文件夹中的 .xhs_manifest.json 记录上次保存的内容，
+    Markdown 没有变化时不写入，图片没有变化时不下载（见 save_manifest）。
+    
+    Args:
+        image_store: 共享的图片下载层，OCR/预览已经下载过的原图直接写出，不再重复下载
+        use_dedup: 是否复用之前保存过的同一张图片（见 save_images）
+    
     Returns:
-        dict: 包含保存结果的字典
+        dict: 包含保存结果的字典（unchanged 为内容未变化、跳过写入的文件数）
     """
     # 清理标题作为文件夹名
     folder_name = sanitize_filename(note.title)
@@ -102,78 +228,120 @@ def save_note_to_local(
         "success": True,
         "folder": str(save_dir),
         "files": [],
-        "errors": []
+        "errors": [],
+        "unchanged": 0,
     }
     
-    # 1. 保存笔记正文为MD文件
+    manifest = NoteManifest.load(save_dir)
+    manifest.note_id = note.id
+    # 保存到本地使用原图（没有规格信息时与 note.images 相同）
+    archive_urls = note.archive_image_urls()
+    
+    # 1. 并发下载图片（如果启用）；先下载，正文中才能引用实际的文件名（扩展名取决于图片格式）
+    saved: List[SavedImage] = []
+    if download_images and note.images:
+        current = [manifest.current_image(i, url) for i, url in enumerate(archive_urls)]
+        if all(current):
+            # 与上次保存时完全相同：不打开存储、不发任何请求
+            saved = current
+            st.info(f"{len(saved)} 张图片与上次保存时相同，已跳过")
+        else:
+            st.info(f"正在下载 {len(archive_urls)} 张图片...")
+            progress_bar = st.progress(0.0)
+            
+            def on_progress(done: int, total: int, nbytes: int):
+                progress_bar.progress(done / total, text=f"已完成 {done}/{total} 张（{nbytes / 1024 / 1024:.1f} MB）")
+            
+            # 图片按内容只在 保存目录/.xhs_blobs 中存一份，笔记文件夹中是硬链接
+            blob_store = BlobStore.for_save_dir(base_dir)
+            start = time.perf_counter()
+            try:
+                saved = save_images(
+                    note, save_dir, image_store=image_store, on_progress=on_progress,
+                    blob_store=blob_store, manifest=manifest, use_dedup=use_dedup,
+                )
+                blob_stats = blob_store.stats()
+            finally:
+                blob_store.close()
+            elapsed = time.perf_counter() - start
+            progress_bar.empty()
+            
+            success_count = sum(item.ok for item in saved)
+            reused_count = sum(item.reused for item in saved)
+            unchanged_count = sum(item.unchanged for item in saved)
+            st.success(f"✅ 图片下载完成: {success_count}/{len(archive_urls)} 张，耗时 {elapsed:.1f} 秒")
+            if unchanged_count:
+                st.info(f"其中 {unchanged_count} 张与上次保存时相同，未重新下载")
+            if reused_count:
+                st.info(f"其中 {reused_count} 张与之前保存过的图片相同，已直接复制")
+            linked = success_count - unchanged_count - blob_stats["objects_written"]
+            if linked > 0:
+                st.info(f"{linked} 张图片已在本地保存过，只创建了链接，未占用新的磁盘空间")
+        
+        for item in saved:
+            if item.ok:
+                results["files"].append(str(item.path))
+                results["unchanged"] += item.unchanged
+            else:
+                results["errors"].append(f"下载图片 {item.index + 1} 失败: {item.error}")
+                st.error(f"下载图片失败 {item.url[:50]}...: {item.error}")
+        manifest.update_images(saved)
+    
+    # 2. 保存笔记正文为MD文件（内容与上次相同时不写入）
     md_filename = sanitize_filename(note.title) + ".md"
     md_path = save_dir / md_filename
     
     try:
-        md_content = f"# {note.title}\n\n"
-        md_content += f"**链接**: {note.url}\n\n"
-        md_content += f"**笔记ID**: {note.id}\n\n"
-        md_content += "---\n\n"
-        md_content += "## 正文\n\n"
-        md_content += note.text + "\n\n"
-        
-        # 如果有OCR文本，添加
-        if use_ocr and note.ocr_text:
-            md_content += "---\n\n"
-            md_content += "## 图片文字识别\n\n"
-            md_content += note.ocr_text + "\n\n"
-        
-        # 如果有图片，添加图片引用
-        if note.images:
-            md_content += "---\n\n"
-            md_content += "## 图片\n\n"
-            for i, img_url in enumerate(note.images, 1):
-                if download_images:
-                    img_filename = f"image_{i:03d}.jpg"
-                    md_content += f"![图片 {i}]({img_filename})\n\n"
-                else:
-                    md_content += f"- [图片 {i}]({img_url})\n\n"
-        
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
-        
-        results["files"].append(str(md_path))
-        st.success(f"✅ 笔记正文已保存: {md_filename}")
+        md_content = render_note_markdown(note, saved, use_ocr=use_ocr)
+        if manifest.markdown_unchanged(md_filename, md_content):
+            results["unchanged"] += 1
+            st.info(f"笔记正文没有变化，未重新写入: {md_filename}")
+        else:
+            # 先写入临时文件再改名，中途崩溃不会留下不完整的 MD 文件
+            atomic_write_bytes(md_path, md_content.encode('utf-8'))
+            manifest.set_markdown(md_filename, md_content)
+            st.success(f"✅ 笔记正文已保存: {md_filename}")
+        results["files"].insert(0, str(md_path))
         
     except Exception as e:
         results["success"] = False
         results["errors"].append(f"保存MD文件失败: {e}")
         st.error(f"❌ 保存MD文件失败: {e}")
     
-    # 2. 下载图片（如果启用）
-    if download_images and note.images:
-        st.info(f"正在下载 {len(note.images)} 张图片...")
-        
-        progress_bar = st.progress(0)
-        success_count = 0
-        
-        for i, img_url in enumerate(note.images):
-            try:
-                # 确定文件扩展名
-                img_filename = f"image_{i+1:03d}.jpg"
-                img_path = save_dir / img_filename
-                
-                if download_image(img_url, img_path):
-                    results["files"].append(str(img_path))
-                    success_count += 1
-                
-                # 更新进度
-                progress_bar.progress((i + 1) / len(note.images))
-                
-            except Exception as e:
-                results["errors"].append(f"下载图片 {i+1} 失败: {e}")
-        
-        progress_bar.empty()
-        st.success(f"✅ 图片下载完成: {success_count}/{len(note.images)} 张")
+    # 3. 更新保存目录下的全文索引（内容没有变化时不写入）
+    try:
+        with SearchIndex.for_save_dir(base_dir) as index:
+            index.index_note(note)
+    except Exception as e:
+        results["errors"].append(f"更新检索索引失败: {e}")
+    
+    try:
+        manifest.save()
+    except OSError as e:
+        results["errors"].append(f"保存清单失败: {e}")
     
     return results
 
 
+def render_search_results(base_dir: Path, query: str, limit: int = 20):
+    """在侧边栏显示保存目录中笔记的检索结果"""
+    if not (base_dir / SEARCH_INDEX_NAME).exists():
+        st.caption("保存目录中还没有已保存的笔记")
+        return
+    try:
+        with SearchIndex.for_save_dir(base_dir) as index:
+            start = time.perf_counter()
+            hits = index.search(query, limit=limit)
+            total = index.count(query)
+            elapsed = time.perf_counter() - start
+    except Exception as e:
+        st.error(f"检索失败: {e}")
+        return
+    st.caption(f"共 {total} 条结果（{elapsed * 1000:.0f} ms）")
+    for hit in hits:
+        st.markdown(f"**[{hit.title or hit.note_id}]({hit.url})**  \n{hit.snippet}")
+
+
 def main():
     """主函数"""
     st.set_page_config(
@@ -201,6 +369,21 @@ def main():
             value=False,
             help="识别图片中的文字内容（需要安装paddleocr）"
         )
+        ocr_backend = None
+        ocr_time_budget = 0
+        if use_ocr:
+            installed = available_backends()
+            if len(installed) > 1:
+                ocr_backend = st.selectbox("OCR 后端", installed, help="onnx 在 CPU 上通常比 paddle 更快")
+            # 在后台预先加载模型（进程内只加载一次，页面刷新不会重复加载）
+            warm_up_ocr(backend=ocr_backend)
+            ocr_time_budget = st.number_input(
+                "单篇笔记 OCR 时间上限（秒）",
+                min_value=0,
+                value=120,
+                step=30,
+                help="超时后只保留已识别的部分，0 表示不限"
+            )
         
         download_images = st.checkbox(
             "🖼️ 下载图片到本地",
@@ -214,6 +397,12 @@ def main():
             help="将笔记正文保存为Markdown文件"
         )
         
+        use_dedup = st.checkbox(
+            "♻️ 复用重复图片",
+            value=False,
+            help="转载笔记中的同一张图片直接复用之前的识别文本和已保存的文件（近似重复的图片会先逐块比较缩略图）"
+        )
+        
         st.markdown("---")
         st.header("📁 保存位置")
         
@@ -226,6 +415,15 @@ def main():
         )
         
         save_dir = Path(save_dir_input)
+        
+        st.markdown("---")
+        st.header("🔍 搜索已保存的笔记")
+        search_query = st.text_input(
+            "关键词",
+            help="检索已保存笔记的标题、正文和 OCR 文本，空格分隔的多个词需要同时出现"
+        )
+        if search_query.strip():
+            render_search_results(save_dir, search_query)
     
     # 主界面
     st.header("📥 输入小红书链接")
@@ -292,12 +490,37 @@ def main():
                 with st.expander("查看正文", expanded=False):
                     st.markdown(note.text)
                 
+                # 每张图片只下载一次：OCR、预览和保存都读取同一份副本。
+                # 需要保存图片时三处都使用原图链接，否则使用 OCR 规格的链接
+                image_store = ImageStore()
+                shared_urls = note.archive_image_urls() if download_images else note.ocr_image_urls()
+                
                 # OCR处理
                 if use_ocr and note.images:
                     with st.spinner(f"正在识别 {len(note.images)} 张图片中的文字..."):
                         try:
-                            ocr_processor = OCRProcessor()
-                            note.ocr_text = extract_ocr_from_note(note, ocr_processor)
+                            ocr_processor = OCRProcessor(
+                                cache=get_default_ocr_cache(),
+                                dedup=get_default_dedup_index() if use_dedup else None,
+                                backend=ocr_backend,
+                                image_store=image_store,
+                            )
+                            # 每张图片识别完成后立即显示已识别的部分
+                            ocr_progress = st.progress(0.0)
+                            partial = st.empty()
+                            results = []
+                            for result in iter_ocr_from_note(
+                                note, ocr_processor, time_budget=ocr_time_budget or None, image_urls=shared_urls,
+                            ):
+                                results.append(result)
+                                ocr_progress.progress(len(results) / len(note.images))
+                                partial.markdown(merge_ocr_results(results, total=len(note.images)))
+                            ocr_progress.empty()
+                            partial.empty()
+                            note.ocr_text = merge_ocr_results(results, total=len(note.images))
+                            timed_out = sum(result.status == STATUS_TIMEOUT for result in results)
+                            if timed_out:
+                                st.warning(f"⚠️ 超出 OCR 时间上限，{timed_out} 张图片未识别")
                             if note.ocr_text:
                                 st.success(f"✅ OCR识别完成，识别到 {len(note.ocr_text)} 字符")
                                 with st.expander("查看OCR识别结果", expanded=False):
@@ -315,9 +538,16 @@ def main():
                     st.subheader("🖼️ 图片预览")
                     num_cols = 3
                     cols = st.columns(num_cols)
-                    for i, img_url in enumerate(note.images[:9]):  # 只显示前9张
+                    preview_urls = shared_urls[:9]  # 只显示前9张
+                    with ThreadPoolExecutor(max_workers=4) as executor:
+                        previews = list(executor.map(image_store.fetch, preview_urls))
+                    for i, (img_url, downloaded) in enumerate(zip(preview_urls, previews)):
                         with cols[i % num_cols]:
-                            st.image(img_url, caption=f"图片 {i+1}", use_container_width=True)
+                            # 使用已下载的字节，浏览器不再单独请求 CDN；下载失败时退回链接
+                            st.image(
+                                downloaded[0] if downloaded else img_url,
+                                caption=f"图片 {i+1}", use_container_width=True,
+                            )
                     
                     if len(note.images) > 9:
                         st.info(f"还有 {len(note.images) - 9} 张图片未显示")
@@ -335,13 +565,20 @@ def main():
                             note,
                             save_dir,
                             download_images=download_images,
-                            use_ocr=use_ocr
+                            use_ocr=use_ocr,
+                            image_store=image_store,
+                            use_dedup=use_dedup,
                         )
                         
                         if results["success"]:
                             st.success(f"✅ 保存完成！")
                             st.info(f"📁 保存位置: {results['folder']}")
                             st.info(f"📄 文件数量: {len(results['files'])}")
+                            stats = image_store.stats()
+                            st.caption(
+                                f"图片下载 {stats['downloads']} 次（{stats['downloaded_bytes'] / 1024 / 1024:.1f} MB），"
+                                f"复用已下载的副本 {stats['hits']} 次"
+                            )
                             
                             # 显示文件列表
                             with st.expander("查看保存的文件", expanded=False):
@@ -385,7 +622,7 @@ def main():
     
     - 笔记会保存到指定目录下的以标题命名的文件夹中
     - Markdown文件包含标题、正文、OCR文本（如果启用）和图片引用
-    - 图片会按顺序命名为 `image_001.jpg`, `image_002.jpg` 等
+    - 图片会按顺序命名为 `image_001.jpg`, `image_002.webp` 等（扩展名与图片格式一致）
     """)
 
 
@@ -0,0 +1,259 @@
+# xhs_batch.py
+"""
+批量离线解析模块
+把保存下来的 window.__INITIAL_STATE__ 原始数据（state dump）重新解析为 Note 对象。
+
+_parse_note_from_state 是纯 CPU 的 Python 代码，这里把 dump 文件分片交给进程池，
+按输入顺序流式返回结果，解析逻辑更新后可以快速重建大量 Note。
+
+state dump 文件格式（JSON，可选 gzip / zstd 压缩，后缀 .json / .json.gz / .json.zst）：
+    {"url": "笔记最终URL", "state": {... __INITIAL_STATE__ ...}}
+"""
+from __future__ import annotations
+
+import os
+import sys
+import gzip
+import json
+import time
+import functools
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .models import Note
+from .xhs_fetch import _parse_note_from_state
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+PathLike = Union[str, Path]
+
+# 支持的 state dump 文件后缀
+STATE_DUMP_SUFFIXES = (".json", ".json.gz", ".json.zst")
+
+
+def _compress(data: bytes, name: str, level: Optional[int] = None) -> bytes:
+    """按文件后缀压缩数据"""
+    if name.endswith(".gz"):
+        return gzip.compress(data, compresslevel=6 if level is None else level)
+    if name.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise ImportError("需要安装 zstandard: pip install zstandard")
+        return zstandard.ZstdCompressor(level=10 if level is None else level).compress(data)
+    return data
+
+
+def _decompress(data: bytes, name: str) -> bytes:
+    """按文件后缀解压数据"""
+    if name.endswith(".gz"):
+        return gzip.decompress(data)
+    if name.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise ImportError("需要安装 zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def save_state_dump(state: Dict[str, Any], url: str, path: PathLike) -> Path:
+    """
+    保存一份 state dump 文件，后缀为 .gz / .zst 时使用 gzip / zstd 压缩
+
+    Args:
+        state: window.__INITIAL_STATE__ 的字典对象
+        url: 笔记的最终URL
+        path: 保存路径
+
+    Returns:
+        保存后的文件路径
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps({"url": url, "state": state}, ensure_ascii=False).encode("utf-8")
+    data = _compress(data, path.name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def load_state_dump(path: PathLike) -> Tuple[Dict[str, Any], str]:
+    """
+    读取一份 state dump 文件
+
+    Returns:
+        (state, url) 元组
+
+    Raises:
+        ValueError: 如果文件内容不是合法的 state dump
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    data = _decompress(data, path.name)
+
+    record = json.loads(data)
+    if not isinstance(record, dict) or not isinstance(record.get("state"), dict):
+        raise ValueError(f"不是合法的 state dump 文件: {path}")
+    return record["state"], record.get("url") or ""
+
+
+def iter_state_files(inputs: Iterable[PathLike]) -> Iterator[Path]:
+    """
+    展开输入路径：文件原样返回，目录递归查找 state dump 文件（按路径排序）
+    """
+    for item in inputs:
+        item = Path(item)
+        if item.is_dir():
+            for p in sorted(item.rglob("*")):
+                if p.is_file() and p.name.endswith(STATE_DUMP_SUFFIXES):
+                    yield p
+        else:
+            yield item
+
+
+def _init_worker():
+    """进程池初始化：解析过程中的调试输出统一写到 stderr，避免混入结果输出"""
+    sys.stdout = sys.stderr
+
+
+def _parse_state_file(path: str, keep_raw: bool = True) -> Tuple[Optional[Note], Optional[str]]:
+    """进程池 worker：解析单个 dump 文件，异常转成错误信息返回，避免中断整个批次"""
+    try:
+        state, url = load_state_dump(path)
+        note = _parse_note_from_state(state, url)
+        if not keep_raw:
+            # 不需要原始数据时在 worker 里丢弃，减少进程间传输和主进程内存
+            note.drop_raw()
+        return note, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def parse_states_parallel(
+    paths: Iterable[PathLike],
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    report_every: int = 1000,
+    stats: Optional[Dict[str, Any]] = None,
+    keep_raw: bool = True,
+    max_inflight: Optional[int] = None,
+) -> Iterator[Note]:
+    """
+    使用进程池批量解析 state dump 文件，按输入顺序流式返回 Note
+
+    Args:
+        paths: state dump 文件路径（可以是生成器，按需读取）
+        workers: 进程数，默认使用全部 CPU 核心；为 1 时在当前进程内串行解析
+        chunksize: 每次派发给 worker 的文件数，文件多时调大可以减少进程间通信开销
+        report_every: 每解析多少个文件打印一次吞吐量，0 表示只打印最终统计
+        stats: 可选字典，结束时写入 total / failed / elapsed / rate 统计
+        keep_raw: 是否保留 Note.raw，为 False 时在 worker 中丢弃
+        max_inflight: 已派发、结果尚未取走的文件数上限，默认 workers * chunksize * 2（不小于 chunksize）。
+                      Pool.imap 在后台线程中尽快读完输入，不加限制时调用方处理得慢，解析好的 Note 会全部积压在内存中
+
+    Yields:
+        Note 对象（顺序与输入一致，解析失败的文件会打印警告并跳过）
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, workers)
+
+    chunksize = max(1, chunksize)
+    path_iter = (str(p) for p in paths)
+    total = 0
+    failed = 0
+    start = time.perf_counter()
+
+    def _report(final: bool = False):
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed > 0 else 0.0
+        if final:
+            print(
+                f"✅ 解析完成：共 {total} 个文件，失败 {failed} 个，"
+                f"耗时 {elapsed:.1f}s，{rate:.1f} 个/秒（{workers} 进程）",
+                file=sys.stderr,
+            )
+        else:
+            print(f"已解析 {total} 个文件，{rate:.1f} 个/秒", file=sys.stderr)
+        if stats is not None:
+            stats.update(total=total, failed=failed, elapsed=elapsed, rate=rate, workers=workers)
+
+    parse_one = functools.partial(_parse_state_file, keep_raw=keep_raw)
+    # 名额不少于一个分片，否则分发线程凑不齐分片、又等不到结果归还名额
+    slots = threading.Semaphore(max(chunksize, max_inflight or workers * chunksize * 2))
+    stopped = threading.Event()
+    if workers == 1:
+        results = map(parse_one, path_iter)
+        pool = None
+    else:
+        def bounded_paths():
+            # 在进程池的任务分发线程中执行：每派发一个文件占用一个名额，结果被取走时归还
+            for path in path_iter:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                yield path
+
+        pool = multiprocessing.get_context().Pool(processes=workers, initializer=_init_worker)
+        # imap 保持输入顺序；分发线程会尽快读取输入，这里用名额限制已派发、未取走的文件数
+        results = pool.imap(parse_one, bounded_paths(), chunksize=chunksize)
+
+    try:
+        for note, error in results:
+            slots.release()
+            total += 1
+            if error is not None:
+                failed += 1
+                print(f"⚠ 警告：解析第 {total} 个文件失败: {error}", file=sys.stderr)
+            else:
+                yield note
+            if report_every and total % report_every == 0:
+                _report()
+    finally:
+        if pool is not None:
+            # 调用方提前停止时，唤醒等待名额的分发线程让它结束，否则 terminate 会一直等待它
+            stopped.set()
+            slots.release()
+            pool.terminate()
+            pool.join()
+        _report(final=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：批量重新解析 state dump 文件，输出 JSON Lines"""
+    import argparse
+    import contextlib
+
+    parser = argparse.ArgumentParser(
+        description="批量重新解析保存的 __INITIAL_STATE__ 数据（多进程）",
+    )
+    parser.add_argument("inputs", nargs="+", help="state dump 文件或目录（目录会递归查找 .json / .json.gz / .json.zst）")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="进程数（默认使用全部 CPU 核心）")
+    parser.add_argument("--chunksize", type=int, default=16, help="每次派发给 worker 的文件数（默认 16）")
+    parser.add_argument("--output", "-O", type=str, help="输出 JSON Lines 文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # 结果写到 out，解析过程中的提示信息统一写到 stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            notes = parse_states_parallel(
+                iter_state_files(args.inputs),
+                workers=args.workers,
+                chunksize=args.chunksize,
+                keep_raw=False,
+            )
+            for note in notes:
+                out.write(json.dumps(note.to_dict(include_raw=False), ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,31 +7,24 @@ from __future__ import annotations
 
 import os
 import json
+import uuid
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 from .xhs_share import extract_xhs_url_from_share_text
+from .xhs_url import extract_note_id
 from .models import Note
 from .xhs_login import STATE_PATH, check_login_state_exists
 
 
-def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
+def _locate_note_data(state: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
     """
-    从 window.__INITIAL_STATE__ 的 Python dict 中，解析出 Note 对象。
-    
-    这里实现了多种常见结构的解析，以兼容小红书可能的不同数据结构。
-    
-    Args:
-        state: window.__INITIAL_STATE__ 的字典对象
-        url: 笔记的最终URL
+    在 window.__INITIAL_STATE__ 中按已知的几种结构查找笔记数据子树
     
     Returns:
-        Note 对象
-    
-    Raises:
-        RuntimeError: 如果无法从state中找到笔记数据结构
+        (note_data, note_id) 元组，未找到时 note_data 为 None
     """
     note_data = None
     note_id = None
@@ -106,6 +99,109 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
                 except (TypeError, AttributeError, KeyError):
                     continue
     
+    return note_data, note_id
+
+
+def extract_vue_value(obj):
+    """提取Vue响应式对象的实际值"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        # 检查是否是Vue响应式对象
+        if '_value' in obj:
+            return extract_vue_value(obj['_value'])
+        elif '_rawValue' in obj:
+            return extract_vue_value(obj['_rawValue'])
+        # 如果对象只有一个'value'键，可能是包装对象
+        elif 'value' in obj and len([k for k in obj.keys() if not k.startswith('__')]) == 1:
+            return extract_vue_value(obj['value'])
+    return obj
+
+
+# 图片字段与 CDN 规格的对应关系（None 表示根据链接后缀判断）
+_IMAGE_URL_SCENES = (
+    ("urlPre", "WB_PRV"),
+    ("urlDefault", "WB_DFT"),
+    ("url", None),
+    ("imgUrl", None),
+    ("picUrl", None),
+    ("originUrl", "ORIGIN"),
+    ("original", "ORIGIN"),
+)
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _scene_from_url(url: str) -> Optional[str]:
+    """根据 CDN 链接的规格后缀（!nd_prv_... / !nd_dft_...）判断规格"""
+    suffix = url.rsplit("!", 1)[-1] if "!" in url else ""
+    if suffix.startswith("nd_prv"):
+        return "WB_PRV"
+    if suffix.startswith("nd_dft"):
+        return "WB_DFT"
+    return None
+
+
+def _extract_image_variants(img: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    提取一张图片的全部 CDN 规格：infoList 中的各个 imageScene，以及 urlPre/urlDefault/originUrl 等字段
+
+    Returns:
+        [{"scene": "WB_PRV" | "WB_DFT" | "ORIGIN" | None, "url": ..., "width": 宽度或 None}]，按链接去重
+    """
+    variants: List[Dict[str, Any]] = []
+    seen = set()
+
+    def add(url, scene, width=None):
+        url = extract_vue_value(url)
+        if not isinstance(url, str) or not url.startswith("http") or url in seen:
+            return
+        seen.add(url)
+        variants.append({"scene": scene or _scene_from_url(url), "url": url, "width": _as_int(width)})
+
+    sources = [img]
+    for nested_key in ["info", "imageInfo"]:
+        nested = extract_vue_value(img.get(nested_key))
+        if isinstance(nested, dict):
+            sources.append(nested)
+
+    for source in sources:
+        info_list = extract_vue_value(source.get("infoList"))
+        if isinstance(info_list, list):
+            for info in info_list:
+                info = extract_vue_value(info)
+                if isinstance(info, dict):
+                    add(info.get("url"), extract_vue_value(info.get("imageScene")), extract_vue_value(info.get("width")))
+        for key, scene in _IMAGE_URL_SCENES:
+            # 原图的宽高就是图片本身的宽高
+            width = extract_vue_value(source.get("width")) if scene == "ORIGIN" else None
+            add(source.get(key), scene, width)
+    return variants
+
+
+def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
+    """
+    从 window.__INITIAL_STATE__ 的 Python dict 中，解析出 Note 对象。
+    
+    这里实现了多种常见结构的解析，以兼容小红书可能的不同数据结构。
+    
+    Args:
+        state: window.__INITIAL_STATE__ 的字典对象
+        url: 笔记的最终URL
+    
+    Returns:
+        Note 对象
+    
+    Raises:
+        RuntimeError: 如果无法从state中找到笔记数据结构
+    """
+    note_data, note_id = _locate_note_data(state)
+    
     if note_data is None:
         # 打印state的keys帮助调试
         print("⚠ 警告：未能在 __INITIAL_STATE__ 中找到 note 数据结构")
@@ -154,23 +250,7 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
             print("   尝试从URL提取基本信息...")
         
         # 尝试从URL提取note_id
-        import re
-        patterns = [
-            r'/explore/([a-f0-9]+)',
-            r'/discovery/item/([a-f0-9]+)',
-            r'/user/[^/]+/([a-f0-9]+)',
-        ]
-        note_id_match = None
-        for pattern in patterns:
-            note_id_match = re.search(pattern, url)
-            if note_id_match:
-                break
-        
-        if note_id_match:
-            note_id = note_id_match.group(1)
-        else:
-            import uuid
-            note_id = str(uuid.uuid4())
+        note_id = extract_note_id(url) or str(uuid.uuid4())
         
         # 返回一个基础的Note对象
         return Note(
@@ -183,22 +263,6 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
             raw={"state_keys": list(state.keys()), "error": "无法解析note数据"},
         )
     
-    # 辅助函数：提取Vue响应式对象的实际值
-    def extract_vue_value(obj):
-        """提取Vue响应式对象的实际值"""
-        if obj is None:
-            return None
-        if isinstance(obj, dict):
-            # 检查是否是Vue响应式对象
-            if '_value' in obj:
-                return extract_vue_value(obj['_value'])
-            elif '_rawValue' in obj:
-                return extract_vue_value(obj['_rawValue'])
-            # 如果对象只有一个'value'键，可能是包装对象
-            elif 'value' in obj and len([k for k in obj.keys() if not k.startswith('__')]) == 1:
-                return extract_vue_value(obj['value'])
-        return obj
-    
     # 提取标题（处理Vue响应式对象）
     title = (
         extract_vue_value(note_data.get("title"))
@@ -236,26 +300,16 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
     
     # 如果还是没有note_id，尝试从URL提取
     if not note_id:
-        import re
-        # 尝试多种URL格式
-        note_id_match = (
-            re.search(r'/explore/([a-f0-9]+)', url) or
-            re.search(r'/discovery/item/([a-f0-9]+)', url) or
-            re.search(r'/user/[^/]+/([a-f0-9]+)', url)
-        )
-        if note_id_match:
-            note_id = note_id_match.group(1)
-        else:
-            import uuid
-            note_id = str(uuid.uuid4())
+        note_id = extract_note_id(url) or str(uuid.uuid4())
     
     # 确保note_id是字符串（使用extract_vue_value处理Vue响应式对象）
     if note_id and isinstance(note_id, dict):
         note_id = extract_vue_value(note_id)
     note_id = str(note_id) if note_id else str(uuid.uuid4())
     
-    # 提取图片列表
+    # 提取图片列表（images 为兼容旧逻辑的单个链接，image_variants 保留每张图片的全部规格）
     images: List[str] = []
+    image_variants: List[Dict[str, Any]] = []
     image_keys = ["imageList", "imageInfoList", "images", "image_list"]
     
     for key in image_keys:
@@ -271,6 +325,7 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
                 if not isinstance(img, dict):
                     if isinstance(img, str) and img.startswith("http"):
                         images.append(img)
+                        image_variants.append({"url": img, "width": None, "height": None, "variants": []})
                     continue
                 
                 # 尝试多种可能的图片URL字段
@@ -298,6 +353,12 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
                 
                 if url_field and url_field not in images:  # 去重
                     images.append(url_field)
+                    image_variants.append({
+                        "url": url_field,
+                        "width": _as_int(extract_vue_value(img.get("width"))),
+                        "height": _as_int(extract_vue_value(img.get("height"))),
+                        "variants": _extract_image_variants(img),
+                    })
             
             if images:  # 如果找到了图片，就不再尝试其他key
                 break
@@ -310,10 +371,11 @@ def _parse_note_from_state(state: Dict[str, Any], url: str) -> Note:
         images=images,
         ocr_text="",  # 后面可以再接 OCR
         raw=note_data,
+        image_variants=image_variants,
     )
 
 
-def fetch_note_from_share_text(share_text: str, state_path: str = None) -> Note:
+def fetch_note_from_share_text(share_text: str, state_path: str = None, archive=None) -> Note:
     """
     高层接口：
     - 输入：小红书分享文本（包含 xhslink 短链）
@@ -323,6 +385,7 @@ def fetch_note_from_share_text(share_text: str, state_path: str = None) -> Note:
         share_text: 小红书分享文本，例如：
             "算法面经：字节大模型Agent 11.16 一面： 请介绍 Tran... http://xhslink.com/o/EEfBYaRn4M 复制后打开【小红书】查看笔记！"
         state_path: 登录态文件路径，默认为模块目录下的 xhs_state.json
+        archive: 可选的 StateArchive，抓取到的原始数据会归档保存，便于之后离线重新解析
     
     Returns:
         Note 对象，包含解析出的笔记内容
@@ -490,26 +553,35 @@ def fetch_note_from_share_text(share_text: str, state_path: str = None) -> Note:
         
         # 解析state
         note = _parse_note_from_state(state, final_url)
+        
+        # 归档原始数据（失败不影响本次抓取结果）
+        if archive is not None:
+            try:
+                archive.put(state, final_url, note_id=note.id)
+            except Exception as e:
+                print(f"⚠ 警告：归档原始数据失败: {e}")
+        
         return note
         
     except Exception as e:
         raise RuntimeError(f"抓取笔记时出错: {e}")
 
 
-def fetch_note_from_url(url: str, state_path: str = None) -> Note:
+def fetch_note_from_url(url: str, state_path: str = None, archive=None) -> Note:
     """
     直接从URL抓取笔记（不需要分享文本）
     
     Args:
         url: 小红书笔记URL（可以是短链或完整链接）
         state_path: 登录态文件路径
+        archive: 可选的 StateArchive，用于归档原始数据
     
     Returns:
         Note 对象
     """
     # 构造一个假的分享文本格式
     fake_share_text = f"笔记链接: {url} 复制后打开【小红书】查看笔记！"
-    return fetch_note_from_share_text(fake_share_text, state_path)
+    return fetch_note_from_share_text(fake_share_text, state_path, archive=archive)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+# xhs_harvest.py
+"""
+分享链接批量收集模块
+从聊天记录、表格导出等大文本中流式提取所有小红书链接及其前面的标题文字。
+
+- 按块读取文件或标准输入，内存占用与输入大小无关（每块之间最多保留 MAX_TITLE_CHARS + MAX_URL_CHARS 个字符）
+- 正确处理跨块边界的链接；超过 MAX_URL_CHARS 的“链接”（没有分隔符的长串）整段丢弃
+- 使用有上限的最近已见集合在线去重（按规范链接，同一篇笔记的不同分享只输出一次）
+- 无法识别或格式错误的链接（如 "https://[oops"）跳过并计数，不会中断整个收集过程
+"""
+from __future__ import annotations
+
+import re
+import sys
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO
+
+from .xhs_url import SHARE_URL_RE, SHARE_URL_TRAILING, canonicalize_url, extract_note_id, strip_tracking_params
+
+
+# 默认每次读取的字符数
+DEFAULT_CHUNK_SIZE = 1 << 20
+# 默认去重集合上限（超过后淘汰最久未出现的链接）
+DEFAULT_MAX_SEEN = 1_000_000
+# 链接前标题文字的最大长度
+MAX_TITLE_CHARS = 200
+# 单个链接的最大长度，更长的不是分享链接，直接丢弃
+MAX_URL_CHARS = 2048
+
+# 分享文案中的固定提示语，不属于标题
+_BOILERPLATE_RE = re.compile(r"复制(?:后|本条信息，?)打开【?小红书】?(?:App)?查看(?:笔记|精彩内容)[！!]?")
+_TRAILING_ELLIPSIS_RE = re.compile(r"(?:\.{3}|…+)\s*$")
+# 链接中可以出现的字符（与 SHARE_URL_RE 一致），用于跳过超长链接在后续块中的剩余部分
+_URL_BODY_RE = re.compile(r"[^\s）)＞》>，,。\n\r\t]*")
+
+
+class HarvestedLink(NamedTuple):
+    """收集到的一条分享链接"""
+    url: str                 # 去掉追踪参数后的链接（可直接用于抓取）
+    key: str                 # 去重用的规范链接
+    note_id: Optional[str]   # 能离线识别时的笔记ID（短链接为 None）
+    title: str               # 链接前面的标题文字
+
+
+class BoundedSeenSet:
+    """有容量上限的已见集合，超过上限时淘汰最久未出现的元素"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SEEN):
+        self.max_size = max(1, max_size)
+        self._items: "OrderedDict[str, None]" = OrderedDict()
+
+    def add(self, key: str) -> bool:
+        """加入集合，返回 key 之前是否不存在"""
+        if key in self._items:
+            self._items.move_to_end(key)
+            return False
+        self._items[key] = None
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _clean_title(text: str) -> str:
+    """清理链接前的文字：去掉分享提示语、末尾省略号和多余空白"""
+    text = _BOILERPLATE_RE.sub("", text)
+    text = _TRAILING_ELLIPSIS_RE.sub("", text.strip())
+    return " ".join(text.split())[:MAX_TITLE_CHARS]
+
+
+def harvest_share_links(
+    stream: TextIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_seen: int = DEFAULT_MAX_SEEN,
+    dedupe: bool = True,
+    seen: Optional[BoundedSeenSet] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[HarvestedLink]:
+    """
+    从文本流中流式提取小红书分享链接
+
+    Args:
+        stream: 文本流（已打开的文件或 sys.stdin）
+        chunk_size: 每次读取的字符数
+        max_seen: 去重集合上限
+        dedupe: 是否去重
+        seen: 可选，外部传入的去重集合（多个文件共用）
+        stats: 可选字典，累加 links（输出）/ duplicates（重复）/ skipped（超长、无法识别或格式错误）计数
+
+    Yields:
+        HarvestedLink，按在文本中出现的顺序
+    """
+    if seen is None and dedupe:
+        seen = BoundedSeenSet(max_seen)
+    if stats is None:
+        stats = {}
+    for name in ("links", "duplicates", "skipped"):
+        stats.setdefault(name, 0)
+
+    buf = ""
+    eof = False
+    skipping = False   # 正在跳过超长链接的剩余部分
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        if skipping:
+            rest = _URL_BODY_RE.match(chunk).end()
+            if rest == len(chunk) and not eof:
+                continue
+            chunk = chunk[rest:]
+            skipping = False
+        buf += chunk
+
+        consumed = 0       # 已处理到的位置（上一个链接的结尾）
+        pending = len(buf)  # 可能跨块的未完成链接的起点
+        for m in SHARE_URL_RE.finditer(buf):
+            if not eof and m.end() == len(buf):
+                if m.end() - m.start() > MAX_URL_CHARS:
+                    # 超长链接：丢弃已读到的部分，之后的块中跳过它的剩余部分
+                    consumed = len(buf)
+                    skipping = True
+                    stats["skipped"] += 1
+                else:
+                    # 链接紧贴当前块末尾，可能还没读完，留到下一块
+                    pending = m.start()
+                break
+
+            # 标题：上一个链接结尾 / 本行开头 / 最大长度 三者中最靠后的位置
+            start = m.start()
+            ctx_start = max(consumed, buf.rfind("\n", consumed, start) + 1, start - MAX_TITLE_CHARS)
+            consumed = m.end()
+            if consumed - start > MAX_URL_CHARS:
+                stats["skipped"] += 1
+                continue
+
+            raw_url = m.group(1).strip().rstrip(SHARE_URL_TRAILING)
+            try:
+                key = canonicalize_url(raw_url)
+                link = None if key is None else HarvestedLink(
+                    url=strip_tracking_params(raw_url),
+                    key=key,
+                    note_id=extract_note_id(raw_url),
+                    title=_clean_title(buf[ctx_start:start]),
+                )
+            except ValueError:
+                link = None
+            if link is None:
+                stats["skipped"] += 1
+                continue
+            if seen is not None and not seen.add(key):
+                stats["duplicates"] += 1
+                continue
+            stats["links"] += 1
+            yield link
+
+        # 只保留下一个链接可能用到的上下文：未完成链接 + 其前面同一行的有限文字，合计不超过 MAX_TITLE_CHARS + MAX_URL_CHARS
+        carry_start = max(
+            consumed,
+            min(pending, len(buf) - MAX_URL_CHARS) - MAX_TITLE_CHARS,
+            buf.rfind("\n", consumed, pending) + 1,
+        )
+        buf = buf[carry_start:]
+
+
+def harvest_files(
+    paths: Iterable[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_seen: int = DEFAULT_MAX_SEEN,
+    dedupe: bool = True,
+    encoding: str = "utf-8",
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[HarvestedLink]:
+    """
+    依次从多个文件中收集分享链接（"-" 表示标准输入），跨文件去重；stats 累加全部文件的计数
+    """
+    seen = BoundedSeenSet(max_seen) if dedupe else None
+    for path in paths:
+        if path == "-":
+            yield from harvest_share_links(sys.stdin, chunk_size=chunk_size, dedupe=dedupe, seen=seen, stats=stats)
+            continue
+        with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+            yield from harvest_share_links(f, chunk_size=chunk_size, dedupe=dedupe, seen=seen, stats=stats)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：输出 JSON Lines 或 TSV"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="从聊天记录、表格导出等文本中批量收集小红书分享链接")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="输入文件（默认读取标准输入，- 表示标准输入）")
+    parser.add_argument("--format", "-f", choices=["jsonl", "tsv"], default="jsonl", help="输出格式（默认 jsonl）")
+    parser.add_argument("--max-seen", type=int, default=DEFAULT_MAX_SEEN, help=f"去重集合上限（默认 {DEFAULT_MAX_SEEN}）")
+    parser.add_argument("--no-dedupe", action="store_true", help="不去重，输出每一次出现")
+    parser.add_argument("--encoding", default="utf-8", help="输入文件编码（默认 utf-8）")
+    args = parser.parse_args(argv)
+
+    stats: Dict[str, int] = {}
+    links = harvest_files(args.inputs, max_seen=args.max_seen, dedupe=not args.no_dedupe, encoding=args.encoding,
+                          stats=stats)
+    for link in links:
+        if args.format == "tsv":
+            sys.stdout.write(f"{link.url}\t{link.note_id or ''}\t{link.title}\n")
+        else:
+            sys.stdout.write(json.dumps(link._asdict(), ensure_ascii=False) + "\n")
+    print(f"共收集到 {stats.get('links', 0)} 个链接（重复 {stats.get('duplicates', 0)} 个，"
+          f"跳过无法识别的链接 {stats.get('skipped', 0)} 个）", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ import requests
 from bs4 import BeautifulSoup
 
 from .models import Note
+from .xhs_url import extract_note_id, is_short_link
 
 
 def extract_note_id_from_url(url: str) -> Optional[str]:
@@ -23,10 +24,11 @@ def extract_note_id_from_url(url: str) -> Optional[str]:
     支持多种格式：
     - http://xhslink.com/... (短链接，需要先解析)
     - https://www.xiaohongshu.com/explore/xxxxx
-    - https://www.xiaohongshu.com/user/xxx/xxxxx
+    - https://www.xiaohongshu.com/discovery/item/xxxxx
+    - https://www.xiaohongshu.com/user/profile/xxx/xxxxx
     """
     # 如果是短链接，先访问获取真实链接
-    if "xhslink.com" in url:
+    if is_short_link(url):
         try:
             response = requests.head(url, allow_redirects=True, timeout=10)
             url = response.url
@@ -35,18 +37,7 @@ def extract_note_id_from_url(url: str) -> Optional[str]:
             return None
     
     # 从 URL 中提取 note_id
-    patterns = [
-        r'/explore/([a-f0-9]+)',
-        r'/discovery/item/([a-f0-9]+)',
-        r'/user/[^/]+/([a-f0-9]+)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    
-    return None
+    return extract_note_id(url)
 
 
 def fetch_xhs_note(url: str, cookies: Optional[dict] = None, cookie_string: Optional[str] = None) -> Note:
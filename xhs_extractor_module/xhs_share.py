@@ -5,9 +5,10 @@
 """
 from __future__ import annotations
 
-import re
 from typing import Optional
 
+from .xhs_url import SHARE_URL_RE, SHARE_URL_TRAILING, strip_tracking_params
+
 
 def extract_xhs_url_from_share_text(text: str) -> Optional[str]:
     """
@@ -32,7 +33,7 @@ def extract_xhs_url_from_share_text(text: str) -> Optional[str]:
     # 先匹配完整的URL（包括路径、查询参数等），直到遇到空白或明显的中文标点
     # URL可能包含的字符：字母、数字、-._~:/?#[]@!$&'()*+,;=
     # 但遇到中文标点符号时应该停止
-    m = re.search(r"(https?://[^\s）)＞》>，,。\n\r\t]+)", text)
+    m = SHARE_URL_RE.search(text)
     if not m:
         return None
     
@@ -40,12 +41,10 @@ def extract_xhs_url_from_share_text(text: str) -> Optional[str]:
     
     # 清理末尾可能的标点符号（中文和英文）
     # 注意：点号可能是URL的一部分（如.com），所以只清理末尾的标点
-    url = url.rstrip("）)＞》>，,。\n\r\t")
-    
-    # 如果URL以点号结尾（且不是.com/.cn等域名后缀），可能是误匹配，需要进一步处理
-    # 但通常URL不会以点号结尾，所以这里先简单处理
+    url = url.rstrip(SHARE_URL_TRAILING)
     
-    return url
+    # 去掉分享追踪参数（保留访问笔记需要的 xsec_token），保证去重和缓存的 key 一致
+    return strip_tracking_params(url)
 
 
 if __name__ == "__main__":
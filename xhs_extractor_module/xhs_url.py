@@ -0,0 +1,183 @@
+# xhs_url.py
+"""
+小红书链接规范化模块
+统一从各种链接形式中提取 note_id，并生成用于去重和缓存的规范链接。
+
+支持的链接形式：
+- https://www.xiaohongshu.com/explore/<note_id>
+- https://www.xiaohongshu.com/discovery/item/<note_id>
+- https://www.xiaohongshu.com/user/profile/<user_id>/<note_id>
+- http(s)://xhslink.com/...（短链接，需要访问后才能得到 note_id）
+
+所有正则在模块加载时编译一次，各个入口（分享文本解析、抓取、解析器、归档）都使用这里的函数，
+保证同一篇笔记在不同路径下得到相同的 key。
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# 小红书主站域名
+XHS_HOSTS = frozenset({"www.xiaohongshu.com", "xiaohongshu.com", "m.xiaohongshu.com"})
+# 短链接域名
+SHORT_LINK_HOSTS = frozenset({"xhslink.com", "www.xhslink.com"})
+
+# 访问笔记需要保留的查询参数（其余均视为分享/追踪参数）
+ACCESS_PARAMS = frozenset({"xsec_token", "xsec_source"})
+
+# 笔记路径，按优先级排列；user 路径里第一段是用户ID，最后一段才是笔记ID
+_NOTE_PATH_RE = re.compile(
+    r"/(?:explore|discovery/item)/([0-9a-f]+)"
+    r"|/user/profile/[0-9a-zA-Z]+/([0-9a-f]+)"
+    r"|/user/(?!profile/)[^/]+/([0-9a-f]+)"
+)
+
+# 分享文案中的链接：直到空白或中文标点为止
+SHARE_URL_RE = re.compile(r"(https?://[^\s）)＞》>，,。\n\r\t]+)")
+# 链接末尾需要清理的标点
+SHARE_URL_TRAILING = "）)＞》>，,。\n\r\t"
+
+# 图片 CDN 域名后缀（sns-webpic-qc.xhscdn.com、ci.xiaohongshu.com 等）
+IMAGE_HOST_SUFFIXES = ("xhscdn.com", "xiaohongshu.com")
+# CDN 文件ID的最短长度，过短的路径段不当作稳定ID
+_MIN_IMAGE_ID_LEN = 16
+
+
+def _split(url: str):
+    """
+    拆分 URL，补全缺失的协议头（如 "www.xiaohongshu.com/explore/..."）
+
+    无法拆分的链接（如 "https://[abc" 这样不完整的 IPv6 主机）返回 None，由调用方按无法识别处理。
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = "https://" + url.lstrip("/")
+    try:
+        return urlsplit(url)
+    except ValueError:
+        return None
+
+
+def is_short_link(url: str) -> bool:
+    """是否是 xhslink 短链接"""
+    if not url:
+        return False
+    parts = _split(url)
+    return parts is not None and parts.hostname in SHORT_LINK_HOSTS
+
+
+def extract_note_id(url: str) -> Optional[str]:
+    """
+    从笔记链接中提取 note_id（不访问网络，短链接返回 None）
+
+    Example:
+        >>> extract_note_id("https://www.xiaohongshu.com/explore/64f0c2a1000000001f03b7a2?xsec_token=x")
+        '64f0c2a1000000001f03b7a2'
+    """
+    if not url:
+        return None
+    parts = _split(url)
+    m = _NOTE_PATH_RE.search(parts.path) if parts is not None else None
+    if not m:
+        return None
+    return m.group(1) or m.group(2) or m.group(3)
+
+
+def strip_tracking_params(url: str) -> str:
+    """
+    去掉分享/追踪参数，只保留访问笔记需要的 xsec_token / xsec_source；
+    短链接去掉全部查询参数。非小红书链接原样返回。
+    """
+    if not url:
+        return url
+    parts = _split(url)
+    if parts is None:
+        return url
+    host = parts.hostname or ""
+    if host in SHORT_LINK_HOSTS:
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+    if host not in XHS_HOSTS:
+        return url
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k in ACCESS_PARAMS])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def canonicalize_url(url: str) -> Optional[str]:
+    """
+    生成用于去重和缓存的规范链接
+
+    - 能识别 note_id 的链接统一为 https://www.xiaohongshu.com/explore/<note_id>
+    - 短链接统一为 https://xhslink.com/<path>（去掉查询参数）
+    - 无法识别的链接返回 None
+    """
+    if not url:
+        return None
+    parts = _split(url)
+    if parts is None:
+        return None
+    host = parts.hostname or ""
+    if host in XHS_HOSTS:
+        m = _NOTE_PATH_RE.search(parts.path)
+        if m:
+            return f"https://www.xiaohongshu.com/explore/{m.group(1) or m.group(2) or m.group(3)}"
+        return None
+    if host in SHORT_LINK_HOSTS:
+        path = parts.path.rstrip("/")
+        return f"https://xhslink.com{path}" if path else None
+    return None
+
+
+def canonicalize_many(urls: Iterable[str]) -> List[Optional[str]]:
+    """
+    批量规范化链接，结果与输入一一对应
+
+    不是向量化实现：纯 Python 中没有能一次处理一批字符串的原语，逐个调用 canonicalize_url 才能保证
+    与单个规范化的结果完全一致（协议头补全、主机名大小写、端口等都由 urlsplit 处理）。
+    批量输入中重复链接很多（同一篇笔记被反复分享），这里对相同的字符串只计算一次。
+    """
+    cache = {}
+    results = []
+    append = results.append
+    for url in urls:
+        canonical = cache.get(url, cache)
+        if canonical is cache:
+            canonical = cache[url] = canonicalize_url(url)
+        append(canonical)
+    return results
+
+
+def extract_urls_from_text(text: str) -> List[str]:
+    """提取文本中全部 http(s) 链接（已清理末尾标点）"""
+    if not text:
+        return []
+    return [m.group(1).strip().rstrip(SHARE_URL_TRAILING) for m in SHARE_URL_RE.finditer(text)]
+
+
+def image_id_from_url(url: str) -> Optional[str]:
+    """
+    图片的稳定ID，用于缓存
+
+    CDN 链接中带有时间戳目录、签名和 "!nd_dft_wlteh_webp_3" 之类的规格后缀，
+    同一张图片每次抓取得到的链接都不同，但最后一段文件ID不变，取它作为 "xhs:<文件ID>"；
+    其他链接去掉查询参数后原样返回，无法拆分的链接原样返回。
+    """
+    if not url:
+        return None
+    parts = _split(url)
+    if parts is None:
+        return url
+    host = parts.hostname or ""
+    name = parts.path.rsplit("/", 1)[-1].split("!", 1)[0]
+    if host.endswith(IMAGE_HOST_SUFFIXES) and len(name) >= _MIN_IMAGE_ID_LEN:
+        return f"xhs:{name}"
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+if __name__ == "__main__":
+    import sys
+    for line in (sys.argv[1:] or sys.stdin):
+        line = line.strip()
+        if line:
+            print(f"{canonicalize_url(line) or '-'}\t{extract_note_id(line) or '-'}\t{line}")